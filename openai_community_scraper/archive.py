@@ -0,0 +1,335 @@
+"""
+Compact archive format for scraped topics, with users and asset URLs stored once.
+
+Every post of the JSON output repeats the full profile of its author (`username`, `avatar_template`,
+`user_title`, flair, ...), and thumbnails and link counts repeat the same CDN URLs. An archive keeps
+every distinct author profile and asset URL once in the `users` and `assets` tables and references them
+by index. Topics and posts are stored as rows of values over interned key lists (`topic_shapes` and
+`post_shapes`) instead of repeating their keys. `load_archive` rebuilds the topics exactly as written.
+
+Usage:
+    python -m openai_community_scraper.archive pack output.json output.archive.json.gz
+    python -m openai_community_scraper.archive unpack output.archive.json.gz restored.json
+    python -m openai_community_scraper.archive compare --data output.json
+"""
+import argparse
+import contextlib
+import gzip
+import io
+import os
+import shutil
+import sys
+import tempfile
+import time
+from dataclasses import fields
+from datetime import datetime
+from operator import itemgetter
+
+import orjson
+
+from openai_community_scraper.exporters import COMPRESSION_SUFFIXES
+
+try:
+    import zstandard
+except ImportError:  # zstd compression is optional
+    zstandard = None
+
+ARCHIVE_VERSION = 1
+# Author profile fields of a post, stored in the `users` table
+USER_FIELDS = frozenset((
+    'user_id', 'username', 'name', 'display_username', 'avatar_template', 'user_title', 'trust_level', 'moderator',
+    'admin', 'staff', 'primary_group_name', 'flair_name', 'flair_url', 'flair_bg_color', 'flair_color',
+    'flair_group_id', 'title_is_group', 'group_moderator',
+))
+# Fields holding an asset URL, and lists of dicts whose `url` is an asset URL, stored in the `assets` table
+ASSET_FIELDS = ('image_url',)
+ASSET_LIST_FIELDS = ('thumbnails', 'link_counts')
+
+
+def _as_dict(item) -> dict:
+    if isinstance(item, dict):
+        return item
+    return {f.name: getattr(item, f.name) for f in fields(item)}
+
+
+def _compressed_writer(file, path: str):
+    # A writable stream over `file` compressing what is written to it, depending on the extension of `path`
+    if path.endswith(COMPRESSION_SUFFIXES['gzip']):
+        return gzip.GzipFile(fileobj=file, mode='wb', compresslevel=6)
+    if path.endswith(COMPRESSION_SUFFIXES['zstd']):
+        if zstandard is None:
+            raise ImportError("zstd compression requires the 'zstandard' package")
+        return zstandard.ZstdCompressor().stream_writer(file, closefd=False)
+    return contextlib.nullcontext(file)
+
+
+def _decompress(data: bytes, path: str) -> bytes:
+    if path.endswith(COMPRESSION_SUFFIXES['gzip']):
+        return gzip.decompress(data)
+    if path.endswith(COMPRESSION_SUFFIXES['zstd']):
+        if zstandard is None:
+            raise ImportError("zstd compression requires the 'zstandard' package")
+        return zstandard.ZstdDecompressor().decompressobj().decompress(data)
+    return data
+
+
+class ArchiveWriter:
+    """
+    Writes topics to an archive.
+
+    Users, asset URLs and shapes are interned as topics are added, and every topic is encoded into its row
+    right away. The rows are spooled to an unnamed temporary file next to the archive, so only the interned
+    tables are kept in memory. When the writer is closed, the tables followed by the spooled rows are
+    streamed to the archive.
+
+    Attributes:
+        path (str | None): The archive path, compressed with gzip or zstd when it ends with `.gz` or `.zst`.
+        topic_count (int): Number of topics added.
+    """
+
+    def __init__(self, path: str | None = None):
+        self.path = path
+        self.topic_count = 0
+        self._topic_shapes = {}
+        self._post_shapes = {}
+        self._users = {}
+        self._assets = {}
+        self._rows = tempfile.TemporaryFile(dir=os.path.dirname(os.path.abspath(path)) if path else None)
+
+    def _asset(self, url):
+        if not isinstance(url, str):
+            return url
+        return self._assets.setdefault(url, len(self._assets))
+
+    def _asset_list(self, entries):
+        if not entries:
+            return entries
+        return [{**entry, 'url': self._asset(entry['url'])} if isinstance(entry, dict) and 'url' in entry else entry
+                for entry in entries]
+
+    def _encode_value(self, key, value):
+        if key in ASSET_FIELDS:
+            return self._asset(value)
+        if key in ASSET_LIST_FIELDS:
+            return self._asset_list(value)
+        return value
+
+    def _encode_post(self, post: dict) -> list:
+        keys = tuple(post)
+        shape = self._post_shapes.setdefault(keys, len(self._post_shapes))
+        user = tuple(post[key] for key in keys if key in USER_FIELDS)
+        row = [shape, self._users.setdefault(user, len(self._users))]
+        row.extend(self._encode_value(key, post[key]) for key in keys if key not in USER_FIELDS)
+        return row
+
+    def add(self, topic):
+        """
+        Adds a topic to the archive.
+
+        Args:
+            topic (dict | TopicDetail): The topic, with its posts in `post_comments`.
+        """
+        topic = _as_dict(topic)
+        keys = tuple(topic)
+        row = [self._topic_shapes.setdefault(keys, len(self._topic_shapes))]
+        for key, value in topic.items():
+            if key == 'post_comments' and value is not None:
+                value = [self._encode_post(_as_dict(post)) for post in value]
+            row.append(self._encode_value(key, value))
+        if self.topic_count:
+            self._rows.write(b',')
+        self._rows.write(orjson.dumps(row))
+        self.topic_count += 1
+
+    def _write(self, file):
+        # The same bytes as orjson.dumps of the whole archive, with the topic rows copied from the spool
+        tables = orjson.dumps({
+            'version': ARCHIVE_VERSION,
+            'topic_shapes': list(self._topic_shapes),
+            'post_shapes': list(self._post_shapes),
+            'users': list(self._users),
+            'assets': list(self._assets),
+        })
+        file.write(tables[:-1] + b',"topics":[')
+        self._rows.seek(0)
+        shutil.copyfileobj(self._rows, file)
+        self._rows.seek(0, os.SEEK_END)
+        file.write(b']}')
+
+    def dumps(self) -> bytes:
+        """
+        Serializes the archive to (uncompressed) JSON.
+        """
+        with io.BytesIO() as file:
+            self._write(file)
+            return file.getvalue()
+
+    def close(self):
+        """
+        Writes the archive to `path`, under a temporary name that is atomically renamed once complete.
+        """
+        try:
+            with open(self.path + '.tmp', 'wb') as file, _compressed_writer(file, self.path) as stream:
+                self._write(stream)
+            os.replace(self.path + '.tmp', self.path)
+        finally:
+            self._rows.close()
+
+
+def unpack(data: bytes) -> list[dict]:
+    """
+    Rebuilds the topics of a serialized archive.
+
+    Args:
+        data (bytes): The uncompressed archive, as returned by `ArchiveWriter.dumps`.
+
+    Returns:
+        The topics as dicts, with the same keys, key order and values as when they were added.
+    """
+    archive = orjson.loads(data)
+    if archive.get('version') != ARCHIVE_VERSION:
+        raise ValueError(f"Unsupported archive version: {archive.get('version')}")
+    assets = archive['assets']
+    users = archive['users']
+
+    def asset_list(entries):
+        if not entries:
+            return entries
+        return [{**entry, 'url': assets[entry['url']]} if isinstance(entry, dict) and isinstance(entry.get('url'), int)
+                else entry for entry in entries]
+
+    post_shapes = []
+    for keys in archive['post_shapes']:
+        # Rows hold the values of the other fields followed by the user fields, put back in key order
+        other_keys = [key for key in keys if key not in USER_FIELDS]
+        stored_order = other_keys + [key for key in keys if key in USER_FIELDS]
+        positions = [stored_order.index(key) for key in keys]
+        post_shapes.append((keys, itemgetter(*positions) if len(positions) > 1 else lambda values: tuple(values),
+                            [key for key in other_keys if key in ASSET_LIST_FIELDS]))
+
+    def post(row):
+        keys, reorder, asset_keys = post_shapes[row[0]]
+        values = reorder(row[2:] + users[row[1]])
+        post = dict(zip(keys, values))
+        for key in asset_keys:
+            post[key] = asset_list(post[key])
+        return post
+
+    topics = []
+    for row in archive['topics']:
+        topic = dict(zip(archive['topic_shapes'][row[0]], row[1:]))
+        for key in ASSET_FIELDS:
+            if isinstance(topic.get(key), int):
+                topic[key] = assets[topic[key]]
+        for key in ASSET_LIST_FIELDS:
+            if key in topic:
+                topic[key] = asset_list(topic[key])
+        if topic.get('post_comments') is not None:
+            topic['post_comments'] = [post(post_row) for post_row in topic['post_comments']]
+        topics.append(topic)
+    return topics
+
+
+def load_archive(path: str) -> list[dict]:
+    """
+    Loads the topics of an archive file written by ArchiveWriter.
+
+    Args:
+        path (str): The archive path, the compression is derived from its extension.
+    """
+    with open(path, 'rb') as file:
+        return unpack(_decompress(file.read(), path))
+
+
+def _best_time(function, repeat: int) -> float:
+    best = float('inf')
+    for _ in range(repeat):
+        started = time.perf_counter()
+        function()
+        best = min(best, time.perf_counter() - started)
+    return best
+
+
+def compare(topics: list[dict], repeat: int = 5) -> dict:
+    """
+    Compares the size and load time of the JSON output and of the archive of the same topics.
+
+    Args:
+        topics (list[dict]): Recorded topics, e.g. loaded from `output.json`.
+        repeat (int): Number of loads, the fastest one is reported.
+
+    Returns:
+        The comparison report, sizes in bytes and load times in milliseconds.
+    """
+    writer = ArchiveWriter()
+    for topic in topics:
+        writer.add(topic)
+    archive = writer.dumps()
+    if unpack(archive) != topics:
+        raise AssertionError('The archive does not rebuild the original topics')
+    output = orjson.dumps(topics)
+    gzip_output, gzip_archive = gzip.compress(output, compresslevel=6), gzip.compress(archive, compresslevel=6)
+    posts = [post for topic in topics for post in topic.get('post_comments') or []]
+    return {
+        'topics': len(topics),
+        'posts': len(posts),
+        'users': len(writer._users),
+        'assets': len(writer._assets),
+        'post_comments_bytes': sum(len(orjson.dumps(topic.get('post_comments'))) for topic in topics),
+        'bytes': {
+            'json': len(output),
+            'archive': len(archive),
+            'json_gzip': len(gzip_output),
+            'archive_gzip': len(gzip_archive),
+        },
+        'load_ms': {
+            'json': round(_best_time(lambda: orjson.loads(output), repeat) * 1000, 2),
+            'archive': round(_best_time(lambda: unpack(archive), repeat) * 1000, 2),
+            'json_gzip': round(_best_time(lambda: orjson.loads(gzip.decompress(gzip_output)), repeat) * 1000, 2),
+            'archive_gzip': round(_best_time(lambda: unpack(gzip.decompress(gzip_archive)), repeat) * 1000, 2),
+        },
+    }
+
+
+def main(argv=None):
+    from openai_community_scraper.benchmark import git_revision, load_topics
+
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    commands = parser.add_subparsers(dest='command', required=True)
+    pack_parser = commands.add_parser('pack', help='Convert a JSON or JSON Lines output to an archive.')
+    pack_parser.add_argument('source', help='Recorded topics, a JSON array or JSON Lines file.')
+    pack_parser.add_argument('archive', help='Archive path, compressed when it ends with .gz or .zst.')
+    unpack_parser = commands.add_parser('unpack', help='Convert an archive back to a JSON array.')
+    unpack_parser.add_argument('archive')
+    unpack_parser.add_argument('output')
+    compare_parser = commands.add_parser('compare', help='Compare the size and load time of JSON and archive.')
+    compare_parser.add_argument('--data', default='output.json', help='Recorded topics, a JSON array or JSON Lines file.')
+    compare_parser.add_argument('--report', help='Write the JSON report to this file instead of stdout.')
+    args = parser.parse_args(argv)
+
+    if args.command == 'pack':
+        writer = ArchiveWriter(args.archive)
+        for topic in load_topics(args.source):
+            writer.add(topic)
+        writer.close()
+        print(f"{writer.topic_count} topics archived to {args.archive}")
+    elif args.command == 'unpack':
+        with open(args.output, 'wb') as file:
+            file.write(orjson.dumps(load_archive(args.archive)))
+    else:
+        report = orjson.dumps({
+            'revision': git_revision(),
+            'created_at': datetime.utcnow().isoformat(timespec='seconds') + 'Z',
+            'data': args.data,
+            'results': compare(load_topics(args.data)),
+        }, option=orjson.OPT_INDENT_2)
+        if args.report:
+            with open(args.report, 'wb') as file:
+                file.write(report)
+        else:
+            sys.stdout.buffer.write(report + b'\n')
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
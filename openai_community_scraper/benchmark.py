@@ -0,0 +1,415 @@
+"""
+Offline replay benchmark of the spider and its pipelines against a local mock Discourse server.
+
+The mock server replays recorded topics (the JSON output of a previous crawl, e.g. `output.json`
+or an `output.jsonl` file) as `latest.json` listing pages, `/t/{id}.json` topic details and
+`/t/{id}/posts.json` post batches, with optional latency and error injection. The spider is run
+end to end through each requested pipeline in a separate process and a machine readable report
+with items/sec, requests/item, item latency percentiles and peak RSS is written.
+
+Usage:
+    python -m openai_community_scraper.benchmark --data output.json --pipelines json,postgres --report bench.json
+"""
+import argparse
+import gzip
+import hashlib
+import logging
+import os
+import random
+import re
+import resource
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from datetime import datetime, timedelta
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+import orjson
+
+from openai_community_scraper.exporters import read_json_lines
+
+try:
+    import brotli
+except ImportError:  # brotli responses are optional
+    brotli = None
+
+LISTING_PAGE_SIZE = 30
+INLINED_POSTS = 20
+LISTING_FIELDS = ('id', 'title', 'slug', 'posts_count', 'reply_count', 'highest_post_number', 'image_url',
+                  'created_at', 'last_posted_at', 'bumped_at', 'archetype', 'views', 'like_count', 'tags',
+                  'visible', 'closed', 'archived')
+
+
+def load_topics(path: str) -> list[dict]:
+    """
+    Loads recorded topics from a JSON array or a (compressed) JSON Lines file.
+    """
+    if path.endswith('.json'):
+        with open(path, 'rb') as file:
+            return orjson.loads(file.read())
+    return [orjson.loads(line) for line in read_json_lines(path)]
+
+
+class MockDiscourseServer:
+    """
+    A threaded HTTP server replaying recorded topics like the Discourse JSON API.
+
+    Dates are shifted so that the most recent topic was created an hour ago, which keeps the
+    recording inside the `days` window of the spider.
+
+    Listing pages are numbered from 0 like those of Discourse, the first page holds the most recently
+    bumped topics.
+
+    Attributes:
+        latency (float): Seconds every response is delayed by.
+        error_rate (float): Fraction of topic and post requests answered with `error_status`.
+        error_status (int): The injected error status, `429` responses carry a `Retry-After` header.
+        url (str): The root URL of the running server.
+    """
+
+    def __init__(self, topics: list[dict], latency: float = 0.0, error_rate: float = 0.0, error_status: int = 429,
+                 port: int = 0):
+        self.latency = latency
+        self.error_rate = error_rate
+        self.error_status = error_status
+        self.request_count = 0
+        self._request_count_lock = threading.Lock()
+        self._prepare(topics)
+        self.httpd = ThreadingHTTPServer(('127.0.0.1', port), self._handler_class())
+        self.url = f"http://127.0.0.1:{self.httpd.server_address[1]}"
+
+    def _prepare(self, topics: list[dict]):
+        newest = max(datetime.fromisoformat(topic['created_at'].rstrip('Z')) for topic in topics)
+        shift = datetime.utcnow() - timedelta(hours=1) - newest
+
+        def shift_date(value):
+            if not value:
+                return value
+            return (datetime.fromisoformat(value.rstrip('Z')) + shift).isoformat(timespec='milliseconds') + 'Z'
+
+        self.topics = {}
+        for topic in topics:
+            topic = dict(topic)
+            posts = topic.pop('post_comments', None) or []
+            for key in ('created_at', 'last_posted_at'):
+                topic[key] = shift_date(topic.get(key))
+            topic['bumped_at'] = topic['last_posted_at'] or topic['created_at']
+            self.topics[topic['id']] = (topic, posts)
+        self.listing = sorted((topic for topic, _ in self.topics.values()),
+                              key=lambda topic: topic['bumped_at'], reverse=True)
+
+    def listing_page(self, page: int) -> dict:
+        start = max(page, 0) * LISTING_PAGE_SIZE
+        topics = self.listing[start:start + LISTING_PAGE_SIZE]
+        topic_list = {'topics': [{key: topic.get(key) for key in LISTING_FIELDS} for topic in topics]}
+        if start + LISTING_PAGE_SIZE < len(self.listing):
+            topic_list['more_topics_url'] = f"/latest?no_definitions=true&page={page + 1}"
+        return {'topic_list': topic_list}
+
+    def bump_topics(self, fraction: float) -> int:
+        """
+        Bumps a random `fraction` of the topics to the top of the listing, as a new post would.
+
+        Returns:
+            The number of bumped topics.
+        """
+        bumped = random.sample(list(self.topics), round(fraction * len(self.topics)))
+        now = datetime.utcnow().isoformat(timespec='milliseconds') + 'Z'
+        for topic_id in bumped:
+            topic, _ = self.topics[topic_id]
+            topic['last_posted_at'] = topic['bumped_at'] = now
+        self.listing.sort(key=lambda topic: topic['bumped_at'], reverse=True)
+        return len(bumped)
+
+    def topic_detail(self, topic_id: int) -> dict | None:
+        if topic_id not in self.topics:
+            return None
+        topic, posts = self.topics[topic_id]
+        return {**topic, 'post_stream': {'posts': posts[:INLINED_POSTS], 'stream': [post['id'] for post in posts]}}
+
+    def topic_posts(self, topic_id: int, post_ids: set[int]) -> dict | None:
+        if topic_id not in self.topics:
+            return None
+        _, posts = self.topics[topic_id]
+        return {'id': topic_id, 'post_stream': {'posts': [post for post in posts if post['id'] in post_ids]}}
+
+    def respond(self, path: str, headers) -> tuple[int, bytes, dict]:
+        """
+        Answers a GET request like the Discourse JSON API, without the simulated latency.
+
+        Args:
+            path (str): The request path, with its query string.
+            headers: The request headers, `If-None-Match` and `Accept-Encoding` are honoured.
+
+        Returns:
+            The status, body and headers of the response.
+        """
+        with self._request_count_lock:
+            self.request_count += 1
+        url = urlparse(path)
+        query = parse_qs(url.query)
+        if url.path.startswith('/t/') and self.error_rate and random.random() < self.error_rate:
+            return self.error_status, b'{"errors":["injected error"]}', {'Retry-After': '1'}
+        data = None
+        if url.path == '/latest.json':
+            data = self.listing_page(int(query.get('page', ['0'])[0]))
+        elif match := re.fullmatch(r'/t/(\d+)\.json', url.path):
+            data = self.topic_detail(int(match.group(1)))
+        elif match := re.fullmatch(r'/t/(\d+)/posts\.json', url.path):
+            post_ids = {int(post_id) for post_id in query.get('post_ids[]', [])}
+            data = self.topic_posts(int(match.group(1)), post_ids)
+        if data is None:
+            return 404, b'', {}
+
+        body = orjson.dumps(data)
+        etag = f'"{hashlib.md5(body).hexdigest()}"'
+        if headers.get('If-None-Match') == etag:
+            return 304, b'', {'ETag': etag}
+        response_headers = {'ETag': etag, 'Content-Type': 'application/json; charset=utf-8'}
+        # Compressed like the forum, with brotli when the client and this environment support it
+        accepted = {encoding.strip() for encoding in (headers.get('Accept-Encoding') or '').split(',')}
+        if 'br' in accepted and brotli is not None:
+            body, response_headers['Content-Encoding'] = brotli.compress(body, quality=4), 'br'
+        elif 'gzip' in accepted:
+            body, response_headers['Content-Encoding'] = gzip.compress(body, compresslevel=5), 'gzip'
+        return 200, body, response_headers
+
+    def _handler_class(self):
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def log_message(self, format, *args):
+                pass
+
+            def do_GET(self):
+                if server.latency:
+                    time.sleep(server.latency)
+                status, body, headers = server.respond(self.path, self.headers)
+                self.send_response(status)
+                for key, value in headers.items():
+                    self.send_header(key, value)
+                self.send_header('Content-Length', str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+        return Handler
+
+    def start(self):
+        threading.Thread(target=self.httpd.serve_forever, daemon=True).start()
+
+    def stop(self):
+        self.httpd.shutdown()
+        self.httpd.server_close()
+
+
+def percentile(values: list[float], fraction: float) -> float | None:
+    if not values:
+        return None
+    values = sorted(values)
+    return values[min(len(values) - 1, int(round(fraction * (len(values) - 1))))]
+
+
+def run_crawl(pipeline: str, forum_url: str, days: int, work_dir: str, overrides: dict,
+              spider_args: dict | None = None) -> dict:
+    """
+    Runs the spider in the current process and returns its measurements.
+
+    The adaptive rate limiter is disabled unless `overrides` enables it, against the mock server it would
+    only measure its own pacing. A crawl that failed to start, did not finish or logged errors is reported
+    with an `error`.
+    """
+    from scrapy import signals
+    from scrapy.crawler import CrawlerProcess
+    from scrapy.utils.project import get_project_settings
+
+    from openai_community_scraper.spiders.openai_forum import OpenAIForumSpider
+
+    settings = get_project_settings()
+    settings.setdict({
+        'FORUM_URL': forum_url,
+        'LOG_FILE': os.path.join(work_dir, f'{pipeline}.log'),
+        'HTTPCACHE_ENABLED': False,
+        'ADAPTIVE_RATE_ENABLED': False,
+        # Every output and store of the crawl stays in the work directory
+        'JSON_OUTPUT_PATH': os.path.join(work_dir, f'{pipeline}.jsonl'),
+        'ARCHIVE_OUTPUT_PATH': os.path.join(work_dir, f'{pipeline}.archive.json.gz'),
+        'PARQUET_OUTPUT_DIR': os.path.join(work_dir, f'{pipeline}-parquet'),
+        'SEARCH_INDEX_PATH': os.path.join(work_dir, f'{pipeline}-search.db'),
+        'TOPIC_STATE_DB': os.path.join(work_dir, 'topic_state.db'),
+        'CONTENT_HASH_DB': os.path.join(work_dir, 'content_hashes.db'),
+        'METRICS_PROFILE_PATH': os.path.join(work_dir, 'profile-%(time)s.folded'),
+    }, priority='cmdline')
+    settings.setdict(overrides, priority='cmdline')
+    if pipeline == 'postgres' and not all(
+            settings.get(key) for key in ['POSTGRES_URI', 'POSTGRES_USER', 'POSTGRES_PASS', 'POSTGRES_DB']):
+        return {'pipeline': pipeline, 'skipped': 'Postgres is not configured'}
+
+    scheduled_at = {}
+    latencies = []
+    download_latencies = []
+    failures = []
+
+    def request_scheduled(request, spider):
+        topic = request.meta.get('topic_data')
+        if topic is not None:
+            scheduled_at.setdefault(topic['id'], time.perf_counter())
+
+    def response_received(response, request, spider):
+        if 'download_latency' in request.meta:
+            download_latencies.append(request.meta['download_latency'])
+
+    def item_scraped(item, response, spider):
+        if item.id in scheduled_at:
+            latencies.append(time.perf_counter() - scheduled_at[item.id])
+
+    process = CrawlerProcess(settings)
+    crawler = process.create_crawler(OpenAIForumSpider)
+    crawler.signals.connect(request_scheduled, signal=signals.request_scheduled)
+    crawler.signals.connect(item_scraped, signal=signals.item_scraped)
+    crawler.signals.connect(response_received, signal=signals.response_received)
+    started = time.perf_counter()
+    process.crawl(crawler, output_method=pipeline, days=days, **(spider_args or {})).addErrback(failures.append)
+    process.start()
+    elapsed = time.perf_counter() - started
+
+    stats = crawler.stats.get_stats()
+    items = stats.get('item_scraped_count', 0)
+    requests = stats.get('downloader/request_count', 0)
+    result = {
+        'pipeline': pipeline,
+        'items': items,
+        'requests': requests,
+        'elapsed_seconds': round(elapsed, 3),
+        'items_per_second': round(items / elapsed, 3) if elapsed else None,
+        'requests_per_item': round(requests / items, 3) if items else None,
+        'requests_per_second': round(requests / elapsed, 3) if elapsed else None,
+        'download_latency_p50_seconds': percentile(download_latencies, 0.5),
+        'download_latency_p99_seconds': percentile(download_latencies, 0.99),
+        'item_latency_p50_seconds': percentile(latencies, 0.5),
+        'item_latency_p99_seconds': percentile(latencies, 0.99),
+        # ru_maxrss is reported in kilobytes on Linux
+        'peak_rss_bytes': resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024,
+        'rate_limited': settings.getbool('ADAPTIVE_RATE_ENABLED'),
+        'finish_reason': stats.get('finish_reason'),
+    }
+    errors = stats.get('log_count/ERROR', 0)
+    if failures:
+        result['error'] = f"The crawl failed: {failures[0].getErrorMessage()}"
+    elif result['finish_reason'] != 'finished' or errors:
+        result['error'] = f"Finish reason {result['finish_reason']}, {errors} errors logged to {settings['LOG_FILE']}"
+    return result
+
+
+def git_revision() -> str | None:
+    try:
+        return subprocess.run(['git', 'rev-parse', 'HEAD'], capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def parse_overrides(values: list[str]) -> dict:
+    overrides = {}
+    for value in values:
+        key, _, setting = value.partition('=')
+        overrides[key] = setting
+    return overrides
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--data', default='output.json', help='Recorded topics, a JSON array or JSON Lines file.')
+    parser.add_argument('--pipelines', default='json', help='Comma separated output methods to benchmark.')
+    parser.add_argument('--days', type=int, default=3650, help='The days window passed to the spider.')
+    parser.add_argument('--latency', type=float, default=0.0, help='Seconds added to every mock response.')
+    parser.add_argument('--error-rate', type=float, default=0.0, help='Fraction of topic requests failing.')
+    parser.add_argument('--error-status', type=int, default=429, help='HTTP status of the injected errors.')
+    parser.add_argument('--report', help='Write the JSON report to this file instead of stdout.')
+    parser.add_argument('-s', '--set', action='append', default=[], metavar='NAME=VALUE',
+                        help='Override a Scrapy setting, may be repeated.')
+    parser.add_argument('-a', '--spider-arg', action='append', default=[], metavar='NAME=VALUE',
+                        help='Pass an argument to the spider, may be repeated.')
+    parser.add_argument('--incremental', type=float, metavar='FRACTION',
+                        help='Crawl every pipeline twice in incremental mode, bumping this fraction of the topics '
+                             'in between, and report the requests saved by the second crawl.')
+    parser.add_argument('--run-crawl', help=argparse.SUPPRESS)  # Internal: run a single crawl
+    parser.add_argument('--forum-url', help=argparse.SUPPRESS)
+    parser.add_argument('--work-dir', help=argparse.SUPPRESS)
+    args = parser.parse_args(argv)
+
+    if args.run_crawl:
+        result = run_crawl(args.run_crawl, args.forum_url, args.days, args.work_dir, parse_overrides(args.set),
+                           parse_overrides(args.spider_arg))
+        sys.stdout.buffer.write(orjson.dumps(result) + b'\n')
+        return 1 if 'error' in result else 0
+
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s [%(name)s] %(levelname)s: %(message)s')
+    server = MockDiscourseServer(load_topics(args.data), latency=args.latency, error_rate=args.error_rate,
+                                 error_status=args.error_status)
+    server.start()
+    results = []
+    incremental = []
+    try:
+        with tempfile.TemporaryDirectory() as work_dir:
+            def crawl(pipeline, *extra_args):
+                # Every crawl runs in its own process, so that the reactor and the peak RSS are not shared
+                command = [sys.executable, '-m', 'openai_community_scraper.benchmark', '--run-crawl', pipeline,
+                           '--forum-url', server.url, '--work-dir', work_dir, '--days', str(args.days), *extra_args]
+                for value in args.set:
+                    command += ['-s', value]
+                for value in args.spider_arg:
+                    command += ['-a', value]
+                completed = subprocess.run(command, capture_output=True)
+                try:
+                    result = orjson.loads(completed.stdout.splitlines()[-1])
+                except (IndexError, orjson.JSONDecodeError):
+                    result = {'pipeline': pipeline, 'error': f"The crawl exited with {completed.returncode}"}
+                if completed.returncode != 0:
+                    logging.error(f"The {pipeline} crawl failed: {result.get('error')}\n"
+                                  f"{completed.stderr.decode(errors='replace')}")
+                return result
+
+            for pipeline in args.pipelines.split(','):
+                logging.info(f"Benchmarking the {pipeline} pipeline against {server.url}")
+                if args.incremental is None:
+                    results.append(crawl(pipeline))
+                    continue
+                # Both runs of a pipeline share their topic state, the first one starts without any
+                state_args = ('-a', 'incremental=true', '-s', f"TOPIC_STATE_DB={work_dir}/{pipeline}-state.db")
+                initial = crawl(pipeline, *state_args)
+                changed = server.bump_topics(args.incremental)
+                rerun = crawl(pipeline, *state_args)
+                results += [{**initial, 'run': 'initial'}, {**rerun, 'run': 'incremental'}]
+                if 'error' not in initial and 'error' not in rerun:
+                    incremental.append({
+                        'pipeline': pipeline,
+                        'bumped_topics': changed,
+                        'initial_requests': initial['requests'],
+                        'incremental_requests': rerun['requests'],
+                        'requests_saved': round(1 - rerun['requests'] / initial['requests'], 3),
+                    })
+    finally:
+        server.stop()
+
+    report = orjson.dumps({
+        'revision': git_revision(),
+        'created_at': datetime.utcnow().isoformat(timespec='seconds') + 'Z',
+        'data': args.data,
+        'latency': args.latency,
+        'error_rate': args.error_rate,
+        'error_status': args.error_status,
+        'results': results,
+        **({'incremental': incremental} if args.incremental is not None else {}),
+    }, option=orjson.OPT_INDENT_2)
+    if args.report:
+        with open(args.report, 'wb') as file:
+            file.write(report)
+    else:
+        sys.stdout.buffer.write(report + b'\n')
+    return 1 if any('error' in result for result in results) else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
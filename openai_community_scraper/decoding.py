@@ -0,0 +1,294 @@
+"""
+Decoding of the Discourse JSON responses straight from the response bytes.
+
+With msgspec installed, listing pages are decoded into small structs holding only the fields the spider
+uses, topic responses only decode the fields of TopicDetail (skipping `details`, `suggested_topics`, ...),
+and posts are kept as raw JSON slices of the response until the topic item is built, when they are
+decoded straight into Post dataclasses. Without msgspec, responses are decoded into dicts with orjson.
+
+Usage:
+    python -m openai_community_scraper.decoding --data output.json
+"""
+import argparse
+import dataclasses
+import json
+import sys
+import time
+import tracemalloc
+from datetime import datetime
+from typing import Any, List, Optional
+
+import orjson
+
+from openai_community_scraper.items import POST_FIELDS, TOPIC_FIELDS, Post, TopicDetail, encode_item
+
+try:
+    import msgspec
+except ImportError:  # The msgspec decoders are optional
+    msgspec = None
+
+
+if msgspec is not None:
+    class ListingTopic(msgspec.Struct):
+        """
+        The fields of a `latest.json` topic used by the spider, readable like the listing dicts.
+        """
+        id: int
+        created_at: str
+        last_posted_at: Optional[str] = None
+        bumped_at: Optional[str] = None
+        posts_count: Optional[int] = None
+        highest_post_number: Optional[int] = None
+        views: Optional[int] = None
+
+        def __getitem__(self, key):
+            return getattr(self, key)
+
+        def get(self, key, default=None):
+            return getattr(self, key, default)
+
+    class _TopicList(msgspec.Struct):
+        topics: List[ListingTopic] = []
+        more_topics_url: Optional[str] = None
+
+    class _Listing(msgspec.Struct):
+        topic_list: _TopicList
+
+    class _PostStream(msgspec.Struct):
+        posts: List[msgspec.Raw] = []
+        stream: List[int] = []
+
+    class _PostsResponse(msgspec.Struct):
+        post_stream: _PostStream
+
+    class _PostId(msgspec.Struct):
+        id: int
+
+    _TopicResponse = msgspec.defstruct('_TopicResponse', [
+        ('id', int),
+        ('post_stream', _PostStream),
+        *((name, Any, None) for name in TOPIC_FIELDS if name not in ('id', 'post_comments')),
+    ])
+
+    _listing_decoder = msgspec.json.Decoder(_Listing)
+    _topic_decoder = msgspec.json.Decoder(_TopicResponse)
+    _posts_decoder = msgspec.json.Decoder(_PostsResponse)
+    _post_id_decoder = msgspec.json.Decoder(_PostId)
+    _post_decoder = msgspec.json.Decoder(Post)
+
+
+def decode_listing(body: bytes) -> tuple[list, str | None]:
+    """
+    Decodes a `latest.json` listing page.
+
+    Args:
+        body (bytes): The response body.
+
+    Returns:
+        The topics of the page, indexable like dicts (`topic['id']`, `topic.get('bumped_at')`), and the
+        `more_topics_url` of the page, if any.
+    """
+    if msgspec is None:
+        topic_list = orjson.loads(body)['topic_list']
+        return topic_list['topics'], topic_list.get('more_topics_url')
+    topic_list = _listing_decoder.decode(body).topic_list
+    return topic_list.topics, topic_list.more_topics_url
+
+
+def decode_topic(body: bytes) -> dict:
+    """
+    Decodes a `/t/{id}.json` topic response.
+
+    Args:
+        body (bytes): The response body.
+
+    Returns:
+        The topic as a dict, its `post_stream.posts` are opaque until passed to `build_posts`.
+    """
+    if msgspec is None:
+        return orjson.loads(body)
+    response = _topic_decoder.decode(body)
+    topic_data = {name: getattr(response, name) for name in response.__struct_fields__}
+    topic_data['post_stream'] = {'posts': response.post_stream.posts, 'stream': response.post_stream.stream}
+    return topic_data
+
+
+def decode_posts(body: bytes) -> list:
+    """
+    Decodes the posts of a `/t/{id}/posts.json` response, opaque until passed to `build_posts`.
+    """
+    if msgspec is None:
+        return orjson.loads(body)['post_stream']['posts']
+    return _posts_decoder.decode(body).post_stream.posts
+
+
+def post_ids(posts: list) -> list[int]:
+    """
+    Returns the ids of posts returned by `decode_topic` or `decode_posts`, without decoding the posts.
+    """
+    if msgspec is None:
+        return [post['id'] for post in posts]
+    return [_post_id_decoder.decode(post).id for post in posts]
+
+
+def build_posts(posts: list) -> list[Post]:
+    """
+    Materializes posts returned by `decode_topic` or `decode_posts` as Post items, ordered by post number.
+    """
+    if msgspec is None:
+        items = [Post.from_dict(post) for post in posts]
+    else:
+        items = []
+        for post in posts:
+            try:
+                items.append(_post_decoder.decode(post))
+            except msgspec.ValidationError:
+                # A field with an unexpected type, fall back to the lenient path
+                items.append(Post.from_dict(orjson.loads(bytes(post))))
+    items.sort(key=lambda post: post.post_number or 0)
+    return items
+
+
+def _response_bodies(topics: list[dict]) -> tuple[list[bytes], list[bytes]]:
+    # Rebuilds listing and topic responses from recorded topics, with the unused listing entries of
+    # `suggested_topics` and the viewer permissions Discourse adds to every post
+    listing_bodies, topic_bodies = [], []
+    listing_entries = [{key: value for key, value in topic.items() if key != 'post_comments'} for topic in topics]
+    for start in range(0, len(topics), 30):
+        listing_bodies.append(orjson.dumps({'topic_list': {
+            'topics': listing_entries[start:start + 30], 'more_topics_url': f'/latest?page={start // 30 + 1}'}}))
+    for index, topic in enumerate(topics):
+        topic = dict(listing_entries[index])
+        posts = [dict(post, can_edit=False, can_delete=False, can_recover=False, yours=False, read=True,
+                      bookmarked=False) for post in topics[index].get('post_comments') or []]
+        topic['post_stream'] = {'posts': posts, 'stream': [post['id'] for post in posts]}
+        topic['suggested_topics'] = listing_entries[index + 1:index + 6]
+        topic_bodies.append(orjson.dumps(topic))
+    return listing_bodies, topic_bodies
+
+
+def _time_per_call(function, bodies: list[bytes], repeat: int) -> float:
+    started = time.perf_counter()
+    for _ in range(repeat):
+        for body in bodies:
+            function(body)
+    return (time.perf_counter() - started) / (repeat * len(bodies)) * 1e6
+
+
+def _peak_bytes_per_call(function, bodies: list[bytes]) -> int:
+    # Peak traced memory while the results of all bodies are alive, like items waiting in the pipelines
+    tracemalloc.start()
+    results = [function(body) for body in bodies]
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    del results
+    return peak // max(1, len(bodies))
+
+
+# TopicDetail as it was before items were slotted: a regular dataclass holding the raw post dicts
+_DictTopicDetail = dataclasses.make_dataclass(
+    '_DictTopicDetail', [('id', Any)] + [(name, Any, None) for name in TOPIC_FIELDS if name != 'id'])
+
+
+def benchmark(topics: list[dict], repeat: int = 50) -> dict:
+    """
+    Compares the decoding paths on responses rebuilt from recorded topics.
+
+    - `json`: `response.json()`, a text decode and stdlib json.
+    - `orjson`: orjson from the response bytes into dicts, posts built with `Post.from_dict`.
+    - `decoder`: this module (msgspec when installed).
+
+    The `item_*` results time a whole topic item (decode, build, encode) and measure its peak memory:
+
+    - `dicts`: stdlib json, a regular dataclass holding the post dicts, `dataclasses.asdict` and `json.dumps`.
+    - `items`: this module, the slotted TopicDetail with Post records and `encode_item`.
+
+    Args:
+        topics (list[dict]): Recorded topics, e.g. loaded from `output.json`.
+        repeat (int): Number of times every response is decoded.
+
+    Returns:
+        The benchmark report, in microseconds per response.
+    """
+    listing_bodies, topic_bodies = _response_bodies(topics)
+    stdlib_post_fields = set(POST_FIELDS)
+
+    def stdlib_topic(body):
+        data = json.loads(body.decode('utf-8'))
+        return [Post(**{key: value for key, value in post.items() if key in stdlib_post_fields})
+                for post in data['post_stream']['posts']]
+
+    def orjson_topic(body):
+        return [Post.from_dict(post) for post in orjson.loads(body)['post_stream']['posts']]
+
+    def decoder_topic(body):
+        return build_posts(decode_topic(body)['post_stream']['posts'])
+
+    def dict_item(body):
+        data = json.loads(body.decode('utf-8'))
+        item = _DictTopicDetail(**{name: data.get(name) for name in TOPIC_FIELDS if name != 'post_comments'},
+                                post_comments=data['post_stream']['posts'])
+        return item, json.dumps(dataclasses.asdict(item))
+
+    def slotted_item(body):
+        data = decode_topic(body)
+        item = TopicDetail(**{name: data.get(name) for name in TOPIC_FIELDS if name != 'post_comments'},
+                           post_comments=build_posts(data['post_stream']['posts']))
+        return item, encode_item(item)
+
+    return {
+        'decoder': 'msgspec' if msgspec is not None else 'orjson',
+        'listing_pages': len(listing_bodies),
+        'topics': len(topic_bodies),
+        'avg_topic_bytes': sum(map(len, topic_bodies)) // max(1, len(topic_bodies)),
+        'listing_us': {
+            'json': round(_time_per_call(lambda body: json.loads(body.decode('utf-8')), listing_bodies, repeat), 1),
+            'orjson': round(_time_per_call(orjson.loads, listing_bodies, repeat), 1),
+            'decoder': round(_time_per_call(decode_listing, listing_bodies, repeat), 1),
+        },
+        'topic_with_posts_us': {
+            'json': round(_time_per_call(stdlib_topic, topic_bodies, repeat), 1),
+            'orjson': round(_time_per_call(orjson_topic, topic_bodies, repeat), 1),
+            'decoder': round(_time_per_call(decoder_topic, topic_bodies, repeat), 1),
+        },
+        # Topics that are dropped before their posts are needed, e.g. while more post batches are pending
+        'topic_without_posts_us': {
+            'orjson': round(_time_per_call(orjson.loads, topic_bodies, repeat), 1),
+            'decoder': round(_time_per_call(decode_topic, topic_bodies, repeat), 1),
+        },
+        'item_us': {
+            'dicts': round(_time_per_call(dict_item, topic_bodies, repeat), 1),
+            'items': round(_time_per_call(slotted_item, topic_bodies, repeat), 1),
+        },
+        'item_peak_bytes': {
+            'dicts': _peak_bytes_per_call(dict_item, topic_bodies),
+            'items': _peak_bytes_per_call(slotted_item, topic_bodies),
+        },
+    }
+
+
+def main(argv=None):
+    from openai_community_scraper.benchmark import git_revision, load_topics
+
+    parser = argparse.ArgumentParser(description='Benchmark of the JSON decoding paths of the spider.')
+    parser.add_argument('--data', default='output.json', help='Recorded topics, a JSON array or JSON Lines file.')
+    parser.add_argument('--repeat', type=int, default=50, help='Number of times every response is decoded.')
+    parser.add_argument('--report', help='Write the JSON report to this file instead of stdout.')
+    args = parser.parse_args(argv)
+
+    report = orjson.dumps({
+        'revision': git_revision(),
+        'created_at': datetime.utcnow().isoformat(timespec='seconds') + 'Z',
+        'data': args.data,
+        'results': benchmark(load_topics(args.data), args.repeat),
+    }, option=orjson.OPT_INDENT_2)
+    if args.report:
+        with open(args.report, 'wb') as file:
+            file.write(report)
+    else:
+        sys.stdout.buffer.write(report + b'\n')
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,353 @@
+import gzip
+import io
+import os
+import typing
+from collections import OrderedDict
+from dataclasses import fields
+from datetime import datetime
+
+import orjson
+
+try:
+    import zstandard
+except ImportError:  # zstd compression is optional
+    zstandard = None
+
+try:
+    import pyarrow
+    import pyarrow.compute
+    import pyarrow.parquet
+except ImportError:  # Parquet output is optional
+    pyarrow = None
+
+COMPRESSION_SUFFIXES = {
+    None: '',
+    'gzip': '.gz',
+    'zstd': '.zst',
+}
+
+
+class JsonLinesWriter:
+    """
+    A buffered JSON Lines writer with optional compression, size based rotation and atomic file creation.
+
+    Every output file is written to a temporary `.tmp` sibling and renamed into place once it is complete,
+    so readers never see a half written file under the final name.
+
+    Attributes:
+        path (str): Target file path, a part number is inserted before the extension when rotation is enabled.
+        compression (str | None): Either None, 'gzip' or 'zstd'.
+        buffer_size (int): Number of bytes collected in memory before they are written out.
+        max_file_size (int): Uncompressed bytes after which a new file is started, 0 disables rotation.
+        first_part (int | None): Number of the first file, files are always numbered when it is set.
+        paths (list[str]): The final paths of all files completed so far.
+    """
+
+    def __init__(self, path: str, compression: str | None = None, buffer_size: int = 1024 * 1024,
+                 max_file_size: int = 0, first_part: int | None = None):
+        if compression not in COMPRESSION_SUFFIXES:
+            raise ValueError(f"Unsupported compression: {compression}")
+        if compression == 'zstd' and zstandard is None:
+            raise ImportError("zstd compression requires the 'zstandard' package")
+        self.path = path
+        self.compression = compression
+        self.buffer_size = buffer_size
+        self.max_file_size = max_file_size
+        self.first_part = first_part
+        self.paths = []
+        self._part = first_part or 0
+        self._buffer = []
+        self._buffered_bytes = 0
+        self._file_bytes = 0
+        self._raw = None
+        self._stream = None
+        self._current_path = None
+
+    @property
+    def part(self) -> int:
+        """
+        Number of the file currently being written.
+        """
+        return self._part
+
+    @property
+    def file_bytes(self) -> int:
+        """
+        Uncompressed bytes written to the current file so far.
+        """
+        return self._file_bytes
+
+    def _next_path(self) -> str:
+        path = self.path
+        if self.max_file_size or self.first_part is not None:
+            root, ext = os.path.splitext(path)
+            path = f"{root}-{self._part:05d}{ext}"
+        return path + COMPRESSION_SUFFIXES[self.compression]
+
+    def _open(self):
+        self._current_path = self._next_path()
+        directory = os.path.dirname(self._current_path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self._raw = open(self._current_path + '.tmp', 'wb')
+        if self.compression == 'gzip':
+            self._stream = gzip.GzipFile(fileobj=self._raw, mode='wb')
+        elif self.compression == 'zstd':
+            self._stream = zstandard.ZstdCompressor().stream_writer(self._raw, closefd=False)
+        else:
+            self._stream = self._raw
+
+    def _flush_buffer(self):
+        if not self._buffer:
+            return
+        if self._stream is None:
+            self._open()
+        self._stream.write(b''.join(self._buffer))
+        self._buffer.clear()
+        self._buffered_bytes = 0
+
+    def _finish_file(self):
+        self._flush_buffer()
+        if self._stream is None:
+            return
+        if self._stream is not self._raw:
+            self._stream.close()
+        self._raw.flush()
+        os.fsync(self._raw.fileno())
+        self._raw.close()
+        os.replace(self._current_path + '.tmp', self._current_path)
+        self.paths.append(self._current_path)
+        self._stream = self._raw = None
+        self._file_bytes = 0
+        self._part += 1
+
+    def write(self, line: bytes):
+        """
+        Appends a single JSON document, which must not contain newlines, to the output.
+        """
+        if self.max_file_size and self._file_bytes and self._file_bytes + len(line) + 1 > self.max_file_size:
+            self._finish_file()
+        self._buffer.append(line)
+        self._buffer.append(b'\n')
+        self._buffered_bytes += len(line) + 1
+        self._file_bytes += len(line) + 1
+        if self._buffered_bytes >= self.buffer_size:
+            self._flush_buffer()
+
+    def part_path(self) -> str:
+        """
+        Returns the final path of the file currently being written.
+        """
+        return self._next_path()
+
+    def rotate(self):
+        """
+        Completes the current file, the next lines are written to a new file.
+        """
+        self._finish_file()
+
+    def close(self):
+        if not self.paths and not self._buffer and self._stream is None:
+            self._open()  # Always leave an (empty) output file behind
+        self._finish_file()
+
+
+def read_json_lines(path: str):
+    """
+    Iterates over the lines of a JSON Lines file written by JsonLinesWriter, decompressing it if needed.
+
+    Args:
+        path (str): The file path, the compression is derived from its extension.
+
+    Yields:
+        Every non empty line as bytes, without the trailing newline.
+    """
+    if path.endswith(COMPRESSION_SUFFIXES['gzip']):
+        file = gzip.open(path, 'rb')
+    elif path.endswith(COMPRESSION_SUFFIXES['zstd']):
+        if zstandard is None:
+            raise ImportError("zstd compression requires the 'zstandard' package")
+        file = io.BufferedReader(zstandard.ZstdDecompressor().stream_reader(open(path, 'rb'), closefd=True))
+    else:
+        file = open(path, 'rb')
+    with file:
+        for line in file:
+            line = line.rstrip(b'\n')
+            if line:
+                yield line
+
+
+def arrow_schema(item_class, exclude=()) -> 'pyarrow.Schema':
+    """
+    Derives an Arrow schema from the fields of an item dataclass.
+
+    Fields ending with `_at` are stored as UTC timestamps, lists of strings as string lists, and
+    nested objects as JSON encoded strings.
+
+    Args:
+        item_class: The item dataclass, e.g. `TopicDetail`.
+        exclude (tuple): Names of fields left out of the schema.
+
+    Returns:
+        The Arrow schema.
+    """
+    schema_fields = []
+    for item_field in fields(item_class):
+        if item_field.name in exclude:
+            continue
+        annotation = item_field.type
+        if typing.get_origin(annotation) is typing.Union:
+            annotation = next(arg for arg in typing.get_args(annotation) if arg is not type(None))
+        if item_field.name == 'id' or annotation is int:
+            # Topic ids are declared as str but Discourse returns integers
+            arrow_type = pyarrow.int64()
+        elif item_field.name.endswith('_at'):
+            arrow_type = pyarrow.timestamp('ms', tz='UTC')
+        elif annotation is bool:
+            arrow_type = pyarrow.bool_()
+        elif annotation is float:
+            arrow_type = pyarrow.float64()
+        elif annotation == typing.List[str]:
+            arrow_type = pyarrow.list_(pyarrow.string())
+        else:
+            arrow_type = pyarrow.string()
+        schema_fields.append(pyarrow.field(item_field.name, arrow_type))
+    return pyarrow.schema(schema_fields)
+
+
+def _arrow_converter(arrow_type):
+    if pyarrow.types.is_timestamp(arrow_type):
+        # Discourse timestamps end with 'Z', which fromisoformat only accepts from Python 3.11
+        return lambda value: datetime.fromisoformat(value.replace('Z', '+00:00')) if value else None
+    if pyarrow.types.is_string(arrow_type):
+        return lambda value: value if value is None or isinstance(value, str) else orjson.dumps(value).decode()
+    return lambda value: value
+
+
+class ParquetDatasetWriter:
+    """
+    Writes items to a Hive partitioned Parquet dataset, one `<partition_column>=<value>/part-0.parquet` file per partition.
+
+    Rows are buffered per partition and written out as a row group every `row_group_size` rows, to a temporary
+    `.tmp` file. At most `max_open_files` temporary files are open at once: the least recently written one is
+    closed and the next rows of its partition go to a new temporary file. When the writer is closed, the
+    temporary files of every written partition are merged, the rows of its previous file whose key was not
+    written again are carried over, and the file is atomically replaced. Partitions that received no rows are
+    left untouched, so a re-run only rewrites the partitions it affected.
+
+    Attributes:
+        path (str): Root directory of the dataset.
+        schema (pyarrow.Schema): Schema of the rows, see `arrow_schema`.
+        partition_column (str): Name of the partition directories, e.g. `created_date`.
+        key_column (str): Column identifying a row across runs.
+        row_group_size (int): Number of rows buffered per partition before they are written.
+        compression (str): Parquet compression codec.
+        max_open_files (int): Maximum number of temporary files open at once.
+        paths (list[str]): The final paths of all files completed so far.
+    """
+
+    def __init__(self, path: str, schema: 'pyarrow.Schema', partition_column: str, key_column: str = 'id',
+                 row_group_size: int = 10000, compression: str = 'zstd', max_open_files: int = 32):
+        if pyarrow is None:
+            raise ImportError("Parquet output requires the 'pyarrow' package")
+        self.path = path
+        self.schema = schema
+        self.partition_column = partition_column
+        self.key_column = key_column
+        self.row_group_size = row_group_size
+        self.compression = compression
+        self.max_open_files = max(1, max_open_files)
+        self.paths = []
+        self._columns = [(schema_field.name, _arrow_converter(schema_field.type)) for schema_field in schema]
+        self._buffers = {}
+        self._keys = {}
+        # Open writers, least recently written first, and the temporary files written for every partition
+        self._writers = OrderedDict()
+        self._parts = {}
+
+    def _partition_path(self, partition: str) -> str:
+        return os.path.join(self.path, f"{self.partition_column}={partition}", 'part-0.parquet')
+
+    def write(self, partition: str, item):
+        """
+        Appends an item to a partition.
+
+        Args:
+            partition (str): The partition value, e.g. `2024-01-31`.
+            item: A dataclass item with (at least) the fields of the schema.
+        """
+        buffer = self._buffers.get(partition)
+        if buffer is None:
+            buffer = self._buffers[partition] = [[] for _ in self._columns]
+            self._keys[partition] = set()
+        for values, (name, convert) in zip(buffer, self._columns):
+            values.append(convert(getattr(item, name)))
+        self._keys[partition].add(getattr(item, self.key_column))
+        if len(buffer[0]) >= self.row_group_size:
+            self._flush(partition)
+
+    def _flush(self, partition: str):
+        buffer = self._buffers[partition]
+        if not buffer[0]:
+            return
+        writer = self._writers.get(partition)
+        if writer is None:
+            if len(self._writers) >= self.max_open_files:
+                _, evicted = self._writers.popitem(last=False)
+                evicted.close()
+            final_path = self._partition_path(partition)
+            os.makedirs(os.path.dirname(final_path), exist_ok=True)
+            parts = self._parts.setdefault(partition, [])
+            parts.append(f"{final_path}.{len(parts)}.tmp")
+            writer = self._writers[partition] = pyarrow.parquet.ParquetWriter(
+                parts[-1], self.schema, compression=self.compression)
+        else:
+            self._writers.move_to_end(partition)
+        writer.write_batch(pyarrow.RecordBatch.from_arrays(
+            [pyarrow.array(values, type=schema_field.type) for values, schema_field in zip(buffer, self.schema)],
+            schema=self.schema))
+        for values in buffer:
+            values.clear()
+
+    def _carry_over(self, partition: str, writer):
+        # Keep the rows of the previous run that were not written again
+        final_path = self._partition_path(partition)
+        if not os.path.exists(final_path):
+            return
+        previous = pyarrow.parquet.read_table(final_path, columns=self.schema.names).cast(self.schema)
+        written = pyarrow.array(list(self._keys[partition]), type=self.schema.field(self.key_column).type)
+        previous = previous.filter(pyarrow.compute.invert(
+            pyarrow.compute.is_in(previous[self.key_column], value_set=written)))
+        if previous.num_rows:
+            writer.write_table(previous, row_group_size=self.row_group_size)
+
+    def _merge_parts(self, partition: str, parts: list[str]):
+        # Copies the temporary files of a partition into a single new one, a row group at a time
+        writer = pyarrow.parquet.ParquetWriter(
+            self._partition_path(partition) + '.tmp', self.schema, compression=self.compression)
+        for part in parts:
+            part_file = pyarrow.parquet.ParquetFile(part)
+            for row_group in range(part_file.num_row_groups):
+                writer.write_table(part_file.read_row_group(row_group))
+            part_file.close()
+            os.remove(part)
+        return writer, self._partition_path(partition) + '.tmp'
+
+    def close(self):
+        for partition in self._buffers:
+            self._flush(partition)
+            writer = self._writers.pop(partition, None)
+            parts = self._parts.pop(partition)
+            if writer is None or len(parts) > 1:
+                if writer is not None:
+                    writer.close()
+                writer, path = self._merge_parts(partition, parts)
+            else:
+                path = parts[0]
+            self._carry_over(partition, writer)
+            writer.close()
+            final_path = self._partition_path(partition)
+            os.replace(path, final_path)
+            self.paths.append(final_path)
+        self._buffers.clear()
+        self._keys.clear()
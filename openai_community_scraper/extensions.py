@@ -0,0 +1,164 @@
+import logging
+import socket
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from scrapy import signals
+from scrapy.exceptions import NotConfigured
+from twisted.internet import task
+
+from openai_community_scraper import metrics
+
+# Largest StatsD datagram, stays below the MTU of common networks
+STATSD_MAX_PACKET_SIZE = 1432
+
+
+class StageMetrics:
+    """
+    Scrapy extension collecting per stage timings of the crawl.
+
+    It enables the histograms of `openai_community_scraper.metrics`, records the download latency of every
+    response, samples the depth of the scheduler, downloader and scraper queues, and exposes everything on a
+    local Prometheus endpoint (`METRICS_PROMETHEUS_PORT`) and/or pushes it to StatsD (`METRICS_STATSD_HOST`).
+    StatsD observations are batched into packets of up to `STATSD_MAX_PACKET_SIZE` bytes, sent when full and
+    at every queue sample.
+    With `METRICS_PROFILE` enabled, runs slower than `METRICS_PROFILE_SLOW_SECS` dump sampled stacks of the
+    reactor thread in the folded format used by flamegraph tools.
+    """
+
+    def __init__(self, crawler):
+        settings = crawler.settings
+        self.crawler = crawler
+        self.prometheus_port = settings.getint('METRICS_PROMETHEUS_PORT', 0)
+        self.statsd_host = settings.get('METRICS_STATSD_HOST')
+        self.statsd_port = settings.getint('METRICS_STATSD_PORT', 8125)
+        self.sample_interval = settings.getfloat('METRICS_SAMPLE_INTERVAL', 1.0)
+        self.profile = settings.getbool('METRICS_PROFILE')
+        self.profile_slow_secs = settings.getfloat('METRICS_PROFILE_SLOW_SECS', 0)
+        self.profile_path = settings.get('METRICS_PROFILE_PATH', 'profile-%(time)s.folded')
+        self.httpd = None
+        self.statsd_socket = None
+        self.statsd_buffer = []
+        self.statsd_buffer_size = 0
+        self.statsd_lock = threading.Lock()
+        self.profiler = None
+        self.sampler = None
+
+    @classmethod
+    def from_crawler(cls, crawler):
+        if not crawler.settings.getbool('METRICS_ENABLED'):
+            raise NotConfigured
+        extension = cls(crawler)
+        crawler.signals.connect(extension.spider_opened, signal=signals.spider_opened)
+        crawler.signals.connect(extension.spider_closed, signal=signals.spider_closed)
+        crawler.signals.connect(extension.response_received, signal=signals.response_received)
+        return extension
+
+    def spider_opened(self, spider):
+        metrics.enabled = True
+        self.started = time.monotonic()
+        if self.prometheus_port:
+            self._start_prometheus_endpoint()
+        if self.statsd_host:
+            self.statsd_socket = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+            metrics.listeners.append(self._send_statsd)
+        if self.profile:
+            self.profiler = metrics.SamplingProfiler()
+            self.profiler.start()
+        self.sampler = task.LoopingCall(self._sample_queues)
+        self.sampler.start(self.sample_interval, now=False)
+
+    def spider_closed(self, spider):
+        if self.sampler is not None and self.sampler.running:
+            self.sampler.stop()
+        elapsed = time.monotonic() - self.started
+        if self.profiler is not None:
+            self.profiler.stop()
+            if elapsed >= self.profile_slow_secs:
+                path = self.profile_path % {'time': time.strftime('%Y-%m-%dT%H-%M-%S')}
+                self.profiler.dump(path)
+                logging.info(f"Run took {elapsed:.0f}s, sampled stacks written to {path}")
+        for (metric, label), histogram in metrics.histograms.items():
+            if metric == 'stage_seconds' and histogram.count:
+                self.crawler.stats.set_value(f'metrics/{label}/count', histogram.count)
+                self.crawler.stats.set_value(f'metrics/{label}/avg_seconds', round(histogram.sum / histogram.count, 6))
+        if self._send_statsd in metrics.listeners:
+            metrics.listeners.remove(self._send_statsd)
+        if self.statsd_socket is not None:
+            self._flush_statsd()
+            self.statsd_socket.close()
+        if self.httpd is not None:
+            self.httpd.shutdown()
+            self.httpd.server_close()
+        metrics.enabled = False
+
+    def response_received(self, response, request, spider):
+        if 'download_latency' in request.meta:
+            metrics.observe('stage_seconds', 'download', request.meta['download_latency'])
+
+    def _sample_queues(self):
+        if self.statsd_socket is not None:
+            self._flush_statsd()
+        engine = self.crawler.engine
+        if engine is None or engine.slot is None:
+            return
+        metrics.observe('queue_depth', 'scheduler', len(engine.slot.scheduler))
+        metrics.observe('queue_depth', 'downloader', len(engine.downloader.active))
+        metrics.observe('queue_depth', 'scraper', len(engine.scraper.slot.active))
+
+    def _send_statsd(self, metric, label, value):
+        # Durations are sent as timers in milliseconds, everything else as histograms
+        if metric == 'stage_seconds':
+            payload = f"openai_forum.{metric}.{label}:{value * 1000:.3f}|ms"
+        else:
+            payload = f"openai_forum.{metric}.{label}:{value}|h"
+        payload = payload.encode('ascii')
+        # Observations come from writer threads too
+        with self.statsd_lock:
+            if self.statsd_buffer_size + len(payload) + 1 > STATSD_MAX_PACKET_SIZE:
+                self._send_statsd_packet()
+            self.statsd_buffer.append(payload)
+            self.statsd_buffer_size += len(payload) + 1
+
+    def _flush_statsd(self):
+        with self.statsd_lock:
+            self._send_statsd_packet()
+
+    def _send_statsd_packet(self):
+        # One observation per line, the multi-metric packet format of StatsD
+        if not self.statsd_buffer:
+            return
+        packet = b'\n'.join(self.statsd_buffer)
+        self.statsd_buffer = []
+        self.statsd_buffer_size = 0
+        try:
+            self.statsd_socket.sendto(packet, (self.statsd_host, self.statsd_port))
+        except OSError:
+            pass
+
+    def _start_prometheus_endpoint(self):
+        class Handler(BaseHTTPRequestHandler):
+            def log_message(self, format, *args):
+                pass
+
+            def do_GET(self):
+                if self.path != '/metrics':
+                    self.send_response(404)
+                    self.end_headers()
+                    return
+                body = metrics.render_prometheus().encode('utf-8')
+                self.send_response(200)
+                self.send_header('Content-Type', 'text/plain; version=0.0.4')
+                self.send_header('Content-Length', str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+        try:
+            self.httpd = ThreadingHTTPServer(('127.0.0.1', self.prometheus_port), Handler)
+        except OSError as e:
+            # E.g. another crawl is using the port, serve the metrics on a free port instead
+            logging.warning(f"Cannot serve metrics on port {self.prometheus_port}: {e}")
+            self.httpd = ThreadingHTTPServer(('127.0.0.1', 0), Handler)
+        threading.Thread(target=self.httpd.serve_forever, name='prometheus-endpoint', daemon=True).start()
+        logging.info(f"Serving metrics on http://127.0.0.1:{self.httpd.server_address[1]}/metrics")
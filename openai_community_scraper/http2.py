@@ -0,0 +1,322 @@
+"""
+Pooled HTTP/2 download handler for the single host of the forum.
+
+Scrapy's HTTP/1.1 handler needs one connection (and TLS handshake) per concurrent request, and its built-in
+HTTP/2 handler puts every request to a host on a single connection. `PooledH2DownloadHandler` multiplexes
+the requests over a small pool of persistent HTTP/2 connections instead: a request goes to the connection
+with the fewest open streams, and a new connection is only opened once every connection carries
+`H2_MAX_STREAMS_PER_CONNECTION` streams, up to `H2_POOL_SIZE` connections. Idle connections are kept open
+for `H2_IDLE_TIMEOUT` seconds with TCP keep-alive, and a larger flow control window
+(`H2_INITIAL_WINDOW_SIZE`) lets topic responses arrive without waiting for window updates. Responses are
+negotiated with gzip, or brotli when the brotli package is installed, by Scrapy's HttpCompressionMiddleware.
+
+It is enabled for https requests with `HTTP2_ENABLED=true` (requires the h2 package), see settings.py.
+
+Usage:
+    python -m openai_community_scraper.http2 --data output.json --latency 0.05
+"""
+import argparse
+import logging
+import subprocess
+import sys
+import tempfile
+import threading
+from collections import deque
+from datetime import datetime, timedelta
+
+import orjson
+from scrapy.core.downloader.contextfactory import load_context_factory_from_settings
+from scrapy.exceptions import NotConfigured
+from twisted.internet import defer
+from twisted.internet.interfaces import ILoggingContext, IProtocolFactory
+from twisted.web.client import ResponseFailed
+from zope.interface import implementer_only
+
+try:
+    from h2.settings import SettingCodes
+    from scrapy.core.downloader.handlers.http2 import ScrapyH2Agent
+    from scrapy.core.http2.agent import H2ConnectionPool
+    from scrapy.core.http2.protocol import H2ClientFactory, H2ClientProtocol
+except ImportError:  # HTTP/2 downloads are optional
+    H2ClientProtocol = None
+
+
+if H2ClientProtocol is not None:
+    class PooledH2ClientProtocol(H2ClientProtocol):
+        """
+        An HTTP/2 connection with at most `H2_MAX_STREAMS_PER_CONNECTION` open streams, further requests
+        are queued on the connection.
+        """
+
+        def __init__(self, uri, settings, conn_lost_deferred):
+            super().__init__(uri, settings, conn_lost_deferred)
+            self.IDLE_TIMEOUT = settings.getint('H2_IDLE_TIMEOUT', 120)
+            self.max_streams = settings.getint('H2_MAX_STREAMS_PER_CONNECTION', 4)
+            self.window_size = settings.getint('H2_INITIAL_WINDOW_SIZE', 1024 * 1024)
+
+        @property
+        def allowed_max_concurrent_streams(self) -> int:
+            return min(super().allowed_max_concurrent_streams, self.max_streams)
+
+        @property
+        def load(self) -> int:
+            """
+            Number of open and queued streams.
+            """
+            return self.metadata['active_streams'] + len(self._pending_request_stream_pool)
+
+        def connectionMade(self):
+            self.transport.setTcpNoDelay(True)
+            self.transport.setTcpKeepAlive(True)
+            super().connectionMade()
+            # The default windows of 64 KiB stall large topic responses until the window is updated
+            self.conn.update_settings({SettingCodes.INITIAL_WINDOW_SIZE: self.window_size})
+            self.conn.increment_flow_control_window(self.window_size * self.max_streams)
+            self._write_to_transport()
+
+    # ALPN is set on the TLS context by Scrapy's AcceptableProtocolsContextFactory, a factory advertising its
+    # protocols makes Twisted set it again, which recent pyOpenSSL versions reject
+    @implementer_only(IProtocolFactory, ILoggingContext)
+    class PooledH2ClientFactory(H2ClientFactory):
+        def buildProtocol(self, addr):
+            self.instance = PooledH2ClientProtocol(self.uri, self.settings, self.conn_lost_deferred)
+            return self.instance
+
+    class PooledH2ConnectionPool(H2ConnectionPool):
+        """
+        Keeps up to `H2_POOL_SIZE` HTTP/2 connections per host and spreads the requests over them.
+
+        Attributes:
+            pool_size (int): Maximum number of connections per host.
+            max_streams (int): Open streams after which a connection is considered busy.
+            stats: The crawler stats, if any.
+        """
+
+        def __init__(self, reactor, settings, stats=None):
+            super().__init__(reactor, settings)
+            self.pool_size = settings.getint('H2_POOL_SIZE', 2)
+            self.max_streams = settings.getint('H2_MAX_STREAMS_PER_CONNECTION', 4)
+            self.stats = stats
+            self._connections = {}
+
+        def get_connection(self, key, uri, endpoint):
+            connections = self._connections.get(key, [])
+            conn = min(connections, key=lambda connection: connection.load, default=None)
+            if key in self._pending_requests:
+                # A connection is being made, requests go to the open connections until it is ready
+                if conn is not None:
+                    return defer.succeed(conn)
+                d = defer.Deferred()
+                self._pending_requests[key].append(d)
+                return d
+            if conn is None or (conn.load >= self.max_streams and len(connections) < self.pool_size):
+                return self._new_connection(key, uri, endpoint)
+            return defer.succeed(conn)
+
+        def _new_connection(self, key, uri, endpoint):
+            self._pending_requests[key] = deque()
+            conn_lost_deferred = defer.Deferred()
+            factory = PooledH2ClientFactory(uri, self.settings, conn_lost_deferred)
+            conn_lost_deferred.addCallback(self._remove_connection, key, factory)
+            conn_d = endpoint.connect(factory)
+            conn_d.addCallbacks(self.put_connection, self._connection_failed, callbackArgs=(key,), errbackArgs=(key,))
+            d = defer.Deferred()
+            self._pending_requests[key].append(d)
+            return d
+
+        def put_connection(self, conn, key):
+            connections = self._connections.setdefault(key, [])
+            connections.append(conn)
+            if self.stats is not None:
+                self.stats.inc_value('http2/connections_opened')
+                self.stats.max_value('http2/max_connections', len(connections))
+            pending_requests = self._pending_requests.pop(key, None)
+            while pending_requests:
+                pending_requests.popleft().callback(min(connections, key=lambda connection: connection.load))
+            return conn
+
+        def _connection_failed(self, failure, key):
+            pending_requests = self._pending_requests.pop(key, None)
+            while pending_requests:
+                pending_requests.popleft().errback(failure)
+
+        def _remove_connection(self, errors, key, factory):
+            conn = getattr(factory, 'instance', None)
+            connections = self._connections.get(key, [])
+            if conn in connections:
+                connections.remove(conn)
+                return
+            # Lost before it was ready, the requests waiting for it fail
+            pending_requests = self._pending_requests.pop(key, None)
+            while pending_requests:
+                pending_requests.popleft().errback(ResponseFailed(errors))
+
+        def close_connections(self):
+            for connections in self._connections.values():
+                for conn in connections:
+                    conn.transport.abortConnection()
+
+
+class PooledH2DownloadHandler:
+    """
+    Download handler sending requests over the pooled HTTP/2 connections of `PooledH2ConnectionPool`.
+    """
+
+    def __init__(self, settings, crawler=None):
+        from twisted.internet import reactor
+
+        self._crawler = crawler
+        self._pool = PooledH2ConnectionPool(reactor, settings, crawler.stats if crawler is not None else None)
+        self._context_factory = load_context_factory_from_settings(settings, crawler)
+
+    @classmethod
+    def from_crawler(cls, crawler):
+        if H2ClientProtocol is None:
+            logging.error("HTTP/2 downloads require the 'h2' package.")
+            raise NotConfigured
+        return cls(crawler.settings, crawler)
+
+    def download_request(self, request, spider):
+        agent = ScrapyH2Agent(context_factory=self._context_factory, pool=self._pool, crawler=self._crawler)
+        return agent.download_request(request, spider)
+
+    def close(self):
+        self._pool.close_connections()
+
+
+class TlsMockServer:
+    """
+    Serves a MockDiscourseServer over TLS from a reactor thread, negotiating HTTP/2 or HTTP/1.1 with ALPN.
+
+    Attributes:
+        url (str): The root URL of the running server.
+    """
+
+    def __init__(self, mock):
+        from twisted.internet import reactor, ssl
+        from twisted.internet.task import deferLater
+        from twisted.protocols.policies import WrappingFactory
+        from twisted.web import resource, server
+
+        class MockResource(resource.Resource):
+            isLeaf = True
+
+            def render_GET(self, request):
+                headers = {key.decode(): values[-1].decode()
+                           for key, values in request.requestHeaders.getAllRawHeaders()}
+                d = deferLater(reactor, mock.latency, mock.respond, request.uri.decode(), headers)
+                d.addCallback(self._finish, request)
+                return server.NOT_DONE_YET
+
+            @staticmethod
+            def _finish(response, request):
+                status, body, headers = response
+                request.setResponseCode(status)
+                for key, value in headers.items():
+                    request.setHeader(key, value)
+                request.setHeader('Content-Length', str(len(body)))
+                request.write(body)
+                request.finish()
+
+        certificate, private_key = self._certificate()
+        options = ssl.CertificateOptions(privateKey=private_key, certificate=certificate,
+                                         acceptableProtocols=[b'h2', b'http/1.1'])
+        self._reactor = reactor
+        # ALPN is set up by the certificate options, Twisted fails setting it again on recent pyOpenSSL
+        # versions when the factory advertises its protocols itself, as Site does
+        site = WrappingFactory(server.Site(MockResource()))
+        self._port = reactor.listenSSL(0, site, options, interface='127.0.0.1')
+        self.url = f"https://127.0.0.1:{self._port.getHost().port}"
+
+    @staticmethod
+    def _certificate():
+        # A throwaway self-signed certificate, Scrapy does not verify server certificates by default
+        from cryptography import x509
+        from cryptography.hazmat.primitives import hashes
+        from cryptography.hazmat.primitives.asymmetric import ec
+        from cryptography.x509.oid import NameOID
+        from OpenSSL import crypto
+
+        key = ec.generate_private_key(ec.SECP256R1())
+        name = x509.Name([x509.NameAttribute(NameOID.COMMON_NAME, 'localhost')])
+        now = datetime.utcnow()
+        certificate = (x509.CertificateBuilder().subject_name(name).issuer_name(name).public_key(key.public_key())
+                       .serial_number(x509.random_serial_number())
+                       .not_valid_before(now - timedelta(days=1)).not_valid_after(now + timedelta(days=1))
+                       .sign(key, hashes.SHA256()))
+        return crypto.X509.from_cryptography(certificate), crypto.PKey.from_cryptography_key(key)
+
+    def start(self):
+        threading.Thread(target=self._reactor.run, kwargs={'installSignalHandlers': False}, daemon=True).start()
+
+    def stop(self):
+        self._reactor.callFromThread(self._reactor.stop)
+
+
+def main(argv=None):
+    from openai_community_scraper.benchmark import MockDiscourseServer, git_revision, load_topics
+
+    parser = argparse.ArgumentParser(description='Benchmark of the HTTP/1.1 and pooled HTTP/2 download handlers.')
+    parser.add_argument('--data', default='output.json', help='Recorded topics, a JSON array or JSON Lines file.')
+    parser.add_argument('--latency', type=float, default=0.05, help='Seconds added to every mock response.')
+    parser.add_argument('--report', help='Write the JSON report to this file instead of stdout.')
+    parser.add_argument('-s', '--set', action='append', default=[], metavar='NAME=VALUE',
+                        help='Override a Scrapy setting for both crawls, may be repeated.')
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s [%(name)s] %(levelname)s: %(message)s')
+    handlers = {
+        'http1': 'scrapy.core.downloader.handlers.http11.HTTP11DownloadHandler',
+        'http2': 'openai_community_scraper.http2.PooledH2DownloadHandler',
+    }
+    mock = MockDiscourseServer(load_topics(args.data), latency=args.latency)
+    results = []
+    with tempfile.TemporaryDirectory() as work_dir:
+        server = TlsMockServer(mock)
+        server.start()
+        try:
+            for name, handler in handlers.items():
+                logging.info(f"Benchmarking the {name} download handler against {server.url}")
+                # The transport is measured, so requests are not paced by the rate limiter
+                command = [sys.executable, '-m', 'openai_community_scraper.benchmark', '--run-crawl', 'json',
+                           '--forum-url', server.url, '--work-dir', work_dir,
+                           '-s', 'ADAPTIVE_RATE_ENABLED=false', '-s', 'ROBOTSTXT_OBEY=false',
+                           '-s', 'DOWNLOAD_HANDLERS=' + orjson.dumps({'https': handler}).decode()]
+                for value in args.set:
+                    command += ['-s', value]
+                completed = subprocess.run(command, capture_output=True)
+                if completed.returncode != 0:
+                    logging.error(f"The {name} crawl failed:\n{completed.stderr.decode(errors='replace')}")
+                    results.append({'handler': name, 'error': completed.returncode})
+                    continue
+                results.append({'handler': name, **orjson.loads(completed.stdout.splitlines()[-1])})
+        finally:
+            server.stop()
+
+    report = {
+        'revision': git_revision(),
+        'created_at': datetime.utcnow().isoformat(timespec='seconds') + 'Z',
+        'data': args.data,
+        'latency': args.latency,
+        'results': results,
+    }
+    if len(results) == 2 and not any('error' in result for result in results):
+        http1, http2 = results
+        report['http2_gain'] = {
+            'requests_per_second': round(http2['requests_per_second'] / http1['requests_per_second'], 3),
+            'download_latency_p50': round(http1['download_latency_p50_seconds']
+                                          / http2['download_latency_p50_seconds'], 3),
+            'download_latency_p99': round(http1['download_latency_p99_seconds']
+                                          / http2['download_latency_p99_seconds'], 3),
+        }
+    report = orjson.dumps(report, option=orjson.OPT_INDENT_2)
+    if args.report:
+        with open(args.report, 'wb') as file:
+            file.write(report)
+    else:
+        sys.stdout.buffer.write(report + b'\n')
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,170 @@
+import json
+import logging
+import sqlite3
+import zlib
+from datetime import datetime, timezone
+from pathlib import Path
+from time import time
+
+from scrapy.downloadermiddlewares.httpcache import HttpCacheMiddleware
+from scrapy.extensions.httpcache import RFC2616Policy, rfc1123_to_epoch
+from scrapy.http import Headers
+from scrapy.responsetypes import responsetypes
+from scrapy.utils.project import data_path
+
+
+class TopicActivityPolicy(RFC2616Policy):
+    """
+    HTTP cache policy for the forum JSON endpoints.
+
+    Discourse marks its JSON responses as uncacheable, so every successful response is stored and then
+    revalidated with `If-None-Match`/`If-Modified-Since` instead of being served forever. Topic detail
+    requests carry their listing entry in `meta['topic_data']`: when the topic was not bumped since the
+    cached copy was downloaded, the cached copy is used without contacting the forum at all.
+    """
+
+    def should_cache_response(self, response, request):
+        return response.status == 200
+
+    def is_cached_response_fresh(self, cachedresponse, request):
+        topic = request.meta.get('topic_data') or {}
+        last_activity = topic.get('bumped_at') or topic.get('last_posted_at')
+        cached_at = rfc1123_to_epoch(cachedresponse.headers.get(b'Date'))
+        if last_activity and cached_at is not None:
+            last_activity = datetime.fromisoformat(last_activity.rstrip('Z')).replace(tzinfo=timezone.utc)
+            if last_activity.timestamp() <= cached_at:
+                return True
+
+        self._set_conditional_validators(request, cachedresponse)
+        return False
+
+
+class SqliteCacheStorage:
+    """
+    HTTP cache storage keeping zlib compressed responses in a single SQLite database per spider.
+
+    The database is bounded to `HTTPCACHE_MAX_BYTES` of compressed data, the least recently used
+    responses are evicted first.
+    """
+
+    def __init__(self, settings):
+        self.cachedir = data_path(settings['HTTPCACHE_DIR'], createdir=True)
+        self.expiration_secs = settings.getint('HTTPCACHE_EXPIRATION_SECS')
+        self.max_bytes = settings.getint('HTTPCACHE_MAX_BYTES', 256 * 1024 * 1024)
+        self.commit_every = 100
+        self.db = None
+
+    def open_spider(self, spider):
+        path = Path(self.cachedir, f"{spider.name}.sqlite")
+        self.db = sqlite3.connect(str(path))
+        self.db.execute("PRAGMA journal_mode=WAL")
+        self.db.execute("PRAGMA synchronous=NORMAL")
+        self.db.execute(
+            """
+            CREATE TABLE IF NOT EXISTS responses (
+                fingerprint BLOB PRIMARY KEY,
+                url TEXT,
+                status INTEGER,
+                headers BLOB,
+                body BLOB,
+                size INTEGER,
+                stored_at REAL,
+                accessed_at REAL
+            )
+            """
+        )
+        self.db.execute("CREATE INDEX IF NOT EXISTS responses_accessed_at_idx ON responses (accessed_at)")
+        self.total_size = self.db.execute("SELECT COALESCE(SUM(size), 0) FROM responses").fetchone()[0]
+        self._pending_writes = 0
+        self._fingerprinter = spider.crawler.request_fingerprinter
+        logging.debug(f"Using SQLite cache storage in {path}")
+
+    def close_spider(self, spider):
+        self.db.commit()
+        self.db.close()
+
+    def retrieve_response(self, spider, request):
+        fingerprint = self._fingerprinter.fingerprint(request)
+        row = self.db.execute(
+            "SELECT url, status, headers, body, stored_at FROM responses WHERE fingerprint = ?", (fingerprint,)
+        ).fetchone()
+        if row is None:
+            return None  # not cached
+        url, status, headers, body, stored_at = row
+        if 0 < self.expiration_secs < time() - stored_at:
+            return None  # expired
+
+        self._write("UPDATE responses SET accessed_at = ? WHERE fingerprint = ?", (time(), fingerprint))
+        headers = Headers(json.loads(zlib.decompress(headers)))
+        body = zlib.decompress(body)
+        respcls = responsetypes.from_args(headers=headers, url=url, body=body)
+        return respcls(url=url, headers=headers, status=status, body=body)
+
+    def store_response(self, spider, request, response):
+        fingerprint = self._fingerprinter.fingerprint(request)
+        headers = zlib.compress(json.dumps({
+            key.decode('latin-1'): [value.decode('latin-1') for value in values]
+            for key, values in response.headers.items()
+        }).encode('utf-8'))
+        body = zlib.compress(response.body)
+        size = len(headers) + len(body)
+
+        previous = self.db.execute("SELECT size FROM responses WHERE fingerprint = ?", (fingerprint,)).fetchone()
+        if previous is not None:
+            self.total_size -= previous[0]
+        now = time()
+        self._write(
+            "INSERT OR REPLACE INTO responses (fingerprint, url, status, headers, body, size, stored_at, accessed_at)"
+            " VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+            (fingerprint, response.url, response.status, headers, body, size, now, now),
+        )
+        self.total_size += size
+        if self.max_bytes and self.total_size > self.max_bytes:
+            self._evict()
+
+    def _evict(self):
+        # Drop least recently used responses until the cache is back to 90% of its limit
+        target = self.max_bytes * 0.9
+        evicted = []
+        for fingerprint, size in self.db.execute("SELECT fingerprint, size FROM responses ORDER BY accessed_at"):
+            if self.total_size <= target:
+                break
+            evicted.append((fingerprint,))
+            self.total_size -= size
+        self.db.executemany("DELETE FROM responses WHERE fingerprint = ?", evicted)
+        self.db.commit()
+        self._pending_writes = 0
+
+    def _write(self, query, params):
+        self.db.execute(query, params)
+        self._pending_writes += 1
+        if self._pending_writes >= self.commit_every:
+            self.db.commit()
+            self._pending_writes = 0
+
+
+class ConditionalHttpCacheMiddleware(HttpCacheMiddleware):
+    """
+    HttpCacheMiddleware also reporting the cache hit rate and the number of response bytes
+    that did not have to be downloaded (`httpcache/hit_rate` and `httpcache/bytes_saved`).
+    """
+
+    def process_request(self, request, spider):
+        cachedresponse = super().process_request(request, spider)
+        if cachedresponse is not None:
+            self.stats.inc_value('httpcache/bytes_saved', len(cachedresponse.body), spider=spider)
+        return cachedresponse
+
+    def process_response(self, request, response, spider):
+        cachedresponse = request.meta.get('cached_response')
+        result = super().process_response(request, response, spider)
+        if cachedresponse is not None and result is cachedresponse:
+            self.stats.inc_value('httpcache/bytes_saved', len(cachedresponse.body), spider=spider)
+        return result
+
+    def spider_closed(self, spider):
+        hits = self.stats.get_value('httpcache/hit', 0) + self.stats.get_value('httpcache/revalidate', 0)
+        lookups = hits + self.stats.get_value('httpcache/miss', 0) + self.stats.get_value('httpcache/invalidate', 0)
+        if lookups:
+            self.stats.set_value('httpcache/hit_rate', round(hits / lookups, 4), spider=spider)
+        super().spider_closed(spider)
@@ -1,8 +1,73 @@
-from dataclasses import dataclass, field
-from typing import Dict, List, Optional
+import hashlib
+from dataclasses import dataclass, field, fields
+from typing import Any, Dict, List, Optional
 
+import orjson
 
-@dataclass
+
+@dataclass(slots=True)
+class Post:
+    id: int
+    topic_id: Optional[int] = None
+    post_number: Optional[int] = None
+    post_type: Optional[int] = None
+    user_id: Optional[int] = None
+    username: Optional[str] = None
+    name: Optional[str] = None
+    display_username: Optional[str] = None
+    avatar_template: Optional[str] = None
+    user_title: Optional[str] = None
+    trust_level: Optional[int] = None
+    moderator: Optional[bool] = None
+    admin: Optional[bool] = None
+    staff: Optional[bool] = None
+    primary_group_name: Optional[str] = None
+    flair_name: Optional[str] = None
+    flair_url: Optional[str] = None
+    flair_bg_color: Optional[str] = None
+    flair_color: Optional[str] = None
+    flair_group_id: Optional[int] = None
+    title_is_group: Optional[bool] = None
+    group_moderator: Optional[bool] = None
+    created_at: Optional[str] = None
+    updated_at: Optional[str] = None
+    deleted_at: Optional[str] = None
+    cooked: Optional[str] = None
+    version: Optional[int] = None
+    edit_reason: Optional[str] = None
+    reply_count: Optional[int] = None
+    reply_to_post_number: Optional[int] = None
+    reply_to_user: Optional[Dict[str, Any]] = None
+    quote_count: Optional[int] = None
+    incoming_link_count: Optional[int] = None
+    reads: Optional[int] = None
+    readers_count: Optional[int] = None
+    score: Optional[float] = None
+    topic_slug: Optional[str] = None
+    actions_summary: Optional[List[Dict[str, Any]]] = None
+    link_counts: Optional[List[Dict[str, Any]]] = None
+    polls: Optional[List[Dict[str, Any]]] = None
+    action_code: Optional[str] = None
+    via_email: Optional[bool] = None
+    hidden: Optional[bool] = None
+    user_deleted: Optional[bool] = None
+    wiki: Optional[bool] = None
+    accepted_answer: Optional[bool] = None
+    topic_accepted_answer: Optional[bool] = None
+
+    @classmethod
+    def from_dict(cls, data: dict) -> 'Post':
+        """
+        Builds a Post from a Discourse post, keys that are not Post fields (like the
+        permissions of the anonymous viewer, `can_edit`, `yours`, ...) are dropped.
+        """
+        return cls(**{name: data[name] for name in POST_FIELDS if name in data})
+
+
+POST_FIELDS = tuple(f.name for f in fields(Post))
+
+
+@dataclass(slots=True)
 class TopicDetail:
     id: str
     title: Optional[str] = None
@@ -29,4 +94,56 @@ class TopicDetail:
     current_post_number: Optional[int] = None
     highest_post_number: Optional[int] = None
     thumbnails: Optional[str] = None
-    post_comments: Optional[dict] = None
+    post_comments: Optional[List[Post]] = None
+
+    @classmethod
+    def from_dict(cls, data: dict) -> 'TopicDetail':
+        """
+        Builds a TopicDetail from a topic of the JSON output, unknown keys are dropped.
+        """
+        topic = cls(**{name: data[name] for name in TOPIC_FIELDS if name in data and name != 'post_comments'})
+        if data.get('post_comments') is not None:
+            topic.post_comments = [Post.from_dict(post) for post in data['post_comments']]
+        return topic
+
+
+TOPIC_FIELDS = tuple(f.name for f in fields(TopicDetail))
+
+
+@dataclass(slots=True)
+class TopicCounters:
+    """
+    Counters update of a topic whose content did not change since the previous run.
+    """
+    id: int
+    views: Optional[int] = None
+    like_count: Optional[int] = None
+    reply_count: Optional[int] = None
+
+    @classmethod
+    def from_topic(cls, topic: TopicDetail) -> 'TopicCounters':
+        return cls(id=topic.id, views=topic.views, like_count=topic.like_count, reply_count=topic.reply_count)
+
+
+TOPIC_COUNTER_FIELDS = tuple(f.name for f in fields(TopicCounters) if f.name != 'id')
+# Engagement counters of a post, they change with every read or like and are not part of its content hash
+POST_COUNTER_FIELDS = ('reply_count', 'quote_count', 'incoming_link_count', 'reads', 'readers_count', 'score',
+                       'actions_summary', 'link_counts')
+
+
+def content_hash(item, exclude=()) -> bytes:
+    """
+    Computes a stable 128 bit hash of the fields of an item, leaving out the `exclude` fields.
+    """
+    data = {f.name: getattr(item, f.name) for f in fields(item) if f.name not in exclude}
+    return hashlib.blake2b(orjson.dumps(data, option=orjson.OPT_SORT_KEYS), digest_size=16).digest()
+
+
+def encode_item(item) -> bytes:
+    """
+    Serializes an item (or any of its nested values) to compact JSON bytes.
+
+    orjson serializes dataclasses natively, so the item is encoded without building an
+    intermediate deep copy with `dataclasses.asdict`.
+    """
+    return orjson.dumps(item)
@@ -0,0 +1,182 @@
+"""
+Runs a sharded crawl of the forum across several worker processes.
+
+The `days` window is split into one date window per worker. Every worker is a regular
+`scrapy crawl openai_forum` process restricted to its window with `days`/`days_offset`.
+The workers share a SQLite frontier so that a topic is never fetched twice, and split the
+request rate and concurrency budget of a single crawl between them. With the JSON
+output method the shards written by the workers are merged into a single output once all
+workers have finished.
+
+Usage:
+    python -m openai_community_scraper.launcher --days 365 --workers 4
+"""
+import argparse
+import glob
+import logging
+import math
+import os
+import shutil
+import subprocess
+import sys
+from datetime import datetime
+
+import orjson
+from scrapy.utils.project import get_project_settings
+
+from openai_community_scraper.exporters import JsonLinesWriter, read_json_lines
+from openai_community_scraper.spiders.openai_forum import OpenAIForumSpider
+
+# Marks a work directory created by the launcher, only such directories are ever deleted
+WORK_DIR_MARKER = '.launcher-work-dir'
+
+
+def split_days(days: int, workers: int) -> list[tuple[int, int]]:
+    """
+    Splits the last `days` days into consecutive (days_offset, days) windows, one per worker.
+
+    Args:
+        days (int): Number of past days to scrape.
+        workers (int): Number of worker processes.
+
+    Returns:
+        The non empty windows, most recent first.
+    """
+    bounds = [round(days * i / workers) for i in range(workers + 1)]
+    return [(start, end) for start, end in zip(bounds, bounds[1:]) if end > start]
+
+
+def worker_settings(settings, workers: int) -> list[str]:
+    """
+    Splits the request rate and concurrency limits of a single crawl between the workers, so that
+    all workers together stay within the budget of one crawl against the forum.
+
+    Args:
+        settings (Settings): The project settings.
+        workers (int): Number of worker processes.
+
+    Returns:
+        The `-s` arguments of every worker.
+    """
+    limits = {
+        'ADAPTIVE_RATE_START': settings.getfloat('ADAPTIVE_RATE_START') / workers,
+        'ADAPTIVE_RATE_MIN': settings.getfloat('ADAPTIVE_RATE_MIN') / workers,
+        'ADAPTIVE_RATE_MAX': settings.getfloat('ADAPTIVE_RATE_MAX') / workers,
+        # A request needs a whole token
+        'ADAPTIVE_RATE_BURST': max(1.0, settings.getfloat('ADAPTIVE_RATE_BURST') / workers),
+        'CONCURRENT_REQUESTS_PER_DOMAIN': math.ceil(settings.getint('CONCURRENT_REQUESTS_PER_DOMAIN') / workers),
+    }
+    return [arg for name, value in limits.items() for arg in ('-s', f'{name}={value:g}')]
+
+
+def prepare_work_dir(work_dir: str):
+    """
+    Empties the work directory of a previous launch, or creates it.
+
+    Raises:
+        FileExistsError: If the directory is not empty and was not created by the launcher.
+    """
+    if os.path.exists(os.path.join(work_dir, WORK_DIR_MARKER)):
+        shutil.rmtree(work_dir)
+    elif os.path.isdir(work_dir) and os.listdir(work_dir):
+        raise FileExistsError(f"{work_dir} is not empty and was not created by the launcher")
+    os.makedirs(work_dir, exist_ok=True)
+    open(os.path.join(work_dir, WORK_DIR_MARKER), 'w').close()
+
+
+def start_worker(index: int, days_offset: int, days: int, output_method: str, work_dir: str,
+                 frontier: str, extra_args: list[str], metrics_port: int = 0) -> subprocess.Popen:
+    command = [
+        sys.executable, '-m', 'scrapy', 'crawl', OpenAIForumSpider.name,
+        '-a', f'output_method={output_method}',
+        '-a', f'days={days}',
+        '-a', f'days_offset={days_offset}',
+        '-a', f'frontier={frontier}',
+        '-a', f'output_path={os.path.join(work_dir, f"shard-{index}.jsonl")}',
+        '-s', f'LOG_FILE={os.path.join(work_dir, f"worker-{index}.log")}',
+        # SQLite caches are not shared between processes
+        '-s', f'HTTPCACHE_DIR=httpcache/shard-{index}',
+        # Every worker serves its metrics on its own port
+        '-s', f'METRICS_PROMETHEUS_PORT={metrics_port + index if metrics_port else 0}',
+        *extra_args,
+    ]
+    logging.info(f"Starting worker {index} for days {days_offset} to {days}")
+    return subprocess.Popen(command)
+
+
+def merge_shards(work_dir: str, writer: JsonLinesWriter) -> int:
+    """
+    Merges the JSON Lines shards of all workers, keeping one line per topic id.
+
+    Args:
+        work_dir (str): The directory containing the shards.
+        writer (JsonLinesWriter): The writer of the merged output.
+
+    Returns:
+        The number of merged topics.
+    """
+    seen_ids = set()
+    for path in sorted(glob.glob(os.path.join(work_dir, 'shard-*.jsonl*'))):
+        if path.endswith('.tmp'):
+            continue  # Left behind by a worker that did not finish
+        for line in read_json_lines(path):
+            topic_id = orjson.loads(line)['id']
+            if topic_id not in seen_ids:
+                seen_ids.add(topic_id)
+                writer.write(line)
+    writer.close()
+    return len(seen_ids)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--days', type=int, default=7, help='Number of past days to scrape.')
+    parser.add_argument('--workers', type=int, default=2,
+                        help='Number of worker processes, they share the request rate of a single crawl.')
+    parser.add_argument('--output-method', default='json',
+                        help='Comma separated output methods of the workers, json and/or postgres.')
+    parser.add_argument('--output', help='Path of the merged JSON output, defaults to JSON_OUTPUT_PATH.')
+    parser.add_argument('--work-dir', default='shards', help='Directory for the frontier, shards and worker logs.')
+    parser.add_argument('--keep-shards', action='store_true', help='Keep the work directory after merging.')
+    parser.add_argument('scrapy_args', nargs='*', help='Extra arguments passed to every worker, after `--`.')
+    args = parser.parse_args(argv)
+    output_methods = args.output_method.split(',')
+    if not set(output_methods) <= {'json', 'postgres'}:
+        parser.error('--output-method only supports json and postgres')
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s [%(name)s] %(levelname)s: %(message)s')
+
+    settings = get_project_settings()
+    try:
+        prepare_work_dir(args.work_dir)
+    except FileExistsError as e:
+        parser.error(str(e))
+    frontier = os.path.join(args.work_dir, 'frontier.db')
+
+    windows = split_days(args.days, max(1, args.workers))
+    # Arguments after `--` come last, so they override the split limits
+    extra_args = worker_settings(settings, len(windows)) + args.scrapy_args
+    workers = [
+        start_worker(index, days_offset, days, args.output_method, args.work_dir, frontier, extra_args,
+                     metrics_port=settings.getint('METRICS_PROMETHEUS_PORT'))
+        for index, (days_offset, days) in enumerate(windows)
+    ]
+    failed = [index for index, worker in enumerate(workers) if worker.wait() != 0]
+    if failed:
+        logging.error(f"Workers {failed} failed, see their logs in {args.work_dir}")
+
+    if 'json' in output_methods:
+        output = args.output or settings.get('JSON_OUTPUT_PATH') % {
+            'name': OpenAIForumSpider.name, 'time': datetime.utcnow().strftime('%Y-%m-%dT%H-%M-%S')}
+        writer = JsonLinesWriter(output, compression=settings.get('JSON_OUTPUT_COMPRESSION') or None,
+                                 buffer_size=settings.getint('JSON_OUTPUT_BUFFER_SIZE'),
+                                 max_file_size=settings.getint('JSON_OUTPUT_MAX_FILE_SIZE'))
+        count = merge_shards(args.work_dir, writer)
+        logging.info(f"Merged {count} topics into {', '.join(writer.paths)}")
+
+    if not args.keep_shards and not failed:
+        shutil.rmtree(args.work_dir)
+    return 1 if failed else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
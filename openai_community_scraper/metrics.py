@@ -0,0 +1,155 @@
+"""
+In-process histograms for timing the hot paths of the crawl.
+
+The spider, the middlewares and the pipelines record observations through `observe` and `timed`.
+Nothing is recorded until the StageMetrics extension enables collection, so instrumented code
+costs a single flag check when metrics are disabled.
+"""
+import sys
+import threading
+import time
+from collections import Counter
+from contextlib import contextmanager
+
+SECONDS_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+SIZE_BUCKETS = (1, 2, 5, 10, 20, 50, 100, 200, 500, 1000, 2000, 5000)
+
+# Histogram name -> (help text, label name, buckets)
+METRICS = {
+    'stage_seconds': ("Time spent in each stage of the crawl", 'stage', SECONDS_BUCKETS),
+    'queue_depth': ("Sampled number of requests or items waiting in each queue", 'queue', SIZE_BUCKETS),
+    'batch_size': ("Number of items in each database batch", 'pipeline', SIZE_BUCKETS),
+}
+
+enabled = False
+listeners = []
+
+
+class Histogram:
+    """
+    A cumulative histogram with fixed upper bounds, safe to update from several threads.
+    """
+
+    def __init__(self, buckets):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.sum = 0.0
+        self.count = 0
+        self._lock = threading.Lock()
+
+    def observe(self, value: float):
+        index = len(self.buckets)
+        for i, bound in enumerate(self.buckets):
+            if value <= bound:
+                index = i
+                break
+        with self._lock:
+            self.counts[index] += 1
+            self.sum += value
+            self.count += 1
+
+    def cumulative_counts(self) -> list[tuple[str, int]]:
+        with self._lock:
+            counts = list(self.counts)
+        cumulative, total = [], 0
+        for bound, count in zip([*map(str, self.buckets), '+Inf'], counts):
+            total += count
+            cumulative.append((bound, total))
+        return cumulative
+
+
+histograms = {}
+_histograms_lock = threading.Lock()
+
+
+def observe(metric: str, label: str, value: float):
+    """
+    Records one observation of a metric, e.g. `observe('stage_seconds', 'decode', 0.002)`.
+    """
+    if not enabled:
+        return
+    key = (metric, label)
+    histogram = histograms.get(key)
+    if histogram is None:
+        with _histograms_lock:
+            histogram = histograms.setdefault(key, Histogram(METRICS[metric][2]))
+    histogram.observe(value)
+    for listener in listeners:
+        listener(metric, label, value)
+
+
+@contextmanager
+def timed(stage: str):
+    """
+    Context manager recording the time spent in its block as a `stage_seconds` observation.
+    """
+    if not enabled:
+        yield
+        return
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        observe('stage_seconds', stage, time.perf_counter() - start)
+
+
+def render_prometheus(prefix: str = 'openai_forum') -> str:
+    """
+    Renders all histograms in the Prometheus text exposition format.
+    """
+    lines = []
+    for metric, (help_text, label_name, _) in METRICS.items():
+        series = sorted((label, histogram) for (name, label), histogram in list(histograms.items()) if name == metric)
+        if not series:
+            continue
+        lines.append(f"# HELP {prefix}_{metric} {help_text}")
+        lines.append(f"# TYPE {prefix}_{metric} histogram")
+        for label, histogram in series:
+            for bound, count in histogram.cumulative_counts():
+                lines.append(f'{prefix}_{metric}_bucket{{{label_name}="{label}",le="{bound}"}} {count}')
+            lines.append(f'{prefix}_{metric}_sum{{{label_name}="{label}"}} {histogram.sum}')
+            lines.append(f'{prefix}_{metric}_count{{{label_name}="{label}"}} {histogram.count}')
+    return '\n'.join(lines) + '\n'
+
+
+class SamplingProfiler:
+    """
+    Periodically samples the stack of a thread and aggregates the samples as folded stacks,
+    the input format of flamegraph.pl and speedscope.
+
+    Attributes:
+        interval (float): Seconds between two samples.
+        samples (Counter): Number of samples per folded stack.
+    """
+
+    def __init__(self, interval: float = 0.005, thread_id: int | None = None):
+        self.interval = interval
+        self.thread_id = thread_id or threading.main_thread().ident
+        self.samples = Counter()
+        self._stopped = threading.Event()
+        self._thread = None
+
+    def start(self):
+        self._thread = threading.Thread(target=self._run, name='sampling-profiler', daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stopped.set()
+        if self._thread is not None:
+            self._thread.join()
+
+    def _run(self):
+        while not self._stopped.wait(self.interval):
+            frame = sys._current_frames().get(self.thread_id)
+            stack = []
+            while frame is not None:
+                code = frame.f_code
+                stack.append(f"{code.co_name} ({code.co_filename}:{code.co_firstlineno})")
+                frame = frame.f_back
+            if stack:
+                self.samples[';'.join(reversed(stack))] += 1
+
+    def dump(self, path: str):
+        with open(path, 'w') as file:
+            for stack, count in self.samples.most_common():
+                file.write(f"{stack} {count}\n")
@@ -3,7 +3,17 @@
 # See documentation in:
 # https://docs.scrapy.org/en/latest/topics/spider-middleware.html
 
+import json
+import logging
+import time
+from email.utils import parsedate_to_datetime
+from urllib.parse import urlparse
+
 from scrapy import signals
+from scrapy.exceptions import NotConfigured
+from twisted.internet import task
+
+from openai_community_scraper import metrics
 
 # useful for handling different item types with a single interface
 from itemadapter import is_item, ItemAdapter
@@ -56,6 +66,35 @@ class OpenaiCommunityScraperSpiderMiddleware:
         spider.logger.info("Spider opened: %s" % spider.name)
 
 
+class CallbackTimingMiddleware:
+    """
+    Spider middleware recording the time spent inside each spider callback (e.g. `parse`,
+    `parse_topic_detail`) as `stage_seconds` observations, excluding the time spent by
+    Scrapy while consuming the yielded requests and items.
+    """
+
+    @classmethod
+    def from_crawler(cls, crawler):
+        if not crawler.settings.getbool('METRICS_ENABLED'):
+            raise NotConfigured
+        return cls()
+
+    def process_spider_output(self, response, result, spider):
+        callback = getattr(response.request.callback, '__name__', 'parse') if response.request else 'parse'
+        result = iter(result)
+        elapsed = 0.0
+        while True:
+            start = time.perf_counter()
+            try:
+                output = next(result)
+            except StopIteration:
+                break
+            finally:
+                elapsed += time.perf_counter() - start
+            yield output
+        metrics.observe('stage_seconds', callback, elapsed)
+
+
 class OpenaiCommunityScraperDownloaderMiddleware:
     # Not all methods need to be defined. If a method is not defined,
     # scrapy acts as if the downloader middleware does not modify the
@@ -101,3 +140,159 @@ class OpenaiCommunityScraperDownloaderMiddleware:
 
     def spider_opened(self, spider):
         spider.logger.info("Spider opened: %s" % spider.name)
+
+
+class TokenBucket:
+    """
+    Paces requests to `rate` requests per second, allowing bursts of up to `burst` requests.
+
+    Tokens may go negative, the debt is the queue of requests already promised a future slot.
+    """
+
+    def __init__(self, rate: float, burst: float):
+        self.rate = rate
+        self.burst = burst
+        self.tokens = burst
+        self.updated = time.monotonic()
+
+    def _refill(self):
+        now = time.monotonic()
+        self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def reserve(self) -> float:
+        """
+        Takes a token and returns the number of seconds the caller has to wait before using it.
+        """
+        self._refill()
+        self.tokens -= 1
+        return 0.0 if self.tokens >= 0 else -self.tokens / self.rate
+
+    def pause(self, seconds: float):
+        """
+        Hands out no new tokens for the next `seconds` seconds.
+        """
+        self._refill()
+        self.tokens = min(self.tokens, 0) - seconds * self.rate
+
+    def set_rate(self, rate: float):
+        self._refill()
+        self.rate = rate
+
+
+class AdaptiveRateLimitMiddleware:
+    """
+    Downloader middleware pacing requests with one token bucket per forum endpoint.
+
+    Listing pages (`latest.json`), topic details (`/t/{id}.json`) and post batches (`/t/{id}/posts.json`)
+    are paced independently. The rate of an endpoint grows additively while its responses are faster than
+    `ADAPTIVE_RATE_TARGET_LATENCY`, and shrinks when they get slower. A `429` halves the rate, pauses the
+    endpoint for the time requested by the server (`Retry-After` or Discourse's `extras.wait_seconds`) and
+    retries the request. Current rates are exposed in the stats as `ratelimit/<endpoint>/rate`.
+    """
+
+    def __init__(self, stats, start_rate=1.0, min_rate=0.2, max_rate=10.0, burst=2.0, target_latency=1.0,
+                 max_retries=5):
+        self.stats = stats
+        self.start_rate = start_rate
+        self.min_rate = min_rate
+        self.max_rate = max_rate
+        self.burst = burst
+        self.target_latency = target_latency
+        self.max_retries = max_retries
+        self.buckets = {}
+
+    @classmethod
+    def from_crawler(cls, crawler):
+        if not crawler.settings.getbool('ADAPTIVE_RATE_ENABLED'):
+            raise NotConfigured
+        return cls(
+            stats=crawler.stats,
+            start_rate=crawler.settings.getfloat('ADAPTIVE_RATE_START', 1.0),
+            min_rate=crawler.settings.getfloat('ADAPTIVE_RATE_MIN', 0.2),
+            max_rate=crawler.settings.getfloat('ADAPTIVE_RATE_MAX', 10.0),
+            burst=crawler.settings.getfloat('ADAPTIVE_RATE_BURST', 2.0),
+            target_latency=crawler.settings.getfloat('ADAPTIVE_RATE_TARGET_LATENCY', 1.0),
+            max_retries=crawler.settings.getint('ADAPTIVE_RATE_MAX_RETRIES', 5),
+        )
+
+    @staticmethod
+    def endpoint(request) -> str:
+        """
+        Returns the name of the endpoint (and so the token bucket) a request belongs to.
+        """
+        path = urlparse(request.url).path
+        if path.endswith('/latest.json'):
+            return 'listing'
+        if path.endswith('/posts.json'):
+            return 'posts'
+        if path.startswith('/t/'):
+            return 'detail'
+        return 'other'
+
+    def _bucket(self, endpoint: str) -> TokenBucket:
+        if endpoint not in self.buckets:
+            self.buckets[endpoint] = TokenBucket(self.start_rate, self.burst)
+            self._set_rate_stat(endpoint)
+        return self.buckets[endpoint]
+
+    def _set_rate_stat(self, endpoint: str):
+        self.stats.set_value(f'ratelimit/{endpoint}/rate', round(self.buckets[endpoint].rate, 3))
+
+    def process_request(self, request, spider):
+        delay = self._bucket(self.endpoint(request)).reserve()
+        if delay <= 0:
+            return None
+        self.stats.inc_value('ratelimit/delayed')
+        from twisted.internet import reactor
+
+        return task.deferLater(reactor, delay, lambda: None)
+
+    def process_response(self, request, response, spider):
+        if 'cached' in response.flags:
+            return response
+
+        endpoint = self.endpoint(request)
+        bucket = self._bucket(endpoint)
+        if response.status == 429:
+            self.stats.inc_value(f'ratelimit/{endpoint}/throttled')
+            bucket.set_rate(max(self.min_rate, bucket.rate / 2))
+            bucket.pause(self._retry_after(response) or 1 / bucket.rate)
+            self._set_rate_stat(endpoint)
+            retries = request.meta.get('rate_limit_retries', 0)
+            if retries < self.max_retries:
+                retry_request = request.copy()
+                retry_request.meta['rate_limit_retries'] = retries + 1
+                retry_request.dont_filter = True
+                return retry_request
+            logging.warning(f"Giving up on {request.url} after {retries} rate limited retries")
+            return response
+
+        latency = request.meta.get('download_latency')
+        if latency is not None and response.status < 500:
+            if latency <= self.target_latency:
+                bucket.set_rate(min(self.max_rate, bucket.rate + 0.1 * self.start_rate))
+            else:
+                bucket.set_rate(max(self.min_rate, bucket.rate * 0.9))
+            self._set_rate_stat(endpoint)
+        return response
+
+    @staticmethod
+    def _retry_after(response) -> float | None:
+        """
+        Returns the number of seconds the server asked us to wait, if any.
+        """
+        retry_after = response.headers.get('Retry-After')
+        if retry_after:
+            retry_after = retry_after.decode('latin-1').strip()
+            if retry_after.isdigit():
+                return float(retry_after)
+            try:
+                return max(0.0, parsedate_to_datetime(retry_after).timestamp() - time.time())
+            except (TypeError, ValueError):
+                pass
+        # Discourse reports the wait time of rate limited requests in the JSON body
+        try:
+            return float(json.loads(response.body)['extras']['wait_seconds'])
+        except (ValueError, KeyError, TypeError):
+            return None
@@ -1,85 +1,463 @@
-import dataclasses
-import json
+import io
 import logging
+import os
+import time
+from collections import deque
+from dataclasses import is_dataclass
+from datetime import datetime
 
 import psycopg2
-import psycopg2.extras
-from scrapy.exceptions import NotConfigured
+import psycopg2.pool
+from itemadapter import ItemAdapter
+from scrapy.exceptions import DropItem, NotConfigured
+from twisted.internet import defer, threads
+from twisted.python.threadpool import ThreadPool
+
+from openai_community_scraper import metrics
+from openai_community_scraper.archive import ArchiveWriter
+from openai_community_scraper.exporters import JsonLinesWriter, ParquetDatasetWriter, arrow_schema, pyarrow
+from openai_community_scraper.items import Post, TopicCounters, TopicDetail, encode_item
+from openai_community_scraper.search import SearchIndex
 
 
 class JsonPipeline:
+    def __init__(self, output_path, compression=None, buffer_size=1024 * 1024, max_file_size=0,
+                 checkpoint_interval=500):
+        self.output_path = output_path
+        self.compression = compression
+        self.buffer_size = buffer_size
+        self.max_file_size = max_file_size
+        self.checkpoint_interval = checkpoint_interval
+
+    @classmethod
+    def from_crawler(cls, crawler):
+        compression = crawler.settings.get('JSON_OUTPUT_COMPRESSION') or None
+        try:
+            # Fail early if the requested compression is not available
+            JsonLinesWriter('', compression=compression)
+        except (ImportError, ValueError) as e:
+            logging.error(f"JSON output is not configured: {e}")
+            raise NotConfigured
+        pipeline = cls(
+            output_path=crawler.settings.get('JSON_OUTPUT_PATH', 'output.jsonl'),
+            compression=compression,
+            buffer_size=crawler.settings.getint('JSON_OUTPUT_BUFFER_SIZE', 1024 * 1024),
+            max_file_size=crawler.settings.getint('JSON_OUTPUT_MAX_FILE_SIZE', 0),
+            checkpoint_interval=crawler.settings.getint('CHECKPOINT_INTERVAL', 500)
+        )
+        pipeline.stats = crawler.stats
+        return pipeline
+
     def open_spider(self, spider):
-        self.file = open('output.json', 'w')
-        self.file.write('[')  # Write opening bracket
-        self.is_first_item = True
+        # The spider argument `-a output_path=...` overrides the setting for a single run
+        path_template = getattr(spider, 'output_path', None) or self.output_path
+        path = path_template % {'name': spider.name, 'time': datetime.utcnow().strftime('%Y-%m-%dT%H-%M-%S')}
+        self.checkpoint = getattr(spider, 'checkpoint', None)
+        if self.checkpoint is None:
+            self.writer = JsonLinesWriter(path, compression=self.compression, buffer_size=self.buffer_size,
+                                          max_file_size=self.max_file_size)
+            return
+        # Resumable crawls write one numbered file per checkpoint, continuing the files of the stopped run
+        path = self.checkpoint.get_value('json/output_path') or path
+        self.checkpoint.set_value('json/output_path', path)
+        self.writer = JsonLinesWriter(path, compression=self.compression, buffer_size=self.buffer_size,
+                                      max_file_size=self.max_file_size,
+                                      first_part=int(self.checkpoint.get_value('json/next_part', 0)))
+        self.committed = self.checkpoint.committed_topics('json')
+        self.uncommitted = []
 
     def close_spider(self, spider):
-        self.file.write(']')  # Write closing bracket
-        self.file.close()
+        if self.checkpoint is not None:
+            self._checkpoint()
+            if not self.writer.paths:
+                return
+        self.writer.close()
+        logging.info(f"JSON output written to {', '.join(self.writer.paths)}")
 
     def process_item(self, item, spider):
-        # Convert dataclass instance to a dictionary
-        item_dict = dataclasses.asdict(item)
-        line = json.dumps(item_dict)
+        if self.checkpoint is not None and item.id in self.committed:
+            self.stats.inc_value('sink/json/replay_skipped')
+            return item
+        with metrics.timed('encode_item'):
+            line = encode_item(item)
+        if self.checkpoint is not None:
+            if (self.max_file_size and self.uncommitted
+                    and self.writer.file_bytes + len(line) + 1 > self.max_file_size):
+                # A full file ends with a checkpoint, so that every completed file is committed
+                self._checkpoint()
+            self.uncommitted.append(item.id)
+        self.writer.write(line)
+        self.stats.inc_value('sink/json/items')
+        if self.checkpoint is not None and len(self.uncommitted) >= self.checkpoint_interval:
+            self._checkpoint()
+        return item
 
-        # Handle comma placement
-        if not self.is_first_item:
-            self.file.write(',\n')
-        else:
-            self.is_first_item = False
+    def _checkpoint(self):
+        # The commit only counts once the file has been renamed to the recorded path
+        if not self.uncommitted:
+            return
+        self.checkpoint.record_commit('json', self.uncommitted, marker=self.writer.part_path())
+        self.checkpoint.set_value('json/next_part', self.writer.part + 1)
+        self.writer.rotate()
+        self.uncommitted = []
+
+
+class ArchivePipeline:
+    """
+    Writes the topics to a compact archive with interned users and asset URLs, see
+    `openai_community_scraper.archive`.
 
-        self.file.write(line)
+    Topics are encoded and spooled to a temporary file as they are scraped, and the archive is written
+    when the spider closes. A resumed crawl replays the items of the stopped run, so the archive is
+    rebuilt with all of them.
+    """
+
+    def __init__(self, output_path):
+        self.output_path = output_path
+
+    @classmethod
+    def from_crawler(cls, crawler):
+        pipeline = cls(output_path=crawler.settings.get('ARCHIVE_OUTPUT_PATH', 'output.archive.json.gz'))
+        pipeline.stats = crawler.stats
+        return pipeline
+
+    def open_spider(self, spider):
+        self.writer = ArchiveWriter(self.output_path)
+
+    def close_spider(self, spider):
+        self.writer.close()
+        logging.info(f"Archive of {self.writer.topic_count} topics written to {self.output_path}")
+
+    def process_item(self, item, spider):
+        if isinstance(item, TopicCounters):
+            # The archive holds full topics only
+            self.stats.inc_value('sink/archive/skipped_counter_updates')
+            return item
+        with metrics.timed('convert_item'):
+            self.writer.add(item)
+        self.stats.inc_value('sink/archive/items')
         return item
 
 
+class ParquetPipeline:
+    """
+    Writes topics and their flattened posts to two Parquet datasets, `topics` and `posts`, partitioned by
+    the day the topic was created (`created_date=YYYY-MM-DD`).
+
+    Posts are stored in the partition of their topic, so a topic and its posts are always rewritten
+    together. Only the partitions that received items are rewritten, see `ParquetDatasetWriter`.
+    """
+
+    def __init__(self, output_dir, row_group_size=10000, compression='zstd', max_open_files=32):
+        self.output_dir = output_dir
+        self.row_group_size = row_group_size
+        self.compression = compression
+        self.max_open_files = max_open_files
+
+    @classmethod
+    def from_crawler(cls, crawler):
+        if pyarrow is None:
+            logging.error("Parquet output requires the 'pyarrow' package.")
+            raise NotConfigured
+        pipeline = cls(
+            output_dir=crawler.settings.get('PARQUET_OUTPUT_DIR', 'output_parquet'),
+            row_group_size=crawler.settings.getint('PARQUET_ROW_GROUP_SIZE', 10000),
+            compression=crawler.settings.get('PARQUET_COMPRESSION', 'zstd'),
+            max_open_files=crawler.settings.getint('PARQUET_MAX_OPEN_FILES', 32)
+        )
+        pipeline.stats = crawler.stats
+        return pipeline
+
+    def open_spider(self, spider):
+        self.topics = ParquetDatasetWriter(
+            os.path.join(self.output_dir, 'topics'), arrow_schema(TopicDetail, exclude=('post_comments',)),
+            partition_column='created_date', row_group_size=self.row_group_size, compression=self.compression,
+            max_open_files=self.max_open_files)
+        self.posts = ParquetDatasetWriter(
+            os.path.join(self.output_dir, 'posts'), arrow_schema(Post),
+            partition_column='created_date', row_group_size=self.row_group_size, compression=self.compression,
+            max_open_files=self.max_open_files)
+        self.checkpoint = getattr(spider, 'checkpoint', None)
+        self.committed = self.checkpoint.committed_topics('parquet') if self.checkpoint is not None else set()
+        self.written = []
+
+    def close_spider(self, spider):
+        self.topics.close()
+        self.posts.close()
+        if self.checkpoint is not None:
+            # Partitions are only replaced at the end of the crawl, which commits all items at once
+            self.checkpoint.record_commit('parquet', self.written)
+        logging.info(f"Parquet output written to {len(self.topics.paths)} partitions in {self.output_dir}")
+
+    def process_item(self, item, spider):
+        if item.id in self.committed:
+            self.stats.inc_value('sink/parquet/replay_skipped')
+            return item
+        self.written.append(item.id)
+        if isinstance(item, TopicCounters):
+            # The partition of the topic is unknown, counters are refreshed with the next full item
+            self.stats.inc_value('sink/parquet/skipped_counter_updates')
+            return item
+        with metrics.timed('convert_item'):
+            partition = item.created_at[:10]
+            self.topics.write(partition, item)
+            for post in item.post_comments or []:
+                self.posts.write(partition, post)
+        self.stats.inc_value('sink/parquet/items')
+        return item
+
+
+class SearchIndexPipeline:
+    """
+    Builds and incrementally updates the local full-text search index, see `openai_community_scraper.search`.
+    """
+
+    def __init__(self, index_path, checkpoint_interval=500):
+        self.index_path = index_path
+        self.checkpoint_interval = checkpoint_interval
+
+    @classmethod
+    def from_crawler(cls, crawler):
+        pipeline = cls(
+            index_path=crawler.settings.get('SEARCH_INDEX_PATH', 'search_index.db'),
+            checkpoint_interval=crawler.settings.getint('CHECKPOINT_INTERVAL', 500)
+        )
+        pipeline.stats = crawler.stats
+        return pipeline
+
+    def open_spider(self, spider):
+        self.index = SearchIndex(self.index_path)
+        self.checkpoint = getattr(spider, 'checkpoint', None)
+        self.committed = self.checkpoint.committed_topics('search') if self.checkpoint is not None else set()
+        self.uncommitted = []
+
+    def close_spider(self, spider):
+        self._checkpoint()
+        self.index.close()
+        logging.info(f"Search index updated in {self.index_path}")
+
+    def process_item(self, item, spider):
+        if item.id in self.committed:
+            self.stats.inc_value('sink/search/replay_skipped')
+            return item
+        with metrics.timed('index_item'):
+            indexed_posts = self.index.add(item)
+        self.stats.inc_value('sink/search/items')
+        self.stats.inc_value('sink/search/indexed_posts', indexed_posts)
+        if self.checkpoint is not None:
+            self.uncommitted.append(item.id)
+            if len(self.uncommitted) >= self.checkpoint_interval:
+                self._checkpoint()
+        return item
+
+    def _checkpoint(self):
+        if self.checkpoint is None or not self.uncommitted:
+            return
+        self.index.commit()
+        self.checkpoint.record_commit('search', self.uncommitted)
+        self.uncommitted = []
+
+TOPIC_COLUMNS = ['id', 'tags', 'tags_descriptions', 'title', 'posts_count',
+                 'created_at', 'views', 'reply_count', 'like_count', 'last_posted_at',
+                 'visible', 'closed', 'archived', 'archetype', 'slug', 'word_count',
+                 'deleted_at', 'user_id', 'featured_link', 'image_url', 'current_post_number',
+                 'highest_post_number', 'participant_count', 'thumbnails', 'vote_count']
+POST_COLUMNS = ['id', 'topic_id', 'post_number', 'created_at', 'updated_at', 'data']
+COUNTER_COLUMNS = ['id', 'views', 'like_count', 'reply_count']
+
+# Set based merges of the staging tables, the latest staged row wins if an id was staged twice
+MERGE_TOPICS_QUERY = f"""
+INSERT INTO topic_details ({', '.join(TOPIC_COLUMNS)})
+SELECT DISTINCT ON (id) {', '.join(
+    "CASE WHEN tags IS NULL THEN NULL ELSE ARRAY(SELECT jsonb_array_elements_text(tags)) END AS tags"
+    if col == 'tags' else col for col in TOPIC_COLUMNS)}
+FROM topic_details_staging
+ORDER BY id, seq DESC
+ON CONFLICT (id) DO UPDATE SET {', '.join(f"{col}=EXCLUDED.{col}" for col in TOPIC_COLUMNS if col != 'id')}
+"""
+MERGE_POSTS_QUERY = f"""
+INSERT INTO topic_posts ({', '.join(POST_COLUMNS)})
+SELECT DISTINCT ON (id) {', '.join(POST_COLUMNS)}
+FROM topic_posts_staging
+ORDER BY id, seq DESC
+ON CONFLICT (id) DO UPDATE SET {', '.join(f"{col}=EXCLUDED.{col}" for col in POST_COLUMNS if col != 'id')}
+WHERE topic_posts.data IS DISTINCT FROM EXCLUDED.data
+"""
+# TopicCounters items only touch the counters of existing topics
+UPDATE_COUNTERS_QUERY = f"""
+UPDATE topic_details SET {', '.join(f"{col}=staged.{col}" for col in COUNTER_COLUMNS if col != 'id')}
+FROM (
+    SELECT DISTINCT ON (id) {', '.join(COUNTER_COLUMNS)}
+    FROM topic_counters_staging
+    ORDER BY id, seq DESC
+) AS staged
+WHERE topic_details.id = staged.id
+"""
+# Tables created before posts moved to topic_posts keep them in a post_comments JSON column,
+# they are copied over once and the column is dropped
+MIGRATE_POST_COMMENTS_QUERY = """
+INSERT INTO topic_posts (id, topic_id, post_number, created_at, updated_at, data)
+SELECT (post->>'id')::BIGINT, topic_details.id, (post->>'post_number')::INTEGER,
+       (post->>'created_at')::TIMESTAMP, (post->>'updated_at')::TIMESTAMP, post::JSONB
+FROM topic_details, json_array_elements(topic_details.post_comments) AS post
+WHERE json_typeof(topic_details.post_comments) = 'array' AND post->>'id' IS NOT NULL
+ON CONFLICT (id) DO NOTHING;
+ALTER TABLE topic_details DROP COLUMN post_comments;
+"""
+
+
 class PostgresPipeline:
-    def __init__(self, postgres_uri, postgres_user, postgres_pass, postgres_db, batch_size=100):
+    """
+    Writes items to Postgres in batches without blocking the reactor.
+
+    Batches are written by a small pool of writer threads, each using its own connection from a
+    connection pool. When more than `max_pending_batches` batches are waiting to be written, the
+    `backpressure` mode decides what happens to new items:
+
+    - `block`: `process_item` returns a Deferred that only fires once the oldest batch has been committed.
+      The item processing of the whole crawl waits for it, so the crawl is throttled to the speed of
+      Postgres, and the other outputs of the crawl too.
+    - `drop`: the item is not written to Postgres and is dropped (`DropItem`), so the other outputs keep
+      the speed of the crawl. Dropped items are counted in `sink/postgres/backpressure_dropped_items`. As
+      dropped items are not scraped, an incremental crawl fetches their topics again on its next run.
+
+    Failed batches are retried `batch_retries` times with an exponential backoff before they are dropped.
+    The topics of a dropped batch are passed to the `discard_topics` hook of the spider, so their state is
+    not recorded and an incremental crawl fetches them again on its next run.
+    The lag of the pipeline (items accepted but not committed yet, and their age) is reported in the
+    `sink/postgres/` stats.
+    """
+
+    def __init__(self, postgres_uri, postgres_user, postgres_pass, postgres_db, batch_size=100,
+                 pool_size=2, max_pending_batches=4, batch_retries=2, backpressure='block'):
         self.postgres_uri = postgres_uri
         self.postgres_user = postgres_user
         self.postgres_pass = postgres_pass
         self.postgres_db = postgres_db
         self.batch_size = batch_size
+        self.pool_size = pool_size
+        self.max_pending_batches = max_pending_batches
+        self.batch_retries = batch_retries
+        self.backpressure = backpressure
         self.items_buffer = []
+        self.buffer_ids = []
+        self.buffer_started = None
+        self.lag_items = 0
+        self._pending_writes = deque()
+        self.discard_topics = None
 
     @classmethod
     def from_crawler(cls, crawler):
         if not all(crawler.settings.get(key) for key in ['POSTGRES_URI', 'POSTGRES_USER', 'POSTGRES_PASS', 'POSTGRES_DB']):
             logging.error("Postgres is not configured.")
             raise NotConfigured
-        return cls(
+        if crawler.settings.get('POSTGRES_BACKPRESSURE', 'block') not in ('block', 'drop'):
+            logging.error("POSTGRES_BACKPRESSURE must be 'block' or 'drop'.")
+            raise NotConfigured
+        pipeline = cls(
             postgres_uri=crawler.settings.get('POSTGRES_URI'),
             postgres_user=crawler.settings.get('POSTGRES_USER'),
             postgres_pass=crawler.settings.get('POSTGRES_PASS'),
             postgres_db=crawler.settings.get('POSTGRES_DB'),
-            batch_size=crawler.settings.get('BATCH_SIZE', 100)
+            batch_size=crawler.settings.getint('BATCH_SIZE', 100),
+            pool_size=crawler.settings.getint('POSTGRES_POOL_SIZE', 2),
+            max_pending_batches=crawler.settings.getint('POSTGRES_MAX_PENDING_BATCHES', 4),
+            batch_retries=crawler.settings.getint('POSTGRES_BATCH_RETRIES', 2),
+            backpressure=crawler.settings.get('POSTGRES_BACKPRESSURE', 'block')
         )
+        pipeline.stats = crawler.stats
+        return pipeline
 
     def open_spider(self, spider):
-        self.connection = psycopg2.connect(
+        # Every writer thread keeps its connection, the pool would close connections above its minimum
+        self.pool = psycopg2.pool.ThreadedConnectionPool(
+            self.pool_size, self.pool_size,
             host=self.postgres_uri,
             user=self.postgres_user,
             password=self.postgres_pass,
             dbname=self.postgres_db
         )
-        self.cursor = self.connection.cursor()
+        self.threadpool = ThreadPool(minthreads=1, maxthreads=self.pool_size, name='postgres-writer')
+        self.threadpool.start()
         self._create_table()
+        self.checkpoint = getattr(spider, 'checkpoint', None)
+        self.committed = self.checkpoint.committed_topics('postgres') if self.checkpoint is not None else set()
+        self.discard_topics = getattr(spider, 'discard_topics', None)
 
     def close_spider(self, spider):
         if self.items_buffer:
-            self._insert_items()
-        self.connection.close()
+            self._flush()
+        writes = defer.DeferredList(list(self._pending_writes))
+        writes.addBoth(self._shutdown)
+        return writes
+
+    def _shutdown(self, _):
+        self.threadpool.stop()
+        self.pool.closeall()
 
     def process_item(self, item, spider):
-        self.items_buffer.append(self._convert_item(item))
+        if item.id in self.committed:
+            self.stats.inc_value('sink/postgres/replay_skipped')
+            return item
+        if self.backpressure == 'drop' and len(self._pending_writes) > self.max_pending_batches:
+            self.stats.inc_value('sink/postgres/backpressure_dropped_items')
+            raise DropItem(f"Postgres write queue is full ({len(self._pending_writes)} batches pending)")
+        with metrics.timed('convert_item'):
+            self.items_buffer.append(self._convert_item(item))
+        self.buffer_ids.append(item.id)
+        if self.buffer_started is None:
+            self.buffer_started = time.monotonic()
+        self.lag_items += 1
+        self.stats.max_value('sink/postgres/max_lag_items', self.lag_items)
         if len(self.items_buffer) >= self.batch_size:
-            self._insert_items()
+            self._flush()
+        if self.backpressure == 'block' and len(self._pending_writes) > self.max_pending_batches:
+            # Backpressure, hold the item (and with it the crawl) until the oldest batch has been written
+            written = defer.Deferred()
+            self._pending_writes[0].addBoth(lambda _: written.callback(item))
+            return written
         return item
 
+    def _flush(self):
+        from twisted.internet import reactor
+
+        items, self.items_buffer = self.items_buffer, []
+        topic_ids, self.buffer_ids = self.buffer_ids, []
+        started, self.buffer_started = self.buffer_started, None
+        write = threads.deferToThreadPool(reactor, self.threadpool, self._insert_items, items)
+        write.addCallbacks(self._write_succeeded, self._write_failed,
+                           callbackArgs=(started, topic_ids), errbackArgs=(topic_ids,))
+        write.addBoth(self._write_done, write, len(items))
+        self._pending_writes.append(write)
+
+    def _write_succeeded(self, retries, started, topic_ids):
+        if retries:
+            self.stats.inc_value('sink/postgres/retried_batches')
+        self.stats.max_value('sink/postgres/max_lag_seconds', round(time.monotonic() - started, 3))
+        if self.checkpoint is not None:
+            # Merges are idempotent, a batch committed again after a crash before this point does not duplicate rows
+            self.checkpoint.record_commit('postgres', topic_ids)
+
+    def _write_failed(self, failure, topic_ids):
+        if failure.check(psycopg2.Error) and self.batch_retries:
+            # Only database errors are retried
+            self.stats.inc_value('sink/postgres/retried_batches')
+        self.stats.inc_value('sink/postgres/dropped_batches')
+        self.stats.inc_value('sink/postgres/dropped_items', len(topic_ids))
+        logging.error(f"Error writing batch, {len(topic_ids)} items dropped: {failure.value}")
+        if self.discard_topics is not None:
+            # The items of the batch have been scraped already, their topics must not be recorded as fetched
+            self.discard_topics(topic_ids)
+
+    def _write_done(self, result, write, count):
+        self._pending_writes.remove(write)
+        self.lag_items -= count
+        return result
+
     def _create_table(self):
         create_table_query = """
         CREATE TABLE IF NOT EXISTS topic_details (
             id SERIAL PRIMARY KEY,
-            post_comments JSON,
             tags TEXT[],
             tags_descriptions JSON,
             title TEXT,
@@ -105,61 +483,150 @@ class PostgresPipeline:
             thumbnails TEXT,
             vote_count INTEGER
         );
+        CREATE TABLE IF NOT EXISTS topic_posts (
+            id BIGINT PRIMARY KEY,
+            topic_id INTEGER NOT NULL,
+            post_number INTEGER,
+            created_at TIMESTAMP,
+            updated_at TIMESTAMP,
+            data JSONB
+        );
+        CREATE INDEX IF NOT EXISTS topic_posts_topic_id_idx ON topic_posts (topic_id, post_number);
         """
+        connection = self.pool.getconn()
         try:
-            self.cursor.execute(create_table_query)
-            self.connection.commit()
+            with connection.cursor() as cursor:
+                cursor.execute(create_table_query)
+                cursor.execute(
+                    "SELECT 1 FROM information_schema.columns "
+                    "WHERE table_schema = current_schema() AND table_name = 'topic_details' "
+                    "AND column_name = 'post_comments'"
+                )
+                if cursor.fetchone():
+                    logging.info("Migrating topic_details.post_comments to topic_posts")
+                    cursor.execute(MIGRATE_POST_COMMENTS_QUERY)
+            connection.commit()
         except Exception as e:
             logging.error(f"Error creating table: {e}")
-            self.connection.rollback()
+            connection.rollback()
+        finally:
+            self.pool.putconn(connection)
 
-    def _convert_item(self, item):
-        # Convert item to a dict if it's a dataclass
-        item_dict = dict(item) if isinstance(item, dict) else item.__dict__
-        converted_values = []
-        columns = ['id', 'post_comments', 'tags', 'tags_descriptions', 'title', 'posts_count',
-                   'created_at', 'views', 'reply_count', 'like_count', 'last_posted_at',
-                   'visible', 'closed', 'archived', 'archetype', 'slug', 'word_count',
-                   'deleted_at', 'user_id', 'featured_link', 'image_url', 'current_post_number',
-                   'highest_post_number', 'participant_count', 'thumbnails', 'vote_count']
-        for key in columns:
-            value = item_dict.get(key)
-            if key == 'tags' and isinstance(value, list):
-                array_literal = "{" + ",".join(f'"{str(v)}"' for v in value) + "}"
-                converted_values.append(array_literal)
-            elif isinstance(value, (dict, list)):
-                converted_values.append(json.dumps(value))
-            elif value is None:
-                converted_values.append(None)
-            else:
-                converted_values.append(value)
-        return converted_values
-
-    def _insert_items(self):
-        if not self.items_buffer:
-            return
+    def _create_staging_tables(self, cursor):
+        # Session local staging tables are not WAL logged and are emptied on every commit. They are
+        # created in the transaction of every batch, so a replaced connection gets its own tables
+        create_staging_query = """
+        CREATE TEMP TABLE IF NOT EXISTS topic_details_staging (
+            seq BIGSERIAL,
+            id INTEGER,
+            tags JSONB,
+            tags_descriptions JSON,
+            title TEXT,
+            posts_count INTEGER,
+            created_at TIMESTAMP,
+            views INTEGER,
+            reply_count INTEGER,
+            like_count INTEGER,
+            last_posted_at TIMESTAMP,
+            visible BOOLEAN,
+            closed BOOLEAN,
+            archived BOOLEAN,
+            archetype TEXT,
+            slug TEXT,
+            word_count INTEGER,
+            deleted_at TIMESTAMP,
+            user_id INTEGER,
+            featured_link TEXT,
+            image_url TEXT,
+            current_post_number INTEGER,
+            highest_post_number INTEGER,
+            participant_count INTEGER,
+            thumbnails TEXT,
+            vote_count INTEGER
+        ) ON COMMIT DELETE ROWS;
+        CREATE TEMP TABLE IF NOT EXISTS topic_posts_staging (
+            seq BIGSERIAL,
+            id BIGINT,
+            topic_id INTEGER,
+            post_number INTEGER,
+            created_at TIMESTAMP,
+            updated_at TIMESTAMP,
+            data JSONB
+        ) ON COMMIT DELETE ROWS;
+        CREATE TEMP TABLE IF NOT EXISTS topic_counters_staging (
+            seq BIGSERIAL,
+            id INTEGER,
+            views INTEGER,
+            like_count INTEGER,
+            reply_count INTEGER
+        ) ON COMMIT DELETE ROWS;
+        """
+        cursor.execute(create_staging_query)
+
+    @staticmethod
+    def _copy_value(value):
+        # Encode a value for the text format of COPY
+        if value is None:
+            return '\\N'
+        if isinstance(value, bool):
+            value = 't' if value else 'f'
+        elif isinstance(value, (dict, list)) or is_dataclass(value):
+            value = encode_item(value).decode('utf-8')
+        else:
+            value = str(value)
+        return value.replace('\\', '\\\\').replace('\t', '\\t').replace('\n', '\\n').replace('\r', '\\r')
 
-        columns = ['id', 'post_comments', 'tags', 'tags_descriptions', 'title', 'posts_count',
-                   'created_at', 'views', 'reply_count', 'like_count', 'last_posted_at',
-                   'visible', 'closed', 'archived', 'archetype', 'slug', 'word_count',
-                   'deleted_at', 'user_id', 'featured_link', 'image_url', 'current_post_number',
-                   'highest_post_number', 'participant_count', 'thumbnails', 'vote_count']
+    def _convert_item(self, item):
+        adapter = ItemAdapter(item)
+        if isinstance(item, TopicCounters):
+            return '', [], '\t'.join(self._copy_value(adapter.get(key)) for key in COUNTER_COLUMNS) + '\n'
+        topic_row = '\t'.join(self._copy_value(adapter.get(key)) for key in TOPIC_COLUMNS) + '\n'
+        post_rows = [
+            '\t'.join(self._copy_value(value) for value in (
+                post.id, adapter.get('id'), post.post_number, post.created_at, post.updated_at, post,
+            )) + '\n'
+            for post in adapter.get('post_comments') or []
+        ]
+        return topic_row, post_rows, ''
 
-        # The query should have a single placeholder for the entire row
-        insert_query = f"INSERT INTO topic_details ({', '.join(columns)}) VALUES %s"
+    def _insert_items(self, items):
+        # Runs in a writer thread
+        if not items:
+            return 0
 
-        # Adding ON CONFLICT clause for upsert
-        on_conflict_query = f"ON CONFLICT (id) DO UPDATE SET " + \
-                            ", ".join([f"{col}=EXCLUDED.{col}" for col in columns if col != 'id'])
+        metrics.observe('batch_size', 'postgres', len(items))
+        for attempt in range(self.batch_retries + 1):
+            try:
+                with metrics.timed('insert_items'):
+                    self._write_batch(items)
+                return attempt
+            except psycopg2.Error as e:
+                if attempt == self.batch_retries:
+                    raise
+                logging.warning(f"Error inserting items, retrying: {e}")
+                time.sleep(2 ** attempt)
 
+    def _write_batch(self, items):
+        topic_rows = io.StringIO(''.join(topic_row for topic_row, _, _ in items))
+        post_rows = io.StringIO(''.join(''.join(post_rows) for _, post_rows, _ in items))
+        counter_rows = io.StringIO(''.join(counter_row for _, _, counter_row in items))
+        connection = self.pool.getconn()
         try:
-            psycopg2.extras.execute_values(
-                self.cursor, insert_query + " " + on_conflict_query,
-                self.items_buffer, template=None, page_size=self.batch_size
-            )
-            self.connection.commit()
-        except Exception as e:
-            logging.error(f"Error inserting items: {e}")
-            self.connection.rollback()
-
-        self.items_buffer.clear()
+            with connection.cursor() as cursor:
+                self._create_staging_tables(cursor)
+                cursor.copy_expert(
+                    f"COPY topic_details_staging ({', '.join(TOPIC_COLUMNS)}) FROM STDIN", topic_rows)
+                cursor.copy_expert(
+                    f"COPY topic_posts_staging ({', '.join(POST_COLUMNS)}) FROM STDIN", post_rows)
+                cursor.copy_expert(
+                    f"COPY topic_counters_staging ({', '.join(COUNTER_COLUMNS)}) FROM STDIN", counter_rows)
+                cursor.execute(MERGE_TOPICS_QUERY)
+                cursor.execute(MERGE_POSTS_QUERY)
+                cursor.execute(UPDATE_COUNTERS_QUERY)
+            connection.commit()
+        except psycopg2.Error:
+            if not connection.closed:
+                connection.rollback()
+            raise
+        finally:
+            self.pool.putconn(connection, close=bool(connection.closed))
@@ -0,0 +1,139 @@
+import math
+from datetime import datetime, timedelta
+
+from openai_community_scraper.state import TopicStateStore
+
+# Number of posts Discourse inlines in a topic response, the rest is fetched in post batches
+INLINED_POSTS = 20
+
+
+class RefreshScheduler:
+    """
+    Decides which topics of the listing are (re)fetched in refresh mode, in which order, within a request budget.
+
+    Topics are scored by their activity as seen in the `latest.json` listing: the posts (and weighted views) per
+    day over their lifetime, or the posts added since their last fetch if that is higher, decayed by the time
+    since they were last bumped. The score sets how long a fetched topic is left alone before it is visited
+    again, from `min_interval` for the hottest topics to `max_interval` for dead ones, and the Scrapy priority
+    of its detail request, so hot topics are downloaded first. Topics with new posts are always due.
+
+    Attributes:
+        state_store (TopicStateStore): The state recorded for every fetched topic.
+        crawler: The crawler, the scheduling decisions are counted in its stats.
+        budget (int): Requests allowed per run (listing pages, topic details and post batches), 0 for no limit.
+        used (int): Requests reserved so far.
+    """
+
+    def __init__(self, state_store: TopicStateStore, crawler, budget: int = 0, half_life_hours: float = 24.0,
+                 min_interval_hours: float = 1.0, max_interval_hours: float = 168.0, view_weight: float = 0.01,
+                 post_batch_size: int = 100):
+        self.state_store = state_store
+        self.crawler = crawler
+        self.budget = budget
+        self.used = 0
+        self.half_life_hours = half_life_hours
+        self.min_interval = timedelta(hours=min_interval_hours)
+        self.max_interval = timedelta(hours=max_interval_hours)
+        self.view_weight = view_weight
+        self.post_batch_size = post_batch_size
+
+    @staticmethod
+    def activity_at(topic) -> datetime:
+        """
+        Returns the time of the last activity of a listing topic.
+        """
+        return datetime.fromisoformat((topic.get('bumped_at') or topic.get('last_posted_at')
+                                       or topic['created_at']).rstrip('Z'))
+
+    def score(self, topic, now: datetime | None = None) -> float:
+        """
+        Scores the activity of a listing topic, roughly in posts per day.
+
+        Args:
+            topic: A topic entry from the `latest.json` listing.
+            now (datetime): The current UTC time.
+
+        Returns:
+            The activity score, 0 for a topic without any activity.
+        """
+        now = now or datetime.utcnow()
+        posts_count = topic.get('posts_count') or 0
+        age_days = max((now - datetime.fromisoformat(topic['created_at'].rstrip('Z'))).total_seconds() / 86400, 1.0)
+        rate = (posts_count + self.view_weight * (topic.get('views') or 0)) / age_days
+        if last_fetch := self.state_store.last_fetch(topic['id']):
+            # An old thread that became active again scores by its recent posts
+            fetched_posts, fetched_at = last_fetch
+            days_since_fetch = max((now - fetched_at).total_seconds() / 86400, 1 / 24)
+            rate = max(rate, max(0, posts_count - (fetched_posts or 0)) / days_since_fetch)
+        idle_hours = max((now - self.activity_at(topic)).total_seconds() / 3600, 0.0)
+        return rate * 0.5 ** (idle_hours / self.half_life_hours)
+
+    def interval(self, score: float) -> timedelta:
+        """
+        Returns how long a topic with this score is left alone after being fetched.
+        """
+        return min(self.max_interval, max(self.min_interval, self.max_interval / (1 + score)))
+
+    def priority(self, interval: timedelta) -> int:
+        """
+        Returns the request priority of a topic revisited every `interval`, 0 for the hottest topics and
+        10 less for every doubling of the interval, so detail requests stay behind post batches.
+        """
+        return -round(10 * math.log2(interval / self.min_interval))
+
+    def due_priority(self, topic) -> int | None:
+        """
+        Checks whether a listing topic is due for a fetch.
+
+        Args:
+            topic: A topic entry from the `latest.json` listing.
+
+        Returns:
+            The priority of its detail request, or None if it was fetched recently enough for its activity.
+        """
+        now = datetime.utcnow()
+        interval = self.interval(self.score(topic, now))
+        if not self.state_store.is_current(topic):
+            self.crawler.stats.inc_value('refresh/changed_topics')
+        else:
+            _, fetched_at = self.state_store.last_fetch(topic['id'])
+            if now - fetched_at < interval:
+                self.crawler.stats.inc_value('refresh/deferred_topics')
+                return None
+            self.crawler.stats.inc_value('refresh/revisited_topics')
+        return self.priority(interval)
+
+    def reserve(self, requests: int = 1) -> bool:
+        """
+        Reserves requests from the budget of the run.
+
+        Returns:
+            False, without reserving anything, if the budget does not allow that many more requests.
+        """
+        if self.budget and self.used + requests > self.budget:
+            return False
+        self.used += requests
+        self.crawler.stats.set_value('refresh/budget_used', self.used)
+        return True
+
+    def reserve_topic(self, topic) -> int | None:
+        """
+        Reserves the estimated requests of a topic, its detail request and the post batches for the posts
+        that are not inlined.
+
+        Returns:
+            The number of reserved requests, or None if the budget does not allow them.
+        """
+        requests = 1 + math.ceil(max(0, (topic.get('posts_count') or 0) - INLINED_POSTS) / self.post_batch_size)
+        if not self.reserve(requests):
+            self.crawler.stats.inc_value('refresh/over_budget_topics')
+            return None
+        return requests
+
+    def settle(self, reserved: int, requests: int):
+        """
+        Replaces the estimate reserved for a topic by the requests it actually needs, once its post batches
+        are known. A started topic is always completed, even past the budget.
+        """
+        self.used += requests - reserved
+        self.crawler.stats.set_value('refresh/budget_used', self.used)
@@ -0,0 +1,349 @@
+"""
+Local full-text search over scraped topics and posts, backed by SQLite FTS5.
+
+The index is built during the crawl by the SearchIndexPipeline (`-a output_method=search`) and is
+updated in place by later crawls. Topic titles and tags, and the text of every post (`cooked` without
+its HTML markup) are indexed, ranked with bm25.
+
+Usage:
+    python -m openai_community_scraper.search query "rate limit" --tag api
+    python -m openai_community_scraper.search query "fine-tuning" --titles
+    python -m openai_community_scraper.search benchmark --data output.json
+"""
+import argparse
+import html
+import os
+import re
+import sqlite3
+import sys
+import tempfile
+import time
+from collections import Counter
+from datetime import datetime
+
+import orjson
+from scrapy.utils.project import get_project_settings
+
+from openai_community_scraper.items import TopicCounters, TopicDetail
+
+TAG_PATTERN = re.compile(r'<[^>]+>')
+SPACE_PATTERN = re.compile(r'\s+')
+WORD_PATTERN = re.compile(r'[a-z]{5,}')
+
+
+def html_to_text(cooked: str | None) -> str:
+    """
+    Strips the HTML markup of a cooked post, keeping its text.
+    """
+    if not cooked:
+        return ''
+    return SPACE_PATTERN.sub(' ', html.unescape(TAG_PATTERN.sub(' ', cooked))).strip()
+
+
+class SearchIndex:
+    """
+    A SQLite FTS5 index of topics and posts.
+
+    Topic titles and tags are indexed in `topic_search`, post texts in `post_search`, both keyed by the
+    id of the topic or post. Posts are only re-indexed when their `updated_at` changed, so updating the
+    index with topics that were indexed before is cheap.
+
+    Attributes:
+        path (str): Location of the SQLite database file.
+        commit_every (int): Number of indexed topics after which pending writes are committed.
+    """
+
+    def __init__(self, path: str, commit_every: int = 100):
+        self.path = path
+        self.commit_every = commit_every
+        self.connection = sqlite3.connect(path)
+        self._pending_writes = 0
+        self._create_tables()
+
+    def _create_tables(self):
+        self.connection.executescript(
+            """
+            PRAGMA journal_mode=WAL;
+            CREATE TABLE IF NOT EXISTS topics (
+                id INTEGER PRIMARY KEY,
+                title TEXT,
+                slug TEXT,
+                created_at TEXT,
+                last_posted_at TEXT,
+                posts_count INTEGER,
+                views INTEGER,
+                like_count INTEGER,
+                reply_count INTEGER
+            );
+            CREATE TABLE IF NOT EXISTS topic_tags (
+                topic_id INTEGER,
+                tag TEXT,
+                PRIMARY KEY (tag, topic_id)
+            ) WITHOUT ROWID;
+            CREATE TABLE IF NOT EXISTS posts (
+                id INTEGER PRIMARY KEY,
+                topic_id INTEGER,
+                post_number INTEGER,
+                username TEXT,
+                created_at TEXT,
+                updated_at TEXT
+            );
+            CREATE INDEX IF NOT EXISTS posts_topic_id_idx ON posts (topic_id);
+            CREATE VIRTUAL TABLE IF NOT EXISTS topic_search USING fts5(title, tags, tokenize='porter unicode61');
+            CREATE VIRTUAL TABLE IF NOT EXISTS post_search USING fts5(body, tokenize='porter unicode61');
+            """
+        )
+        self.connection.commit()
+
+    def add(self, item: TopicDetail | TopicCounters) -> int:
+        """
+        Indexes a topic and its posts, or updates the counters of an indexed topic.
+
+        Args:
+            item (TopicDetail | TopicCounters): The scraped item.
+
+        Returns:
+            The number of (re-)indexed posts.
+        """
+        if isinstance(item, TopicCounters):
+            self.connection.execute(
+                "UPDATE topics SET views = ?, like_count = ?, reply_count = ? WHERE id = ?",
+                (item.views, item.like_count, item.reply_count, int(item.id)),
+            )
+            return 0
+
+        topic_id = int(item.id)
+        tags = [tag['name'] if isinstance(tag, dict) else tag for tag in item.tags or []]
+        self.connection.execute(
+            "INSERT OR REPLACE INTO topics (id, title, slug, created_at, last_posted_at, posts_count, views, "
+            "like_count, reply_count) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+            (topic_id, item.title, item.slug, item.created_at, item.last_posted_at, item.posts_count, item.views,
+             item.like_count, item.reply_count),
+        )
+        self.connection.execute("DELETE FROM topic_tags WHERE topic_id = ?", (topic_id,))
+        self.connection.executemany(
+            "INSERT OR IGNORE INTO topic_tags (topic_id, tag) VALUES (?, ?)", [(topic_id, tag) for tag in tags])
+        self.connection.execute("DELETE FROM topic_search WHERE rowid = ?", (topic_id,))
+        self.connection.execute(
+            "INSERT INTO topic_search (rowid, title, tags) VALUES (?, ?, ?)", (topic_id, item.title, ' '.join(tags)))
+
+        indexed = dict(self.connection.execute("SELECT id, updated_at FROM posts WHERE topic_id = ?", (topic_id,)))
+        changed = [post for post in item.post_comments or []
+                   if post.id not in indexed or indexed[post.id] != post.updated_at]
+        self.connection.executemany(
+            "INSERT OR REPLACE INTO posts (id, topic_id, post_number, username, created_at, updated_at) "
+            "VALUES (?, ?, ?, ?, ?, ?)",
+            [(post.id, topic_id, post.post_number, post.username, post.created_at, post.updated_at)
+             for post in changed],
+        )
+        self.connection.executemany(
+            "DELETE FROM post_search WHERE rowid = ?", [(post.id,) for post in changed if post.id in indexed])
+        self.connection.executemany(
+            "INSERT INTO post_search (rowid, body) VALUES (?, ?)",
+            [(post.id, html_to_text(post.cooked)) for post in changed],
+        )
+
+        self._pending_writes += 1
+        if self._pending_writes >= self.commit_every:
+            self.commit()
+        return len(changed)
+
+    def search_posts(self, query: str, tags: list[str] = (), limit: int = 20) -> list[dict]:
+        """
+        Searches the text of the posts.
+
+        Args:
+            query (str): An FTS5 query, e.g. `rate limit`, `"rate limit"` or `embed*`.
+            tags (list[str]): Only return posts of topics with all of these tags.
+            limit (int): Maximum number of results.
+
+        Returns:
+            The matching posts, best matches first.
+        """
+        rows = self.connection.execute(
+            f"""
+            SELECT posts.topic_id, topics.title, posts.post_number, posts.username, posts.created_at,
+                   snippet(post_search, 0, '[', ']', '...', 16)
+            FROM post_search
+            JOIN posts ON posts.id = post_search.rowid
+            JOIN topics ON topics.id = posts.topic_id
+            WHERE post_search MATCH ? {self._tags_filter('posts.topic_id', tags)}
+            ORDER BY bm25(post_search)
+            LIMIT ?
+            """,
+            (query, *tags, limit),
+        )
+        return [dict(zip(('topic_id', 'title', 'post_number', 'username', 'created_at', 'snippet'), row))
+                for row in rows]
+
+    def search_topics(self, query: str | None, tags: list[str] = (), limit: int = 20) -> list[dict]:
+        """
+        Searches the titles and tags of the topics.
+
+        Args:
+            query (str | None): An FTS5 query, or None to list the most recently active topics with `tags`.
+            tags (list[str]): Only return topics with all of these tags.
+            limit (int): Maximum number of results.
+
+        Returns:
+            The matching topics, best matches (or most recently active topics) first.
+        """
+        if query:
+            rows = self.connection.execute(
+                f"""
+                SELECT topics.id, topics.title, topics.posts_count, topics.views, topics.last_posted_at
+                FROM topic_search
+                JOIN topics ON topics.id = topic_search.rowid
+                WHERE topic_search MATCH ? {self._tags_filter('topics.id', tags)}
+                ORDER BY bm25(topic_search, 2.0, 1.0)
+                LIMIT ?
+                """,
+                (query, *tags, limit),
+            )
+        else:
+            rows = self.connection.execute(
+                f"""
+                SELECT id, title, posts_count, views, last_posted_at
+                FROM topics
+                WHERE 1 {self._tags_filter('topics.id', tags)}
+                ORDER BY last_posted_at DESC
+                LIMIT ?
+                """,
+                (*tags, limit),
+            )
+        return [dict(zip(('topic_id', 'title', 'posts_count', 'views', 'last_posted_at'), row)) for row in rows]
+
+    @staticmethod
+    def _tags_filter(column: str, tags) -> str:
+        return ''.join(f" AND {column} IN (SELECT topic_id FROM topic_tags WHERE tag = ?)" for _ in tags)
+
+    def commit(self):
+        self.connection.commit()
+        self._pending_writes = 0
+
+    def close(self):
+        self.commit()
+        self.connection.close()
+
+
+def load_items(path: str) -> list[TopicDetail]:
+    """
+    Loads the topics of a JSON (array or JSON Lines) output as items.
+    """
+    from openai_community_scraper.benchmark import load_topics
+
+    return [TopicDetail.from_dict(topic) for topic in load_topics(path)]
+
+
+def benchmark(items: list[TopicDetail], queries: list[str], repeat: int = 20) -> dict:
+    """
+    Measures the time to build an index of `items` and the latency of `queries`, compared with a
+    linear scan of the cooked posts, the equivalent of grepping the JSON output.
+
+    Args:
+        items (list[TopicDetail]): The topics to index.
+        queries (list[str]): Single word queries.
+        repeat (int): Number of times every query is run.
+
+    Returns:
+        The benchmark report.
+    """
+    from openai_community_scraper.benchmark import percentile
+
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, 'search_index.db')
+        started = time.perf_counter()
+        index = SearchIndex(path)
+        posts = sum(index.add(item) for item in items)
+        index.commit()
+        build_seconds = time.perf_counter() - started
+
+        started = time.perf_counter()
+        for item in items:
+            index.add(item)
+        index.commit()
+        update_seconds = time.perf_counter() - started
+
+        index_latencies, scan_latencies = [], []
+        for query in queries:
+            for _ in range(repeat):
+                started = time.perf_counter()
+                index.search_posts(query, limit=20)
+                index_latencies.append(time.perf_counter() - started)
+            started = time.perf_counter()
+            sum(1 for item in items for post in item.post_comments or [] if query in (post.cooked or '').lower())
+            scan_latencies.append(time.perf_counter() - started)
+        index.close()
+        index_bytes = os.path.getsize(path)
+
+    return {
+        'topics': len(items),
+        'posts': posts,
+        'index_bytes': index_bytes,
+        'build_seconds': round(build_seconds, 4),
+        'update_unchanged_seconds': round(update_seconds, 4),
+        'queries': len(queries),
+        'query_p50_ms': round(percentile(index_latencies, 0.5) * 1000, 3),
+        'query_p99_ms': round(percentile(index_latencies, 0.99) * 1000, 3),
+        'scan_p50_ms': round(percentile(scan_latencies, 0.5) * 1000, 3),
+        'scan_p99_ms': round(percentile(scan_latencies, 0.99) * 1000, 3),
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    commands = parser.add_subparsers(dest='command', required=True)
+    query_parser = commands.add_parser('query', help='Search the index.')
+    query_parser.add_argument('query', nargs='?', help='FTS5 query, optional when --tag is given.')
+    query_parser.add_argument('--tag', action='append', default=[], help='Only topics with this tag, may be repeated.')
+    query_parser.add_argument('--titles', action='store_true', help='Search topic titles and tags instead of posts.')
+    query_parser.add_argument('--limit', type=int, default=20)
+    query_parser.add_argument('--index', help='Path of the index, defaults to SEARCH_INDEX_PATH.')
+    benchmark_parser = commands.add_parser('benchmark', help='Benchmark index build time and query latency.')
+    benchmark_parser.add_argument('--data', default='output.json', help='Recorded topics, a JSON array or JSON Lines file.')
+    benchmark_parser.add_argument('--queries', type=int, default=20, help='Number of queries, the most common words.')
+    benchmark_parser.add_argument('--report', help='Write the JSON report to this file instead of stdout.')
+    args = parser.parse_args(argv)
+
+    if args.command == 'benchmark':
+        from openai_community_scraper.benchmark import git_revision
+
+        items = load_items(args.data)
+        words = Counter(word for item in items for post in item.post_comments or []
+                        for word in set(WORD_PATTERN.findall(html_to_text(post.cooked).lower())))
+        queries = [word for word, _ in words.most_common(args.queries * 5)[::5]]
+        report = orjson.dumps({
+            'revision': git_revision(),
+            'created_at': datetime.utcnow().isoformat(timespec='seconds') + 'Z',
+            'data': args.data,
+            'results': benchmark(items, queries),
+        }, option=orjson.OPT_INDENT_2)
+        if args.report:
+            with open(args.report, 'wb') as file:
+                file.write(report)
+        else:
+            sys.stdout.buffer.write(report + b'\n')
+        return 0
+
+    if not args.query and not args.tag:
+        parser.error('a query or a --tag is required')
+    path = args.index or get_project_settings().get('SEARCH_INDEX_PATH', 'search_index.db')
+    if not os.path.exists(path):
+        parser.error(f'no search index at {path}, crawl with -a output_method=search first')
+    index = SearchIndex(path)
+    try:
+        if args.titles or not args.query:
+            results = index.search_topics(args.query, args.tag, args.limit)
+        else:
+            results = index.search_posts(args.query, args.tag, args.limit)
+    except sqlite3.OperationalError as e:
+        parser.error(f'invalid query: {e}')
+    finally:
+        index.close()
+    for result in results:
+        sys.stdout.buffer.write(orjson.dumps(result) + b'\n')
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -22,9 +22,10 @@ ROBOTSTXT_OBEY = True
 # Configure a delay for requests for the same website (default: 0)
 # See https://docs.scrapy.org/en/latest/topics/settings.html#download-delay
 # See also autothrottle settings and docs
-DOWNLOAD_DELAY = 3
+# Requests are paced by the AdaptiveRateLimitMiddleware instead of a fixed delay
+DOWNLOAD_DELAY = 0
 # The download delay setting will honor only one of:
-# CONCURRENT_REQUESTS_PER_DOMAIN = 16
+CONCURRENT_REQUESTS_PER_DOMAIN = 8
 # CONCURRENT_REQUESTS_PER_IP = 16
 
 # Disable cookies (enabled by default)
@@ -41,21 +42,28 @@ DOWNLOAD_DELAY = 3
 
 # Enable or disable spider middlewares
 # See https://docs.scrapy.org/en/latest/topics/spider-middleware.html
-# SPIDER_MIDDLEWARES = {
-#    "openai_community_scraper.middlewares.OpenaiCommunityScraperSpiderMiddleware": 543,
-# }
+SPIDER_MIDDLEWARES = {
+    # "openai_community_scraper.middlewares.OpenaiCommunityScraperSpiderMiddleware": 543,
+    # Closest to the spider so only the time spent in the callbacks is measured
+    "openai_community_scraper.middlewares.CallbackTimingMiddleware": 990,
+}
 
 # Enable or disable downloader middlewares
 # See https://docs.scrapy.org/en/latest/topics/downloader-middleware.html
-# DOWNLOADER_MIDDLEWARES = {
-#    "openai_community_scraper.middlewares.OpenaiCommunityScraperDownloaderMiddleware": 543,
-# }
+DOWNLOADER_MIDDLEWARES = {
+    # "openai_community_scraper.middlewares.OpenaiCommunityScraperDownloaderMiddleware": 543,
+    "scrapy.downloadermiddlewares.httpcache.HttpCacheMiddleware": None,
+    "openai_community_scraper.httpcache.ConditionalHttpCacheMiddleware": 900,
+    # After the HTTP cache so cached responses are not paced, and before RetryMiddleware sees 429s
+    "openai_community_scraper.middlewares.AdaptiveRateLimitMiddleware": 950,
+}
 
 # Enable or disable extensions
 # See https://docs.scrapy.org/en/latest/topics/extensions.html
-# EXTENSIONS = {
-#    "scrapy.extensions.telnet.TelnetConsole": None,
-# }
+EXTENSIONS = {
+    # "scrapy.extensions.telnet.TelnetConsole": None,
+    "openai_community_scraper.extensions.StageMetrics": 500,
+}
 
 # Configure item pipelines
 # See https://docs.scrapy.org/en/latest/topics/item-pipeline.html
@@ -83,7 +91,12 @@ HTTPCACHE_ENABLED = True
 # HTTPCACHE_EXPIRATION_SECS = 0
 # HTTPCACHE_DIR = "httpcache"
 # HTTPCACHE_IGNORE_HTTP_CODES = []
-# HTTPCACHE_STORAGE = "scrapy.extensions.httpcache.FilesystemCacheStorage"
+# Responses are kept compressed in SQLite and revalidated with ETag/Last-Modified,
+# topic details are only revalidated when the listing shows new activity
+HTTPCACHE_POLICY = "openai_community_scraper.httpcache.TopicActivityPolicy"
+HTTPCACHE_STORAGE = "openai_community_scraper.httpcache.SqliteCacheStorage"
+# Upper bound of the compressed cache size, least recently used responses are evicted first
+HTTPCACHE_MAX_BYTES = int(os.environ.get('HTTPCACHE_MAX_BYTES', 256 * 1024 * 1024))
 
 # Set settings whose default value is deprecated to a future-proof value
 REQUEST_FINGERPRINTER_IMPLEMENTATION = "2.7"
@@ -93,6 +106,9 @@ FEED_EXPORT_ENCODING = "utf-8"
 
 # ========== Custom Settings ==========
 
+# Root URL of the forum (overridden to point the spider at a local mock server)
+FORUM_URL = os.environ.get('FORUM_URL', 'https://community.openai.com')
+
 # # Log file (optional, if you want to save logs to a file)
 LOG_FILE = 'scrapy.log'
 
@@ -103,3 +119,95 @@ POSTGRES_PASS = os.getenv('POSTGRES_PASS')
 POSTGRES_DB = os.getenv('POSTGRES_DB')
 
 BATCH_SIZE = int(os.environ.get('BATCH_SIZE', 100))
+
+# Incremental crawl state (used with `-a incremental=true`)
+TOPIC_STATE_DB = os.environ.get('TOPIC_STATE_DB', 'topic_state.db')
+# Refresh mode (`-a refresh=true`, keeps its state in TOPIC_STATE_DB): requests per run (listing pages, topic
+# details and post batches, 0 for no limit), and how often topics are revisited depending on their activity
+REFRESH_REQUEST_BUDGET = int(os.environ.get('REFRESH_REQUEST_BUDGET', 2000))
+REFRESH_MIN_INTERVAL_HOURS = float(os.environ.get('REFRESH_MIN_INTERVAL_HOURS', 1))
+REFRESH_MAX_INTERVAL_HOURS = float(os.environ.get('REFRESH_MAX_INTERVAL_HOURS', 168))
+# Hours after which the activity score of a topic that was not bumped is halved
+REFRESH_HALF_LIFE_HOURS = float(os.environ.get('REFRESH_HALF_LIFE_HOURS', 24))
+# Weight of a view relative to a post in the activity score
+REFRESH_VIEW_WEIGHT = float(os.environ.get('REFRESH_VIEW_WEIGHT', 0.01))
+# Content hashes of emitted topics and posts (used with `-a changes_only=true`)
+CONTENT_HASH_DB = os.environ.get('CONTENT_HASH_DB', 'content_hashes.db')
+# Items after which every pipeline commits a checkpoint in resumable crawls (`-a checkpoint=crawl.db`)
+CHECKPOINT_INTERVAL = int(os.environ.get('CHECKPOINT_INTERVAL', 500))
+
+# JSON Lines output, `%(name)s` and `%(time)s` are replaced by the spider name and the run start time
+JSON_OUTPUT_PATH = os.environ.get('JSON_OUTPUT_PATH', 'output.jsonl')
+# None, 'gzip' or 'zstd' (requires the zstandard package)
+JSON_OUTPUT_COMPRESSION = os.environ.get('JSON_OUTPUT_COMPRESSION')
+JSON_OUTPUT_BUFFER_SIZE = int(os.environ.get('JSON_OUTPUT_BUFFER_SIZE', 1024 * 1024))
+# Start a new file after this many uncompressed bytes (0 disables rotation)
+JSON_OUTPUT_MAX_FILE_SIZE = int(os.environ.get('JSON_OUTPUT_MAX_FILE_SIZE', 0))
+
+# Compact archive output (`-a output_method=archive`), gzip or zstd compressed when ending with `.gz` or `.zst`
+ARCHIVE_OUTPUT_PATH = os.environ.get('ARCHIVE_OUTPUT_PATH', 'output.archive.json.gz')
+
+# Parquet output (`-a output_method=parquet`, requires pyarrow), partitioned by the day topics were created
+PARQUET_OUTPUT_DIR = os.environ.get('PARQUET_OUTPUT_DIR', 'output_parquet')
+# Rows buffered per partition before a row group is written
+PARQUET_ROW_GROUP_SIZE = int(os.environ.get('PARQUET_ROW_GROUP_SIZE', 10000))
+PARQUET_COMPRESSION = os.environ.get('PARQUET_COMPRESSION', 'zstd')
+# Partition files kept open at once per dataset, the least recently written one is closed first
+PARQUET_MAX_OPEN_FILES = int(os.environ.get('PARQUET_MAX_OPEN_FILES', 32))
+
+# SQLite FTS5 search index (`-a output_method=search`), queried with `python -m openai_community_scraper.search`
+SEARCH_INDEX_PATH = os.environ.get('SEARCH_INDEX_PATH', 'search_index.db')
+
+# Posts missing from a topic's inlined post stream are fetched in batches of this many ids
+POST_BATCH_SIZE = int(os.environ.get('POST_BATCH_SIZE', 100))
+# Maximum number of concurrent post batch requests per topic
+MAX_POST_BATCHES_IN_FLIGHT = int(os.environ.get('MAX_POST_BATCHES_IN_FLIGHT', 2))
+
+# Number of Postgres writer threads (and pooled connections)
+POSTGRES_POOL_SIZE = int(os.environ.get('POSTGRES_POOL_SIZE', 2))
+# Batches allowed to wait for a writer before item processing is paused
+POSTGRES_MAX_PENDING_BATCHES = int(os.environ.get('POSTGRES_MAX_PENDING_BATCHES', 4))
+# What happens to items while too many batches are pending: 'block' pauses item processing (and so the whole
+# crawl and its other outputs), 'drop' drops them from Postgres and counts them
+POSTGRES_BACKPRESSURE = os.environ.get('POSTGRES_BACKPRESSURE', 'block')
+# Attempts of a failed batch before its items are dropped, with an exponential backoff
+POSTGRES_BATCH_RETRIES = int(os.environ.get('POSTGRES_BATCH_RETRIES', 2))
+
+# Adaptive per endpoint rate limiting (requests per second, for each of listing/detail/posts)
+ADAPTIVE_RATE_ENABLED = os.environ.get('ADAPTIVE_RATE_ENABLED', 'true').lower() in ('1', 'true', 'yes')
+ADAPTIVE_RATE_START = float(os.environ.get('ADAPTIVE_RATE_START', 1.0))
+ADAPTIVE_RATE_MIN = float(os.environ.get('ADAPTIVE_RATE_MIN', 0.2))
+ADAPTIVE_RATE_MAX = float(os.environ.get('ADAPTIVE_RATE_MAX', 10.0))
+ADAPTIVE_RATE_BURST = float(os.environ.get('ADAPTIVE_RATE_BURST', 2.0))
+# Rates only grow while responses are faster than this many seconds
+ADAPTIVE_RATE_TARGET_LATENCY = float(os.environ.get('ADAPTIVE_RATE_TARGET_LATENCY', 1.0))
+ADAPTIVE_RATE_MAX_RETRIES = int(os.environ.get('ADAPTIVE_RATE_MAX_RETRIES', 5))
+
+# Download https requests over a pool of persistent HTTP/2 connections (requires the h2 package)
+HTTP2_ENABLED = os.environ.get('HTTP2_ENABLED', 'false').lower() in ('1', 'true', 'yes')
+if HTTP2_ENABLED:
+    DOWNLOAD_HANDLERS = {'https': 'openai_community_scraper.http2.PooledH2DownloadHandler'}
+# HTTP/2 connections per host, a new one is opened once every connection has this many open streams
+H2_POOL_SIZE = int(os.environ.get('H2_POOL_SIZE', 2))
+H2_MAX_STREAMS_PER_CONNECTION = int(os.environ.get('H2_MAX_STREAMS_PER_CONNECTION', 4))
+# Seconds an idle HTTP/2 connection is kept open
+H2_IDLE_TIMEOUT = int(os.environ.get('H2_IDLE_TIMEOUT', 120))
+# Flow control window of every stream, in bytes
+H2_INITIAL_WINDOW_SIZE = int(os.environ.get('H2_INITIAL_WINDOW_SIZE', 1024 * 1024))
+
+# Listing pages requested ahead of the last parsed one (0 paginates one page at a time)
+LISTING_PREFETCH_PAGES = int(os.environ.get('LISTING_PREFETCH_PAGES', 0))
+
+# Per stage timing histograms (download, decode, callbacks, item conversion, database batches)
+METRICS_ENABLED = os.environ.get('METRICS_ENABLED', 'false').lower() in ('1', 'true', 'yes')
+# Serve the histograms on http://127.0.0.1:<port>/metrics (0 disables the endpoint)
+METRICS_PROMETHEUS_PORT = int(os.environ.get('METRICS_PROMETHEUS_PORT', 9410))
+# Push every observation to StatsD over UDP when a host is set
+METRICS_STATSD_HOST = os.environ.get('METRICS_STATSD_HOST')
+METRICS_STATSD_PORT = int(os.environ.get('METRICS_STATSD_PORT', 8125))
+# Seconds between two samples of the scheduler/downloader/scraper queue depths
+METRICS_SAMPLE_INTERVAL = float(os.environ.get('METRICS_SAMPLE_INTERVAL', 1.0))
+# Sample the reactor thread stack and dump folded stacks for runs slower than METRICS_PROFILE_SLOW_SECS
+METRICS_PROFILE = os.environ.get('METRICS_PROFILE', 'false').lower() in ('1', 'true', 'yes')
+METRICS_PROFILE_SLOW_SECS = float(os.environ.get('METRICS_PROFILE_SLOW_SECS', 600))
+METRICS_PROFILE_PATH = os.environ.get('METRICS_PROFILE_PATH', 'profile-%(time)s.folded')
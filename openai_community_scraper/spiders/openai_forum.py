@@ -1,9 +1,28 @@
 import logging
+import math
+import os
 from datetime import datetime, timedelta
+from urllib.parse import urlencode
 
 import scrapy
+from scrapy import signals
 
-from openai_community_scraper.items import TopicDetail
+from openai_community_scraper import metrics
+from openai_community_scraper.decoding import build_posts, decode_listing, decode_posts, decode_topic, post_ids
+from openai_community_scraper.items import (POST_COUNTER_FIELDS, TOPIC_COUNTER_FIELDS, TopicCounters, TopicDetail,
+                                             content_hash)
+from openai_community_scraper.refresh import RefreshScheduler
+from openai_community_scraper.state import ContentHashIndex, CrawlCheckpoint, TopicFrontier, TopicStateStore
+
+# Pipelines of the output methods, local file sinks come first so that they receive every item
+# before the Postgres pipeline can hold it back when its write queue is full
+OUTPUT_PIPELINES = {
+    'json': ('openai_community_scraper.pipelines.JsonPipeline', 300),
+    'archive': ('openai_community_scraper.pipelines.ArchivePipeline', 305),
+    'parquet': ('openai_community_scraper.pipelines.ParquetPipeline', 310),
+    'search': ('openai_community_scraper.pipelines.SearchIndexPipeline', 315),
+    'postgres': ('openai_community_scraper.pipelines.PostgresPipeline', 320),
+}
 
 
 class OpenAIForumSpider(scrapy.Spider):
@@ -12,17 +31,34 @@ class OpenAIForumSpider(scrapy.Spider):
 
     Attributes:
         name (str): Name of the spider.
+        forum_url (str): Root URL of the forum, can be replaced with the FORUM_URL setting.
         base_url (str): Base URL for the OpenAI Community Forum.
         topic_listing_url_template (str): Template URL for topic listing pages.
         topic_details_url_template (str): Template URL for topic detail pages.
+        topic_posts_url_template (str): Template URL for fetching batches of posts of a topic.
         days (int): Number of past days to scrape.
         number_of_days_ago (datetime): The datetime object representing the starting point for scraping.
+        state_store (TopicStateStore | None): Store of previously fetched topics, set in incremental mode.
+        scraped_states (list): State of the topics scraped by this run, recorded in `state_store` when the spider closes.
+        prefetch_pages (int): Number of listing pages requested ahead of the last parsed one, 0 paginates serially.
+        days_offset (int): Topics created in the last `days_offset` days are left out, used to split the date window.
+        window_end (datetime): Topics created after this datetime are left out.
+        frontier (TopicFrontier | None): Store shared by the workers of a sharded crawl, no topic is claimed twice.
+        content_index (ContentHashIndex | None): Content hashes of previously emitted topics, set in change-only mode.
+        scraped_hashes (dict): Content hashes of the topics scraped by this run, by topic id, recorded in
+            `content_index` when the spider closes.
+        discarded_topics (set): Ids of scraped topics that an output failed to write, neither their state
+            nor their hashes are recorded.
+        checkpoint (CrawlCheckpoint | None): Frontier and item log of a resumable crawl.
+        refresh (RefreshScheduler | None): Scheduler of the topic fetches, set in refresh mode.
     """
 
     name = 'openai_forum'
+    forum_url = 'https://community.openai.com'
     base_url = 'https://community.openai.com/latest.json'
     topic_listing_url_template = "https://community.openai.com/latest.json?no_definitions=false&page={}"
     topic_details_url_template = "https://community.openai.com/t/{}.json?track_visit=true&forceLoad=true"
+    topic_posts_url_template = "https://community.openai.com/t/{}/posts.json"
 
     # the modification of this classmethod enable setting the CLI command accordingly to the spider settings
     @classmethod
@@ -30,6 +66,9 @@ class OpenAIForumSpider(scrapy.Spider):
         """
         Class method to create spider instance with command line arguments for output method and days.
 
+        `output_method` is a comma separated list of sinks (`json`, `archive`, `postgres`, `parquet`, `search`),
+        every scraped item is written to all of them in a single crawl.
+
         Args:
             crawler: The crawler instance.
             *args: Variable length argument list.
@@ -40,23 +79,138 @@ class OpenAIForumSpider(scrapy.Spider):
         """
         output_method = kwargs.pop('output_method', 'json')
         days = kwargs.pop('days', 7)
+        days_offset = kwargs.pop('days_offset', 0)
+        frontier = kwargs.pop('frontier', None)
+        incremental = str(kwargs.pop('incremental', False)).lower() in ('1', 'true', 'yes')
+        changes_only = str(kwargs.pop('changes_only', False)).lower() in ('1', 'true', 'yes')
+        checkpoint = kwargs.pop('checkpoint', None)
+        refresh = str(kwargs.pop('refresh', False)).lower() in ('1', 'true', 'yes')
+        prefetch_pages = kwargs.pop('prefetch_pages', crawler.settings.getint('LISTING_PREFETCH_PAGES', 0))
 
         spider = super(OpenAIForumSpider, cls).from_crawler(crawler, *args, **kwargs)
+        if (forum_url := crawler.settings.get('FORUM_URL')) and forum_url.rstrip('/') != cls.forum_url:
+            # e.g. a local mock server for benchmarks
+            for attr in ('base_url', 'topic_listing_url_template', 'topic_details_url_template',
+                         'topic_posts_url_template'):
+                setattr(spider, attr, getattr(cls, attr).replace(cls.forum_url, forum_url.rstrip('/')))
+            spider.forum_url = forum_url.rstrip('/')
         spider.days = int(days)
-        spider.start_urls = [spider.topic_listing_url_template.format(1)]
+        spider.start_urls = [spider.topic_listing_url_template.format(0)]
+        spider.days_offset = int(days_offset)
         spider.number_of_days_ago = datetime.utcnow() - timedelta(days=spider.days)
+        spider.window_end = datetime.utcnow() - timedelta(days=spider.days_offset)
         logging.info(f"OpenAIForumSpider is initiated to scrap last {spider.days} days of topics...")
+        if spider.days_offset:
+            logging.info(f"Topics of the last {spider.days_offset} days are skipped")
+
+        # Sharded crawls share a frontier so that no topic is fetched by two workers
+        spider.frontier = TopicFrontier(frontier) if frontier else None
+
+        # Listing pagination state, pages are numbered from 0 like Discourse does and pages after
+        # `cutoff_page` are known to be outside of the date window
+        spider.prefetch_pages = int(prefetch_pages)
+        spider.highest_requested_page = 0
+        spider.cutoff_page = None
+
+        # In incremental mode topics that did not change since the previous run are skipped
+        spider.state_store = None
+        if incremental or refresh:
+            spider.state_store = TopicStateStore(crawler.settings.get('TOPIC_STATE_DB', 'topic_state.db'))
+            logging.info(f"Incremental mode enabled, topic state is kept in {spider.state_store.path}")
+        # The state of a fetched topic is only recorded once its item went through the pipelines, and
+        # persisted when the spider closes, after the pipelines have made their output durable
+        spider.unscraped_states = {}
+        spider.scraped_states = []
+        # So are the content hashes of an emitted topic in change-only mode
+        spider.unrecorded_hashes = {}
+        spider.scraped_hashes = {}
+        spider.discarded_topics = set()
+        crawler.signals.connect(spider.item_scraped, signal=signals.item_scraped)
 
-        # Setting pipeline based on output method
-        if output_method == 'json':
-            crawler.settings.setdict(
-                {'ITEM_PIPELINES': {'openai_community_scraper.pipelines.JsonPipeline': 300}}, priority='cmdline')
-        elif output_method == 'postgres':
-            crawler.settings.setdict(
-                {'ITEM_PIPELINES': {'openai_community_scraper.pipelines.PostgresPipeline': 300}}, priority='cmdline')
+        # In refresh mode topics are fetched by activity, hot topics are revisited more often than cold
+        # ones and old topics stay in the window while they are active, within a request budget per run
+        spider.refresh = None
+        if refresh:
+            settings = crawler.settings
+            spider.refresh = RefreshScheduler(
+                spider.state_store, crawler,
+                budget=settings.getint('REFRESH_REQUEST_BUDGET', 0),
+                half_life_hours=settings.getfloat('REFRESH_HALF_LIFE_HOURS', 24.0),
+                min_interval_hours=settings.getfloat('REFRESH_MIN_INTERVAL_HOURS', 1.0),
+                max_interval_hours=settings.getfloat('REFRESH_MAX_INTERVAL_HOURS', 168.0),
+                view_weight=settings.getfloat('REFRESH_VIEW_WEIGHT', 0.01),
+                post_batch_size=settings.getint('POST_BATCH_SIZE', 100),
+            )
+            logging.info(f"Refresh mode enabled, request budget: {spider.refresh.budget or 'unlimited'}")
+
+        # In change-only mode unchanged topics are dropped and topics where only counters moved are
+        # emitted as TopicCounters
+        spider.content_index = None
+        if changes_only:
+            spider.content_index = ContentHashIndex(crawler.settings.get('CONTENT_HASH_DB', 'content_hashes.db'))
+            logging.info(f"Change-only mode enabled, content hashes are kept in {spider.content_index.path}")
+
+        # Resumable crawls keep their frontier, emitted items and pipeline commits in a checkpoint,
+        # a crawl that stopped is continued by running it again with the same checkpoint
+        spider.checkpoint = CrawlCheckpoint(checkpoint) if checkpoint else None
+
+        # Setting pipelines based on output methods
+        output_methods = output_method.split(',') if isinstance(output_method, str) else list(output_method)
+        pipelines = {}
+        for method in filter(None, (method.strip() for method in output_methods)):
+            if method not in OUTPUT_PIPELINES:
+                logging.error(f"Unknown output method: {method}")
+                continue
+            path, order = OUTPUT_PIPELINES[method]
+            pipelines[path] = order
+        if pipelines:
+            crawler.settings.setdict({'ITEM_PIPELINES': pipelines}, priority='cmdline')
 
         return spider
 
+    def start_requests(self):
+        """
+        Starts from the first listing page, or continues the crawl stored in the checkpoint of a resumable crawl.
+        """
+        if self.refresh is not None:
+            self.refresh.reserve()  # The first listing page
+        if self.checkpoint is None:
+            yield from super().start_requests()
+            return
+
+        listing_pages = self.checkpoint.listing_pages()
+        pending_topics = self.checkpoint.pending_topics()
+        if listing_pages or pending_topics:
+            logging.info(f"Resuming the crawl of {self.checkpoint.path}: {len(listing_pages)} listing pages parsed, "
+                         f"{len(pending_topics)} topics pending")
+            # Items of the stopped run are emitted again, every pipeline skips those it already committed
+            yield scrapy.Request('data:,', callback=self.replay_items, dont_filter=True, priority=2,
+                                 meta={'dont_cache': True, 'dont_obey_robotstxt': True})
+        for topic_id in pending_topics:
+            self.crawler.stats.inc_value('checkpoint/resumed_topics')
+            yield scrapy.Request(self.topic_details_url_template.format(topic_id), callback=self.parse_topic_detail)
+
+        if (cutoff_page := self.checkpoint.get_value('cutoff_page')) is not None:
+            self.cutoff_page = int(cutoff_page)
+        page = 0
+        while page in listing_pages:
+            page += 1
+        if self.cutoff_page is None or page <= self.cutoff_page:
+            self.highest_requested_page = page
+            yield scrapy.Request(self.topic_listing_url_template.format(page), callback=self.parse,
+                                 meta={'listing_page': page})
+
+    def replay_items(self, response):
+        """
+        Callback emitting the items logged by the stopped run of a resumed crawl.
+
+        Args:
+            response: The response of the local `data:` request.
+        """
+        for item in self.checkpoint.logged_items():
+            self.crawler.stats.inc_value('checkpoint/replayed_items')
+            yield item
+
     def parse(self, response):
         """
         Default callback used by Scrapy to process downloaded responses, when their requests don't specify a callback.
@@ -64,34 +218,219 @@ class OpenAIForumSpider(scrapy.Spider):
         Args:
             response: The response object to be processed.
         """
-        data = response.json()
+        page = response.meta.get('listing_page')
+        if page is None:
+            page = int(self.get_next_page_number(response.url) or 0)
+        if self.cutoff_page is not None and page > self.cutoff_page:
+            # A prefetched page past the end of the date window
+            self.crawler.stats.inc_value('listing/ignored_pages')
+            return
+
+        with metrics.timed('decode'):
+            topics, more_topics_url = decode_listing(response.body)
         last_topic_date = None
+        has_changed_topics = False
 
         # Process and yield requests for topic details
-        for item in data['topic_list']['topics']:
+        for item in topics:
             created_at = datetime.fromisoformat(item['created_at'].rstrip('Z'))
-            if created_at > self.number_of_days_ago:
+            # The listing is ordered by activity, in refresh mode old topics are kept while they are active
+            window_date = created_at if self.refresh is None else self.refresh.activity_at(item)
+            if window_date > self.number_of_days_ago:
+                last_topic_date = window_date
+                if created_at > self.window_end:
+                    # Newer than the window of this crawl, but older topics may still follow
+                    has_changed_topics = True
+                    continue
+                priority = 0
+                if self.refresh is not None:
+                    if (priority := self.refresh.due_priority(item)) is None:
+                        continue
+                elif self.state_store is not None and self.state_store.is_current(item):
+                    self.crawler.stats.inc_value('incremental/skipped_topics')
+                    continue
+                # Also when the topic is skipped below, it may still be followed by unseen topics
+                has_changed_topics = True
+                if self.frontier is not None and not self.frontier.claim(item["id"]):
+                    self.crawler.stats.inc_value('frontier/skipped_topics')
+                    continue
+                if self.refresh is not None and not (reserved := self.refresh.reserve_topic(item)):
+                    continue
+                if self.checkpoint is not None and not self.checkpoint.add_topic(item["id"]):
+                    self.crawler.stats.inc_value('checkpoint/skipped_topics')
+                    continue
+                if created_at <= self.number_of_days_ago:
+                    self.crawler.stats.inc_value('refresh/active_old_topics')
                 topic_id = item["id"]
                 topic_detail_url = self.topic_details_url_template.format(topic_id)
-                request = scrapy.Request(topic_detail_url, callback=self.parse_topic_detail)
-                request.meta['topic_data'] = item  # Pass topic data to detail parser
+                request = scrapy.Request(topic_detail_url, callback=self.parse_topic_detail, priority=priority)
+                if self.refresh is not None:
+                    request.meta['refresh_reserved'] = reserved
+                # Pass topic data to detail parser, topics revisited without new activity are revalidated
+                # instead of being served from the HTTP cache. So are all topics in change-only mode,
+                # where counters changes (views, likes) must be seen even if the topic was not bumped
+                if self.content_index is None and (self.refresh is None or not self.state_store.is_current(item)):
+                    request.meta['topic_data'] = item
                 yield request
-                last_topic_date = created_at
+
+        if self.checkpoint is not None:
+            self.checkpoint.add_listing_page(page)
+
+        # The listing is ordered by activity, so once a page holds only known topics the rest are current too
+        if self.state_store is not None and self.refresh is None and not has_changed_topics:
+            self.crawler.stats.inc_value('incremental/stopped_pagination')
+            self._set_cutoff_page(page)
+            return
 
         # Handling pagination if more topics are available within the date range
-        if last_topic_date and last_topic_date > self.number_of_days_ago:
-            if page := self.get_next_page_number(data["topic_list"]["more_topics_url"]):
-                yield scrapy.Request(self.topic_listing_url_template.format(page), callback=self.parse)
+        next_page = self.get_next_page_number(more_topics_url or "")
+        if not (last_topic_date and last_topic_date > self.number_of_days_ago) or not next_page:
+            self._set_cutoff_page(page)
+            return
+        if not self.prefetch_pages:
+            if self.refresh is not None and not self.refresh.reserve():
+                self.crawler.stats.inc_value('refresh/stopped_pagination')
+                self._set_cutoff_page(page)
+                return
+            yield scrapy.Request(self.topic_listing_url_template.format(next_page), callback=self.parse)
+            return
+
+        last_page = page + self.prefetch_pages
+        if estimated_pages := self._estimate_listing_pages(page, topics):
+            last_page = min(last_page, max(page + 1, estimated_pages - 1))
+        if self.cutoff_page is not None:
+            last_page = min(last_page, self.cutoff_page)
+        for next_page in range(self.highest_requested_page + 1, last_page + 1):
+            if self.refresh is not None and not self.refresh.reserve():
+                self.crawler.stats.inc_value('refresh/stopped_pagination')
+                last_page = next_page - 1
+                break
+            self.crawler.stats.inc_value('listing/prefetched_pages')
+            yield scrapy.Request(self.topic_listing_url_template.format(next_page), callback=self.parse,
+                                 meta={'listing_page': next_page}, priority=1)
+        self.highest_requested_page = max(self.highest_requested_page, last_page)
+
+    def _set_cutoff_page(self, page: int):
+        if self.cutoff_page is None or page < self.cutoff_page:
+            self.cutoff_page = page
+            if self.checkpoint is not None:
+                self.checkpoint.set_value('cutoff_page', page)
+
+    def _estimate_listing_pages(self, page: int, topics: list) -> int | None:
+        """
+        Estimates how many listing pages cover the date window, from how far back the pages parsed so far reach.
+
+        Args:
+            page (int): Number of the parsed listing page, counted from 0.
+            topics (list): The topics of that page.
+
+        Returns:
+            The estimated number of pages, or None if it cannot be estimated.
+        """
+        oldest_activity = min(
+            (datetime.fromisoformat((topic.get('bumped_at') or topic['created_at']).rstrip('Z')) for topic in topics),
+            default=None)
+        if oldest_activity is None:
+            return None
+        seconds_per_page = (datetime.utcnow() - oldest_activity).total_seconds() / (page + 1)
+        if seconds_per_page <= 0:
+            return None
+        return math.ceil(self.days * 86400 / seconds_per_page)
 
     def parse_topic_detail(self, response):
         """
         Callback function to process the topic details page.
 
+        Discourse only inlines the first posts of a topic, the ids of the remaining ones are listed in
+        `post_stream.stream`. Those are fetched in batches through the `posts.json` endpoint, with at most
+        `MAX_POST_BATCHES_IN_FLIGHT` batch requests per topic at a time, before the topic item is yielded.
+
         Args:
             response: The response object with topic details.
         """
-        # Extracting topic details and yielding TopicDetail items
-        topic_data = response.json()
+        with metrics.timed('decode'):
+            topic_data = decode_topic(response.body)
+        post_stream = topic_data["post_stream"]
+        loaded_post_ids = set(post_ids(post_stream["posts"]))
+        missing_post_ids = [post_id for post_id in post_stream.get("stream", []) if post_id not in loaded_post_ids]
+        batch_size = self.settings.getint('POST_BATCH_SIZE', 100)
+        if self.refresh is not None and 'refresh_reserved' in response.meta:
+            self.refresh.settle(response.meta['refresh_reserved'], 1 + math.ceil(len(missing_post_ids) / batch_size))
+        if not missing_post_ids:
+            if item := self._build_topic_detail(topic_data):
+                yield item
+            return
+
+        post_fetch = {
+            'topic_data': topic_data,
+            'pending_batches': [missing_post_ids[i:i + batch_size]
+                                for i in range(0, len(missing_post_ids), batch_size)],
+            'in_flight': 0,
+            'failed': False,
+        }
+        self.crawler.stats.inc_value('posts/batched_topics')
+        max_in_flight = self.settings.getint('MAX_POST_BATCHES_IN_FLIGHT', 2)
+        for _ in range(min(max_in_flight, len(post_fetch['pending_batches']))):
+            yield self._next_post_batch_request(post_fetch)
+
+    def parse_post_batch(self, response):
+        """
+        Callback function to process a batch of posts fetched for a topic.
+
+        Args:
+            response: The response object of the `posts.json` request.
+        """
+        post_fetch = response.meta['post_fetch']
+        with metrics.timed('decode'):
+            posts = decode_posts(response.body)
+        post_fetch['topic_data']['post_stream']['posts'].extend(posts)
+        yield from self._continue_post_fetch(post_fetch)
+
+    def post_batch_failed(self, failure):
+        """
+        Errback of the `posts.json` requests, the topic is still yielded with the posts fetched so far.
+
+        Args:
+            failure: The failure of the batch request.
+        """
+        post_fetch = failure.request.meta['post_fetch']
+        post_fetch['failed'] = True
+        self.crawler.stats.inc_value('posts/failed_batches')
+        logging.warning(f"Failed to fetch posts of topic {post_fetch['topic_data']['id']}: {failure.value!r}")
+        yield from self._continue_post_fetch(post_fetch)
+
+    def _next_post_batch_request(self, post_fetch: dict) -> scrapy.Request:
+        batch = post_fetch['pending_batches'].pop(0)
+        post_fetch['in_flight'] += 1
+        self.crawler.stats.inc_value('posts/batch_requests')
+        url = self.topic_posts_url_template.format(post_fetch['topic_data']['id']) + '?' + urlencode(
+            [('post_ids[]', post_id) for post_id in batch])
+        # Batches are prioritised over new topics so that started topics are completed first
+        return scrapy.Request(url, callback=self.parse_post_batch, errback=self.post_batch_failed,
+                              meta={'post_fetch': post_fetch}, priority=1, dont_filter=True)
+
+    def _continue_post_fetch(self, post_fetch: dict):
+        post_fetch['in_flight'] -= 1
+        if post_fetch['pending_batches']:
+            yield self._next_post_batch_request(post_fetch)
+        elif post_fetch['in_flight'] == 0:
+            if item := self._build_topic_detail(post_fetch['topic_data'], complete=not post_fetch['failed']):
+                yield item
+
+    def _build_topic_detail(self, topic_data: dict, complete: bool = True) -> TopicDetail | TopicCounters | None:
+        """
+        Builds the TopicDetail item of a topic and, in incremental mode, keeps its state until the item is scraped.
+
+        In change-only mode the item is compared against the content hash index first, see `_filter_changes`.
+
+        Args:
+            topic_data (dict): The topic details, with all fetched posts in `post_stream.posts`.
+            complete (bool): Whether all posts were fetched, incomplete topics are not recorded
+                so they are fetched again by the next incremental run.
+
+        Returns:
+            The item to emit, or None if the topic did not change.
+        """
         topic_detail_example = TopicDetail(
             id=topic_data["id"],
             title=topic_data["title"],
@@ -118,9 +457,116 @@ class OpenAIForumSpider(scrapy.Spider):
             highest_post_number=topic_data["highest_post_number"],
             participant_count=topic_data["participant_count"],
             thumbnails=topic_data.get("thumbnails"),
-            post_comments=topic_data["post_stream"]["posts"],
+            post_comments=build_posts(topic_data["post_stream"]["posts"]),
         )
-        yield topic_detail_example
+        item = topic_detail_example
+        if self.content_index is not None:
+            item = self._filter_changes(topic_detail_example, complete)
+        if self.state_store is not None and complete:
+            state = ({key: topic_data[key] for key in ('id', 'last_posted_at', 'posts_count', 'highest_post_number')},
+                     datetime.utcnow())
+            if item is None:
+                # Nothing to write for an unchanged topic
+                self.scraped_states.append(state)
+            else:
+                self.unscraped_states[topic_data["id"]] = state
+        if self.checkpoint is not None:
+            self.checkpoint.complete_topic(topic_data["id"], item)
+        return item
+
+    def _filter_changes(self, topic: TopicDetail, complete: bool) -> TopicDetail | TopicCounters | None:
+        """
+        Compares a topic with the content hashes recorded by previous runs. Its new hashes are recorded
+        once the returned item has been scraped, so a dropped item is emitted again by the next run.
+
+        Args:
+            topic (TopicDetail): The topic item.
+            complete (bool): Whether all posts were fetched, the hashes of incomplete topics are not
+                recorded so they are compared again by the next run.
+
+        Returns:
+            The topic with only its new or edited posts if its content changed, a TopicCounters item
+            if only its views, likes or replies changed, or None if nothing changed.
+        """
+        with metrics.timed('content_hash'):
+            topic_hash = content_hash(topic, exclude=(*TOPIC_COUNTER_FIELDS, 'post_comments'))
+            counters = TopicCounters.from_topic(topic)
+            counters_hash = content_hash(counters)
+            post_hashes = {post.id: content_hash(post, exclude=POST_COUNTER_FIELDS)
+                           for post in topic.post_comments or []}
+
+        stored = self.content_index.get_topic(topic.id)
+        stored_posts = self.content_index.get_posts(topic.id)
+        changed_posts = [post for post in topic.post_comments or []
+                         if stored_posts.get(post.id) != post_hashes[post.id]]
+        hashes = ({post.id: post_hashes[post.id] for post in changed_posts},
+                  (topic_hash, counters_hash) if complete else None)
+        self.crawler.stats.inc_value('changes/unchanged_posts', len(post_hashes) - len(changed_posts))
+
+        if stored is None or stored[0] != topic_hash or changed_posts:
+            self.crawler.stats.inc_value('changes/new_topics' if stored is None else 'changes/changed_topics')
+            topic.post_comments = changed_posts
+            self.unrecorded_hashes[topic.id] = hashes
+            return topic
+        if stored[1] != counters_hash:
+            self.crawler.stats.inc_value('changes/counter_updates')
+            self.unrecorded_hashes[topic.id] = hashes
+            return counters
+        self.crawler.stats.inc_value('changes/unchanged_topics')
+        return None
+
+    def item_scraped(self, item, response, spider):
+        """
+        Handler of the `item_scraped` signal, the state and content hashes of the topic are recorded when
+        the spider closes. Topics whose item was dropped or failed in a pipeline are fetched again by the next run.
+        """
+        if (state := self.unscraped_states.pop(item.id, None)) is not None:
+            self.scraped_states.append(state)
+        if (hashes := self.unrecorded_hashes.pop(item.id, None)) is not None:
+            self.scraped_hashes[item.id] = hashes
+
+    def discard_topics(self, topic_ids):
+        """
+        Called by an output that failed to write items after they were scraped, e.g. a Postgres batch
+        that could not be committed. The topics are fetched and emitted again by the next run.
+
+        Args:
+            topic_ids: The ids of the topics of the lost items.
+        """
+        self.discarded_topics.update(topic_ids)
+
+    def closed(self, reason):
+        """
+        Called when the spider is closed, after the pipelines have been closed. Persists the state of the
+        scraped topics and the content hashes and closes the frontier. The checkpoint of a resumable crawl
+        is removed once the crawl finished.
+
+        Args:
+            reason (str): The reason the spider was closed.
+        """
+        if self.state_store is not None:
+            for topic, fetched_at in self.scraped_states:
+                if topic['id'] not in self.discarded_topics:
+                    self.state_store.record(topic, fetched_at)
+            self.state_store.close()
+        if self.frontier is not None:
+            self.frontier.close()
+        if self.content_index is not None:
+            for topic_id, (post_hashes, topic_hashes) in self.scraped_hashes.items():
+                if topic_id in self.discarded_topics:
+                    continue
+                self.content_index.record_posts(topic_id, post_hashes)
+                if topic_hashes is not None:
+                    self.content_index.record_topic(topic_id, *topic_hashes)
+            self.content_index.close()
+        if self.checkpoint is not None:
+            self.checkpoint.close()
+            if reason == 'finished':
+                for suffix in ('', '-wal', '-shm'):
+                    if os.path.exists(self.checkpoint.path + suffix):
+                        os.remove(self.checkpoint.path + suffix)
+            else:
+                logging.info(f"Crawl stopped ({reason}), continue it with -a checkpoint={self.checkpoint.path}")
 
     def get_next_page_number(self, more_topics_url: str) -> str | None:
         """
@@ -0,0 +1,393 @@
+import os
+import sqlite3
+from datetime import datetime
+
+import orjson
+
+from openai_community_scraper.items import TopicCounters, TopicDetail, encode_item
+
+
+class TopicStateStore:
+    """
+    A small SQLite backed store remembering the last seen state of every scraped topic.
+
+    It is used by the incremental crawl mode to decide whether a topic from the listing
+    changed since the previous run, so unchanged topics can be skipped.
+
+    Attributes:
+        path (str): Location of the SQLite database file.
+        commit_every (int): Number of recorded topics after which pending writes are committed.
+    """
+
+    def __init__(self, path: str, commit_every: int = 100):
+        self.path = path
+        self.commit_every = commit_every
+        self.connection = sqlite3.connect(path)
+        self._pending_writes = 0
+        self._create_tables()
+
+    def _create_tables(self):
+        self.connection.execute(
+            """
+            CREATE TABLE IF NOT EXISTS topic_state (
+                id INTEGER PRIMARY KEY,
+                last_posted_at TEXT,
+                posts_count INTEGER,
+                highest_post_number INTEGER,
+                fetched_at TEXT
+            )
+            """
+        )
+        self.connection.commit()
+
+    def get(self, topic_id: int) -> tuple | None:
+        """
+        Returns the stored (last_posted_at, posts_count, highest_post_number) of a topic, or None if unknown.
+        """
+        return self.connection.execute(
+            "SELECT last_posted_at, posts_count, highest_post_number FROM topic_state WHERE id = ?",
+            (int(topic_id),),
+        ).fetchone()
+
+    def last_fetch(self, topic_id: int) -> tuple | None:
+        """
+        Returns the (posts_count, fetched_at) of the last fetch of a topic, or None if unknown.
+        """
+        row = self.connection.execute(
+            "SELECT posts_count, fetched_at FROM topic_state WHERE id = ?", (int(topic_id),)).fetchone()
+        if row is None:
+            return None
+        return row[0], datetime.fromisoformat(row[1])
+
+    def is_current(self, topic: dict) -> bool:
+        """
+        Checks whether a topic listing entry matches the state recorded by a previous run.
+
+        Args:
+            topic (dict): A topic entry from the `latest.json` listing.
+
+        Returns:
+            True if the topic is known and has not changed since it was last fetched.
+        """
+        stored = self.get(topic["id"])
+        if stored is None:
+            return False
+        return stored == (topic.get("last_posted_at"), topic.get("posts_count"), topic.get("highest_post_number"))
+
+    def record(self, topic: dict, fetched_at: datetime | None = None):
+        """
+        Records the state of a topic after its details have been fetched.
+
+        Args:
+            topic (dict): The topic detail (or listing) data containing `id`, `last_posted_at`,
+                `posts_count` and `highest_post_number`.
+            fetched_at (datetime | None): When the details were fetched, defaults to now (UTC).
+        """
+        self.connection.execute(
+            """
+            INSERT INTO topic_state (id, last_posted_at, posts_count, highest_post_number, fetched_at)
+            VALUES (?, ?, ?, ?, ?)
+            ON CONFLICT (id) DO UPDATE SET
+                last_posted_at = excluded.last_posted_at,
+                posts_count = excluded.posts_count,
+                highest_post_number = excluded.highest_post_number,
+                fetched_at = excluded.fetched_at
+            """,
+            (
+                int(topic["id"]),
+                topic.get("last_posted_at"),
+                topic.get("posts_count"),
+                topic.get("highest_post_number"),
+                (fetched_at or datetime.utcnow()).isoformat(),
+            ),
+        )
+        self._pending_writes += 1
+        if self._pending_writes >= self.commit_every:
+            self.commit()
+
+    def commit(self):
+        self.connection.commit()
+        self._pending_writes = 0
+
+    def close(self):
+        self.commit()
+        self.connection.close()
+
+
+class TopicFrontier:
+    """
+    A SQLite backed set of claimed topic ids, shared by the worker processes of a sharded crawl.
+
+    Claims are committed immediately so that every worker sees the topics claimed by the others.
+
+    Attributes:
+        path (str): Location of the SQLite database file.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self.worker = str(os.getpid())
+        self.connection = sqlite3.connect(path, timeout=60, isolation_level=None)
+        self.connection.execute("PRAGMA journal_mode=WAL")
+        self.connection.execute(
+            """
+            CREATE TABLE IF NOT EXISTS claimed_topics (
+                id INTEGER PRIMARY KEY,
+                worker TEXT,
+                claimed_at TEXT
+            )
+            """
+        )
+
+    def claim(self, topic_id: int) -> bool:
+        """
+        Claims a topic for this worker.
+
+        Args:
+            topic_id (int): The id of the topic.
+
+        Returns:
+            True if the topic was not claimed before, by this or any other worker.
+        """
+        cursor = self.connection.execute(
+            "INSERT OR IGNORE INTO claimed_topics (id, worker, claimed_at) VALUES (?, ?, ?)",
+            (int(topic_id), self.worker, datetime.utcnow().isoformat()),
+        )
+        return cursor.rowcount == 1
+
+    def close(self):
+        self.connection.close()
+
+
+class ContentHashIndex:
+    """
+    A SQLite backed index of the content hashes of every emitted topic and post.
+
+    It is used by the change-only mode to tell new or edited content apart from topics where only
+    the counters (views, likes, replies) moved since the previous run.
+
+    Attributes:
+        path (str): Location of the SQLite database file.
+        commit_every (int): Number of recorded topics after which pending writes are committed.
+    """
+
+    def __init__(self, path: str, commit_every: int = 100):
+        self.path = path
+        self.commit_every = commit_every
+        self.connection = sqlite3.connect(path)
+        self._pending_writes = 0
+        self._create_tables()
+
+    def _create_tables(self):
+        self.connection.executescript(
+            """
+            CREATE TABLE IF NOT EXISTS topic_hashes (
+                id INTEGER PRIMARY KEY,
+                content_hash BLOB,
+                counters_hash BLOB,
+                updated_at TEXT
+            );
+            CREATE TABLE IF NOT EXISTS post_hashes (
+                id INTEGER PRIMARY KEY,
+                topic_id INTEGER,
+                content_hash BLOB
+            );
+            CREATE INDEX IF NOT EXISTS post_hashes_topic_id_idx ON post_hashes (topic_id);
+            """
+        )
+        self.connection.commit()
+
+    def get_topic(self, topic_id: int) -> tuple | None:
+        """
+        Returns the stored (content_hash, counters_hash) of a topic, or None if unknown.
+        """
+        return self.connection.execute(
+            "SELECT content_hash, counters_hash FROM topic_hashes WHERE id = ?", (int(topic_id),)
+        ).fetchone()
+
+    def get_posts(self, topic_id: int) -> dict:
+        """
+        Returns the stored content hashes of the posts of a topic, by post id.
+        """
+        return dict(self.connection.execute(
+            "SELECT id, content_hash FROM post_hashes WHERE topic_id = ?", (int(topic_id),)
+        ))
+
+    def record_posts(self, topic_id: int, post_hashes: dict):
+        """
+        Records the content hashes of posts of a topic.
+
+        Args:
+            topic_id (int): The id of the topic.
+            post_hashes (dict): The content hashes of the posts, by post id.
+        """
+        self.connection.executemany(
+            "INSERT OR REPLACE INTO post_hashes (id, topic_id, content_hash) VALUES (?, ?, ?)",
+            [(post_id, int(topic_id), content_hash) for post_id, content_hash in post_hashes.items()],
+        )
+
+    def record_topic(self, topic_id: int, content_hash: bytes, counters_hash: bytes):
+        """
+        Records the content and counters hashes of a topic once it has been emitted.
+
+        Args:
+            topic_id (int): The id of the topic.
+            content_hash (bytes): Hash of the topic fields, counters excluded.
+            counters_hash (bytes): Hash of the counters of the topic.
+        """
+        self.connection.execute(
+            "INSERT OR REPLACE INTO topic_hashes (id, content_hash, counters_hash, updated_at) VALUES (?, ?, ?, ?)",
+            (int(topic_id), content_hash, counters_hash, datetime.utcnow().isoformat()),
+        )
+        self._pending_writes += 1
+        if self._pending_writes >= self.commit_every:
+            self.commit()
+
+    def commit(self):
+        self.connection.commit()
+        self._pending_writes = 0
+
+    def close(self):
+        self.commit()
+        self.connection.close()
+
+
+class CrawlCheckpoint:
+    """
+    A SQLite backed checkpoint of a crawl, used by the resumable mode to continue a crawl that stopped.
+
+    It holds the frontier of the crawl (the parsed listing pages and the ids of the topics whose details
+    were requested), a write-ahead log of the emitted items, and the items every pipeline has durably
+    committed. Every write is committed immediately, so the checkpoint survives the crawl process dying.
+
+    Attributes:
+        path (str): Location of the SQLite database file.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self.connection = sqlite3.connect(path, isolation_level=None)
+        self.connection.execute("PRAGMA journal_mode=WAL")
+        self.connection.execute("PRAGMA synchronous=NORMAL")
+        self.connection.executescript(
+            """
+            CREATE TABLE IF NOT EXISTS checkpoint_meta (
+                key TEXT PRIMARY KEY,
+                value TEXT
+            );
+            CREATE TABLE IF NOT EXISTS listing_pages (
+                page INTEGER PRIMARY KEY
+            );
+            CREATE TABLE IF NOT EXISTS pending_topics (
+                id INTEGER PRIMARY KEY,
+                done INTEGER NOT NULL DEFAULT 0
+            );
+            CREATE TABLE IF NOT EXISTS item_log (
+                seq INTEGER PRIMARY KEY AUTOINCREMENT,
+                topic_id INTEGER UNIQUE,
+                kind TEXT,
+                item BLOB
+            );
+            CREATE TABLE IF NOT EXISTS pipeline_commits (
+                pipeline TEXT,
+                topic_id INTEGER,
+                marker TEXT,
+                PRIMARY KEY (pipeline, topic_id)
+            );
+            """
+        )
+
+    def get_value(self, key: str, default=None):
+        row = self.connection.execute("SELECT value FROM checkpoint_meta WHERE key = ?", (key,)).fetchone()
+        return default if row is None else row[0]
+
+    def set_value(self, key: str, value):
+        self.connection.execute("INSERT OR REPLACE INTO checkpoint_meta (key, value) VALUES (?, ?)", (key, value))
+
+    def add_listing_page(self, page: int):
+        self.connection.execute("INSERT OR IGNORE INTO listing_pages (page) VALUES (?)", (int(page),))
+
+    def listing_pages(self) -> set:
+        """
+        Returns the numbers of the listing pages parsed so far.
+        """
+        return {page for page, in self.connection.execute("SELECT page FROM listing_pages")}
+
+    def add_topic(self, topic_id: int) -> bool:
+        """
+        Adds a topic to the frontier before its details are requested.
+
+        Args:
+            topic_id (int): The id of the topic.
+
+        Returns:
+            True if the topic was not in the frontier yet.
+        """
+        cursor = self.connection.execute("INSERT OR IGNORE INTO pending_topics (id) VALUES (?)", (int(topic_id),))
+        return cursor.rowcount == 1
+
+    def pending_topics(self) -> list[int]:
+        """
+        Returns the ids of the topics that were requested but not completed.
+        """
+        return [topic_id for topic_id, in self.connection.execute("SELECT id FROM pending_topics WHERE done = 0")]
+
+    def complete_topic(self, topic_id: int, item=None):
+        """
+        Marks a topic as completed and appends its item, if any, to the write-ahead log in one transaction.
+
+        An item replacing an earlier item of the same topic moves to the end of the log.
+
+        Args:
+            topic_id (int): The id of the topic.
+            item (TopicDetail | TopicCounters | None): The emitted item, None if the topic was not emitted.
+        """
+        with self.connection:
+            self.connection.execute("BEGIN")
+            if item is not None:
+                self.connection.execute(
+                    "INSERT OR REPLACE INTO item_log (topic_id, kind, item) VALUES (?, ?, ?)",
+                    (int(topic_id), 'counters' if isinstance(item, TopicCounters) else 'topic', encode_item(item)),
+                )
+            self.connection.execute("UPDATE pending_topics SET done = 1 WHERE id = ?", (int(topic_id),))
+
+    def logged_items(self):
+        """
+        Iterates over the items of the write-ahead log, in the order they were emitted.
+        """
+        for kind, data in self.connection.execute("SELECT kind, item FROM item_log ORDER BY seq"):
+            data = orjson.loads(data)
+            yield TopicCounters(**data) if kind == 'counters' else TopicDetail.from_dict(data)
+
+    def record_commit(self, pipeline: str, topic_ids, marker: str | None = None):
+        """
+        Records that a pipeline durably committed the items of some topics.
+
+        Args:
+            pipeline (str): The name of the pipeline, e.g. `json`.
+            topic_ids: The ids of the committed topics.
+            marker (str | None): A file that only exists once the commit is complete, the commit is
+                ignored when resuming if the file does not exist.
+        """
+        with self.connection:
+            self.connection.execute("BEGIN")
+            self.connection.executemany(
+                "INSERT OR REPLACE INTO pipeline_commits (pipeline, topic_id, marker) VALUES (?, ?, ?)",
+                [(pipeline, int(topic_id), marker) for topic_id in topic_ids],
+            )
+
+    def committed_topics(self, pipeline: str) -> set:
+        """
+        Returns the ids of the topics whose items were durably committed by a pipeline.
+        """
+        committed, markers = set(), {}
+        for topic_id, marker in self.connection.execute(
+                "SELECT topic_id, marker FROM pipeline_commits WHERE pipeline = ?", (pipeline,)):
+            if marker is not None and marker not in markers:
+                markers[marker] = os.path.exists(marker)
+            if marker is None or markers[marker]:
+                committed.add(topic_id)
+        return committed
+
+    def close(self):
+        self.connection.close()
@@ -0,0 +1,93 @@
+from datetime import datetime, timedelta
+
+import orjson
+import pytest
+from scrapy.http import Request, TextResponse
+from scrapy.utils.test import get_crawler
+
+from openai_community_scraper.spiders.openai_forum import OpenAIForumSpider
+
+
+def iso(value: datetime) -> str:
+    return value.isoformat(timespec='milliseconds') + 'Z'
+
+
+@pytest.fixture
+def listing_topic():
+    """
+    Factory of `latest.json` topic entries, created and last bumped `hours_ago` hours ago.
+    """
+    def make(topic_id, hours_ago=1, **fields):
+        activity = iso(datetime.utcnow() - timedelta(hours=hours_ago))
+        return {'id': topic_id, 'created_at': activity, 'last_posted_at': activity, 'bumped_at': activity,
+                'posts_count': 1, 'highest_post_number': 1, 'views': 10, **fields}
+    return make
+
+
+@pytest.fixture
+def topic_data():
+    """
+    Factory of `/t/{id}.json` topic responses with `posts` inlined posts.
+    """
+    def make(topic_id, posts=1, **fields):
+        created_at = iso(datetime.utcnow() - timedelta(hours=1))
+        post_list = [{'id': topic_id * 1000 + number, 'topic_id': topic_id, 'post_number': number,
+                      'username': f'user{number % 3}', 'cooked': f'<p>Post {number} of topic {topic_id}</p>',
+                      'created_at': created_at, 'updated_at': created_at, 'reads': 1}
+                     for number in range(1, posts + 1)]
+        return {
+            'id': topic_id, 'title': f'Topic {topic_id}', 'created_at': created_at, 'views': 10, 'reply_count': 0,
+            'like_count': 0, 'posts_count': posts, 'vote_count': 0, 'word_count': 10, 'tags': ['api'],
+            'tags_descriptions': {}, 'last_posted_at': created_at, 'visible': True, 'closed': False,
+            'archived': False, 'archetype': 'regular', 'slug': f'topic-{topic_id}', 'user_id': 1,
+            'current_post_number': 1, 'highest_post_number': posts, 'participant_count': 1,
+            'post_stream': {'posts': post_list, 'stream': [post['id'] for post in post_list]},
+            **fields,
+        }
+    return make
+
+
+@pytest.fixture
+def make_spider(tmp_path):
+    """
+    Factory of spiders with their SQLite stores in a temporary directory.
+    """
+    def make(settings=None, **kwargs):
+        crawler = get_crawler(OpenAIForumSpider, {
+            'TOPIC_STATE_DB': str(tmp_path / 'topic_state.db'),
+            'CONTENT_HASH_DB': str(tmp_path / 'content_hashes.db'),
+            **(settings or {}),
+        })
+        # No output method, the pipelines would be configured on the frozen settings
+        spider = OpenAIForumSpider.from_crawler(crawler, **{'output_method': '', **kwargs})
+        crawler.spider = spider
+        return spider
+    return make
+
+
+def json_response(url: str, data, meta=None) -> TextResponse:
+    return TextResponse(url, body=orjson.dumps(data), encoding='utf-8', request=Request(url, meta=meta or {}))
+
+
+@pytest.fixture
+def listing_response():
+    """
+    Factory of `latest.json` responses of a spider.
+    """
+    def make(spider, topics, page=0, more=True):
+        topic_list = {'topics': topics}
+        if more:
+            topic_list['more_topics_url'] = f'/latest?no_definitions=true&page={page + 1}'
+        return json_response(spider.topic_listing_url_template.format(page), {'topic_list': topic_list},
+                             meta={'listing_page': page})
+    return make
+
+
+@pytest.fixture
+def detail_response():
+    """
+    Factory of `/t/{id}.json` responses of a spider.
+    """
+    def make(spider, data, meta=None):
+        return json_response(spider.topic_details_url_template.format(data['id']), data, meta)
+    return make
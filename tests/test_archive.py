@@ -0,0 +1,63 @@
+import orjson
+import pytest
+
+from openai_community_scraper.archive import ArchiveWriter, load_archive, unpack
+from openai_community_scraper.items import Post, TopicDetail, encode_item
+
+
+def recorded_topics():
+    author = {'user_id': 1, 'username': 'alice', 'avatar_template': '/user_avatar/alice/{size}/1.png',
+              'trust_level': 2, 'moderator': False}
+    return [
+        {'id': 1, 'title': 'First', 'image_url': 'https://cdn/a.png',
+         'thumbnails': [{'url': 'https://cdn/a.png', 'width': 10}], 'post_comments': [
+            {'id': 11, 'post_number': 1, **author, 'cooked': '<p>Hi</p>',
+             'link_counts': [{'url': 'https://cdn/a.png', 'clicks': 1}]},
+            {'id': 12, 'post_number': 2, 'user_id': 2, 'username': 'bob', 'cooked': '<p>Hello</p>'},
+        ]},
+        {'id': 2, 'title': 'Second', 'image_url': None, 'post_comments': [
+            {'id': 21, 'post_number': 1, **author, 'cooked': '<p>Again</p>', 'link_counts': None}]},
+        {'id': 3, 'title': 'No posts', 'post_comments': None},
+    ]
+
+
+def test_round_trip_keeps_values_and_key_order(tmp_path):
+    topics = recorded_topics()
+    writer = ArchiveWriter(str(tmp_path / 'topics.archive.json'))
+    for topic in topics:
+        writer.add(topic)
+    writer.close()
+    restored = load_archive(str(tmp_path / 'topics.archive.json'))
+    assert restored == topics
+    assert [list(post) for post in restored[0]['post_comments']] == [list(post) for post in topics[0]['post_comments']]
+
+    archive = orjson.loads((tmp_path / 'topics.archive.json').read_bytes())
+    assert archive['assets'] == ['https://cdn/a.png']
+    assert len(archive['users']) == 2
+    assert list(tmp_path.iterdir()) == [tmp_path / 'topics.archive.json']
+
+
+def test_items_round_trip_compressed(tmp_path):
+    item = TopicDetail(id=1, title='Item', tags=['api'], post_comments=[
+        Post(id=11, post_number=1, username='alice', cooked='<p>Hi</p>')])
+    path = str(tmp_path / 'items.archive.json.gz')
+    writer = ArchiveWriter(path)
+    writer.add(item)
+    writer.close()
+    assert writer.topic_count == 1
+    assert load_archive(path) == [orjson.loads(encode_item(item))]
+
+
+def test_dumps_matches_a_single_document():
+    writer = ArchiveWriter()
+    assert unpack(writer.dumps()) == []
+    for topic in recorded_topics():
+        writer.add(topic)
+    data = writer.dumps()
+    assert data == orjson.dumps(orjson.loads(data))
+    assert unpack(data) == recorded_topics()
+
+
+def test_unknown_versions_are_rejected():
+    with pytest.raises(ValueError):
+        unpack(b'{"version": 99}')
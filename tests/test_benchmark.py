@@ -0,0 +1,59 @@
+from concurrent.futures import ThreadPoolExecutor
+
+import orjson
+
+from openai_community_scraper.benchmark import LISTING_PAGE_SIZE, MockDiscourseServer, main
+
+
+def recorded_topics(count):
+    return [{'id': topic_id, 'title': f'Topic {topic_id}', 'created_at': f'2024-05-01T10:{topic_id % 60:02d}:00.000Z',
+             'last_posted_at': None, 'post_comments': [{'id': topic_id * 1000 + 1, 'post_number': 1}]}
+            for topic_id in range(1, count + 1)]
+
+
+def test_listing_pages_are_numbered_from_0():
+    server = MockDiscourseServer(recorded_topics(2 * LISTING_PAGE_SIZE + 5))
+    served, page = [], 0
+    while True:
+        status, body, _ = server.respond(f'/latest.json?no_definitions=false&page={page}', {})
+        topic_list = orjson.loads(body)['topic_list']
+        served += [topic['id'] for topic in topic_list['topics']]
+        if 'more_topics_url' not in topic_list:
+            break
+        page = int(topic_list['more_topics_url'].rpartition('=')[2])
+    assert sorted(served) == list(range(1, 2 * LISTING_PAGE_SIZE + 6))
+    assert page == 2
+    server.httpd.server_close()
+
+
+def test_spider_crawls_the_newest_listing_page(make_spider):
+    server = MockDiscourseServer(recorded_topics(LISTING_PAGE_SIZE + 5))
+    spider = make_spider({'FORUM_URL': server.url})
+    first_request = next(iter(spider.start_requests()))
+    _, body, _ = server.respond(first_request.url.removeprefix(server.url), {})
+    newest = max(server.listing, key=lambda topic: topic['bumped_at'])
+    assert newest['id'] in [topic['id'] for topic in orjson.loads(body)['topic_list']['topics']]
+    server.httpd.server_close()
+
+
+def test_request_count_is_thread_safe():
+    server = MockDiscourseServer(recorded_topics(3))
+    with ThreadPoolExecutor(max_workers=8) as executor:
+        list(executor.map(lambda _: server.respond('/t/1.json', {}), range(2000)))
+    assert server.request_count == 2000
+    server.httpd.server_close()
+
+
+def test_failed_crawls_are_reported(tmp_path):
+    data = tmp_path / 'topics.json'
+    data.write_bytes(orjson.dumps(recorded_topics(5)))
+    report = tmp_path / 'report.json'
+    # Postgres is configured, but the pipeline cannot connect with these credentials
+    postgres = ['-s', 'POSTGRES_URI=127.0.0.1', '-s', 'POSTGRES_USER=missing-user', '-s', 'POSTGRES_PASS=pass',
+                '-s', 'POSTGRES_DB=missing-db']
+    assert main(['--data', str(data), '--pipelines', 'json,postgres', '--report', str(report), *postgres]) == 1
+
+    json_result, postgres_result = orjson.loads(report.read_bytes())['results']
+    assert json_result['items'] == 5 and json_result['finish_reason'] == 'finished'
+    assert not json_result['rate_limited'] and 'error' not in json_result
+    assert postgres_result['error'].startswith('The crawl failed')
@@ -0,0 +1,67 @@
+import copy
+from datetime import datetime, timezone
+from email.utils import format_datetime
+
+from scrapy.http import Request, TextResponse
+from scrapy.settings import Settings
+
+from openai_community_scraper.httpcache import TopicActivityPolicy
+from openai_community_scraper.items import TopicCounters, TopicDetail
+
+
+def detail_requests(spider, response):
+    return [request for request in spider.parse(response) if isinstance(request, Request)
+            and request.callback == spider.parse_topic_detail]
+
+
+def test_change_only_detail_requests_are_revalidated(make_spider, listing_topic, listing_response):
+    topics = [listing_topic(1, hours_ago=5), listing_topic(2, hours_ago=6)]
+    default_requests = detail_requests(make_spider(), listing_response(make_spider(), topics))
+    assert [request.meta['topic_data']['id'] for request in default_requests] == [1, 2]
+
+    spider = make_spider(changes_only='true')
+    requests = detail_requests(spider, listing_response(spider, topics))
+    assert len(requests) == 2 and not any('topic_data' in request.meta for request in requests)
+
+    # A copy cached after the last activity of the topic is not served without asking the forum
+    cached = TextResponse(requests[0].url, body=b'{}', headers={
+        'Date': format_datetime(datetime.now(timezone.utc), usegmt=True), 'ETag': '"v1"'})
+    assert not TopicActivityPolicy(Settings()).is_cached_response_fresh(cached, requests[0])
+    assert requests[0].headers[b'If-None-Match'] == b'"v1"'
+
+
+def test_counters_only_changes_are_emitted_as_counters(make_spider, topic_data, detail_response):
+    data = topic_data(1, posts=2)
+
+    def crawl(**changes):
+        spider = make_spider(changes_only='true')
+        items = list(spider.parse_topic_detail(detail_response(spider, {**copy.deepcopy(data), **changes})))
+        for item in items:
+            spider.item_scraped(item, None, spider)
+        spider.closed('finished')
+        return items, spider.crawler.stats
+
+    (first,), _ = crawl()
+    assert isinstance(first, TopicDetail) and len(first.post_comments) == 2
+    assert crawl()[0] == []
+
+    (counters,), _ = crawl(views=50, like_count=3)
+    assert counters == TopicCounters(id=1, views=50, like_count=3, reply_count=0)
+
+    data['post_stream']['posts'][1]['cooked'] = '<p>Edited</p>'
+    (changed,), stats = crawl(views=50, like_count=3)
+    assert isinstance(changed, TopicDetail)
+    assert [post.cooked for post in changed.post_comments] == ['<p>Edited</p>']
+    assert stats.get_value('changes/changed_topics') == 1
+
+
+def test_hashes_of_unscraped_items_are_not_recorded(make_spider, topic_data, detail_response):
+    data = topic_data(1, posts=2)
+    spider = make_spider(changes_only='true')
+    assert len(list(spider.parse_topic_detail(detail_response(spider, copy.deepcopy(data))))) == 1
+    # The item was dropped by a pipeline, it is emitted again by the next run
+    spider.closed('finished')
+
+    spider = make_spider(changes_only='true')
+    item, = spider.parse_topic_detail(detail_response(spider, copy.deepcopy(data)))
+    assert isinstance(item, TopicDetail) and len(item.post_comments) == 2
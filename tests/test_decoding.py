@@ -0,0 +1,54 @@
+import orjson
+import pytest
+
+from openai_community_scraper import decoding
+from openai_community_scraper.items import Post
+
+
+@pytest.fixture(params=['msgspec', 'orjson'])
+def decoder(request, monkeypatch):
+    """
+    Runs a test with the msgspec decoders and with the orjson fallback.
+    """
+    if request.param == 'msgspec' and decoding.msgspec is None:
+        pytest.skip("msgspec is not installed")
+    if request.param == 'orjson':
+        monkeypatch.setattr(decoding, 'msgspec', None)
+    return decoding
+
+
+def test_listing(decoder):
+    body = orjson.dumps({'topic_list': {'topics': [
+        {'id': 1, 'created_at': '2024-05-01T10:00:00.000Z', 'bumped_at': '2024-05-02T10:00:00.000Z',
+         'title': 'Unused by the spider'}],
+        'more_topics_url': '/latest?page=2'}})
+    topics, more_topics_url = decoder.decode_listing(body)
+    assert more_topics_url == '/latest?page=2'
+    assert topics[0]['id'] == 1 and topics[0].get('bumped_at') == '2024-05-02T10:00:00.000Z'
+    assert topics[0].get('last_posted_at') is None
+
+
+def test_topic_posts_are_built_in_post_number_order(decoder, topic_data):
+    data = topic_data(5, posts=3, details={'created_by': {'id': 1}})
+    data['post_stream']['posts'].reverse()
+    data['post_stream']['posts'][0].update(can_edit=False, yours=False)
+    topic = decoder.decode_topic(orjson.dumps(data))
+    assert topic['title'] == 'Topic 5' and topic['post_stream']['stream'] == [5001, 5002, 5003]
+    assert decoder.post_ids(topic['post_stream']['posts']) == [5003, 5002, 5001]
+
+    posts = decoder.build_posts(topic['post_stream']['posts'])
+    assert [post.post_number for post in posts] == [1, 2, 3]
+    assert all(isinstance(post, Post) for post in posts)
+
+
+def test_posts_batch(decoder, topic_data):
+    posts = topic_data(5, posts=2)['post_stream']['posts']
+    decoded = decoder.decode_posts(orjson.dumps({'post_stream': {'posts': posts}}))
+    assert [post.cooked for post in decoder.build_posts(decoded)] == [post['cooked'] for post in posts]
+
+
+def test_posts_with_unexpected_types_fall_back_to_the_lenient_path(decoder, topic_data):
+    posts = topic_data(5, posts=1)['post_stream']['posts']
+    posts[0]['reads'] = '12'
+    post, = decoder.build_posts(decoder.decode_posts(orjson.dumps({'post_stream': {'posts': posts}})))
+    assert post.reads == '12'
@@ -0,0 +1,143 @@
+import glob
+import os
+from dataclasses import dataclass
+from datetime import datetime, timezone
+from types import SimpleNamespace
+
+import pytest
+from scrapy.statscollectors import MemoryStatsCollector
+from scrapy.utils.test import get_crawler
+
+from openai_community_scraper.exporters import (JsonLinesWriter, ParquetDatasetWriter, _arrow_converter, arrow_schema,
+                                                pyarrow, read_json_lines, zstandard)
+from openai_community_scraper.items import TopicCounters
+from openai_community_scraper.pipelines import JsonPipeline
+from openai_community_scraper.state import CrawlCheckpoint
+
+
+def test_json_lines_are_only_visible_once_the_file_is_complete(tmp_path):
+    path = str(tmp_path / 'out.jsonl')
+    writer = JsonLinesWriter(path, buffer_size=1)
+    writer.write(b'{"id":1}')
+    assert os.path.exists(path + '.tmp')
+    assert not os.path.exists(path)
+
+    writer.close()
+    assert not os.path.exists(path + '.tmp')
+    assert writer.paths == [path]
+    assert list(read_json_lines(path)) == [b'{"id":1}']
+
+
+def test_json_lines_rotate_by_size(tmp_path):
+    writer = JsonLinesWriter(str(tmp_path / 'out.jsonl'), max_file_size=20)
+    for topic_id in range(5):
+        writer.write(b'{"id":%d}' % topic_id)  # 9 bytes and a newline
+    writer.close()
+
+    assert [os.path.basename(path) for path in writer.paths] == [
+        'out-00000.jsonl', 'out-00001.jsonl', 'out-00002.jsonl']
+    lines = [line for path in writer.paths for line in read_json_lines(path)]
+    assert lines == [b'{"id":%d}' % topic_id for topic_id in range(5)]
+
+
+@pytest.mark.parametrize('compression', ['gzip', 'zstd'])
+def test_json_lines_compression(tmp_path, compression):
+    if compression == 'zstd' and zstandard is None:
+        pytest.skip('zstandard is not installed')
+    writer = JsonLinesWriter(str(tmp_path / 'out.jsonl'), compression=compression)
+    writer.write(b'{"id":1}')
+    writer.write(b'{"id":2}')
+    writer.close()
+
+    path, = writer.paths
+    assert path.endswith({'gzip': '.jsonl.gz', 'zstd': '.jsonl.zst'}[compression])
+    assert list(read_json_lines(path)) == [b'{"id":1}', b'{"id":2}']
+
+
+def test_json_lines_leave_an_empty_file_without_items(tmp_path):
+    writer = JsonLinesWriter(str(tmp_path / 'out.jsonl'))
+    writer.close()
+    assert list(read_json_lines(writer.paths[0])) == []
+
+
+def test_json_lines_rotate_on_demand_from_a_numbered_part(tmp_path):
+    writer = JsonLinesWriter(str(tmp_path / 'out.jsonl'), first_part=3)
+    writer.write(b'{"id":1}')
+    assert writer.part_path().endswith('out-00003.jsonl')
+    writer.rotate()
+    writer.write(b'{"id":2}')
+    writer.close()
+    assert [os.path.basename(path) for path in writer.paths] == ['out-00003.jsonl', 'out-00004.jsonl']
+
+
+def test_json_pipeline_rotates_by_size_in_checkpoint_mode(tmp_path):
+    checkpoint = CrawlCheckpoint(str(tmp_path / 'checkpoint.db'))
+    pipeline = JsonPipeline(str(tmp_path / 'out.jsonl'), max_file_size=120, checkpoint_interval=100)
+    pipeline.stats = MemoryStatsCollector(get_crawler())
+    pipeline.open_spider(SimpleNamespace(name='openai_forum', checkpoint=checkpoint))
+    for topic_id in range(1, 6):
+        pipeline.process_item(TopicCounters(id=topic_id, views=1), None)
+    pipeline.close_spider(None)
+
+    assert len(pipeline.writer.paths) == 3
+    assert all(os.path.getsize(path) <= 120 for path in pipeline.writer.paths)
+    # Every completed file is committed
+    assert checkpoint.committed_topics('json') == {1, 2, 3, 4, 5}
+
+
+def test_json_lines_reject_unknown_compression():
+    with pytest.raises(ValueError):
+        JsonLinesWriter('out.jsonl', compression='lz4')
+
+
+@dataclass
+class Row:
+    id: int
+    text: str
+
+
+def read_partitions(path):
+    return {os.path.basename(directory): sorted(pyarrow.parquet.read_table(os.path.join(path, directory)).to_pylist(),
+                                                 key=lambda row: row['id'])
+            for directory in sorted(os.listdir(path))}
+
+
+@pytest.mark.skipif(pyarrow is None, reason="pyarrow is not installed")
+def test_parquet_rewrites_written_partitions_and_carries_over_other_rows(tmp_path):
+    schema = arrow_schema(Row)
+    writer = ParquetDatasetWriter(str(tmp_path), schema, partition_column='day', row_group_size=2)
+    for day, row in [('a', Row(1, 'one')), ('a', Row(2, 'two')), ('a', Row(3, 'three')), ('b', Row(4, 'four'))]:
+        writer.write(day, row)
+    writer.close()
+
+    writer = ParquetDatasetWriter(str(tmp_path), schema, partition_column='day', row_group_size=2)
+    writer.write('a', Row(2, 'edited'))
+    writer.write('c', Row(5, 'five'))
+    writer.close()
+    assert read_partitions(str(tmp_path)) == {
+        'day=a': [{'id': 1, 'text': 'one'}, {'id': 2, 'text': 'edited'}, {'id': 3, 'text': 'three'}],
+        'day=b': [{'id': 4, 'text': 'four'}],
+        'day=c': [{'id': 5, 'text': 'five'}],
+    }
+    assert not glob.glob(str(tmp_path / '*' / '*.tmp'))
+
+
+@pytest.mark.skipif(pyarrow is None, reason="pyarrow is not installed")
+def test_parquet_open_files_are_bounded(tmp_path):
+    writer = ParquetDatasetWriter(str(tmp_path), arrow_schema(Row), partition_column='day', row_group_size=1,
+                                  max_open_files=2)
+    for row_id in range(12):
+        writer.write(f'{row_id % 4}', Row(row_id, f'row {row_id}'))
+        assert len(writer._writers) <= 2
+    writer.close()
+    partitions = read_partitions(str(tmp_path))
+    assert [[row['id'] for row in partitions[f'day={day}']] for day in range(4)] == [
+        [0, 4, 8], [1, 5, 9], [2, 6, 10], [3, 7, 11]]
+    assert not glob.glob(str(tmp_path / '*' / '*.tmp'))
+
+
+@pytest.mark.skipif(pyarrow is None, reason="pyarrow is not installed")
+def test_parquet_timestamps_accept_discourse_dates():
+    convert = _arrow_converter(pyarrow.timestamp('ms', tz='UTC'))
+    assert convert('2024-05-01T10:00:00.000Z') == datetime(2024, 5, 1, 10, tzinfo=timezone.utc)
+    assert convert(None) is None
@@ -0,0 +1,60 @@
+import socket
+import urllib.request
+
+import pytest
+from scrapy.utils.test import get_crawler
+
+from openai_community_scraper import metrics
+from openai_community_scraper.extensions import STATSD_MAX_PACKET_SIZE, StageMetrics
+
+
+@pytest.fixture
+def statsd_server():
+    server = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+    server.bind(('127.0.0.1', 0))
+    server.settimeout(1)
+    yield server
+    server.close()
+
+
+def open_extension(**settings):
+    crawler = get_crawler(settings_dict={'METRICS_ENABLED': True, 'METRICS_PROMETHEUS_PORT': 0,
+                                         'METRICS_SAMPLE_INTERVAL': 60, **settings})
+    extension = StageMetrics.from_crawler(crawler)
+    extension.spider_opened(None)
+    return extension
+
+
+def test_statsd_observations_are_batched(statsd_server):
+    extension = open_extension(METRICS_STATSD_HOST='127.0.0.1', METRICS_STATSD_PORT=statsd_server.getsockname()[1])
+    try:
+        for _ in range(100):
+            metrics.observe('stage_seconds', 'parse', 0.002)
+        metrics.observe('batch_size', 'postgres', 100)
+    finally:
+        extension.spider_closed(None)
+
+    lines = []
+    while len(lines) < 101:
+        packet = statsd_server.recv(65536)
+        assert len(packet) <= STATSD_MAX_PACKET_SIZE
+        lines += packet.split(b'\n')
+    assert lines[0] == b'openai_forum.stage_seconds.parse:2.000|ms'
+    assert lines[-1] == b'openai_forum.batch_size.postgres:100|h'
+    assert len(lines) == 101
+
+
+def test_prometheus_endpoint_falls_back_to_a_free_port():
+    taken = socket.socket()
+    taken.bind(('127.0.0.1', 0))
+    taken.listen()
+    extension = open_extension(METRICS_PROMETHEUS_PORT=taken.getsockname()[1])
+    try:
+        port = extension.httpd.server_address[1]
+        assert port != taken.getsockname()[1]
+        metrics.observe('stage_seconds', 'parse', 0.01)
+        with urllib.request.urlopen(f'http://127.0.0.1:{port}/metrics') as response:
+            assert b'parse' in response.read()
+    finally:
+        extension.spider_closed(None)
+        taken.close()
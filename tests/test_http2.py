@@ -0,0 +1,78 @@
+import pytest
+from scrapy.settings import Settings
+from scrapy.statscollectors import MemoryStatsCollector
+from scrapy.utils.test import get_crawler
+from twisted.internet import defer
+
+from openai_community_scraper import http2
+
+pytestmark = pytest.mark.skipif(http2.H2ClientProtocol is None, reason="h2 is not installed")
+
+
+class Connection:
+    def __init__(self, load=0):
+        self.load = load
+
+
+class Endpoint:
+    """
+    Records connection attempts, which complete when the returned deferred fires.
+    """
+
+    def __init__(self):
+        self.attempts = []
+
+    def connect(self, factory):
+        self.attempts.append(defer.Deferred())
+        return self.attempts[-1]
+
+
+@pytest.fixture
+def pool():
+    settings = Settings({'H2_POOL_SIZE': 2, 'H2_MAX_STREAMS_PER_CONNECTION': 4})
+    return http2.PooledH2ConnectionPool(None, settings, MemoryStatsCollector(get_crawler()))
+
+
+def results(deferreds):
+    values = []
+    for d in deferreds:
+        d.addCallback(values.append)
+    return values
+
+
+def test_requests_wait_for_the_first_connection(pool):
+    endpoint = Endpoint()
+    waiting = results([pool.get_connection('forum', 'uri', endpoint) for _ in range(3)])
+    assert len(endpoint.attempts) == 1 and waiting == []
+
+    connection = Connection()
+    endpoint.attempts[0].callback(connection)
+    assert waiting == [connection] * 3
+    assert pool.stats.get_value('http2/connections_opened') == 1
+
+
+def test_busy_connections_open_another_up_to_the_pool_size(pool):
+    endpoint = Endpoint()
+    busy = Connection(load=4)
+    pool._connections['forum'] = [busy]
+    waiting = results([pool.get_connection('forum', 'uri', endpoint)])
+    # While the new connection is made, requests go to the open one
+    assert results([pool.get_connection('forum', 'uri', endpoint)]) == [busy]
+
+    idle = Connection()
+    endpoint.attempts[0].callback(idle)
+    assert waiting == [idle]
+    assert pool.stats.get_value('http2/max_connections') == 2
+
+    busy.load, idle.load = 6, 5
+    assert results([pool.get_connection('forum', 'uri', endpoint)]) == [idle]
+    assert len(endpoint.attempts) == 1
+
+
+def test_failed_connections_fail_the_waiting_requests(pool):
+    endpoint = Endpoint()
+    failures = []
+    for _ in range(2):
+        pool.get_connection('forum', 'uri', endpoint).addErrback(failures.append)
+    endpoint.attempts[0].errback(ConnectionRefusedError())
+    assert len(failures) == 2 and 'forum' not in pool._pending_requests
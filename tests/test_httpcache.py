@@ -0,0 +1,73 @@
+import os
+from datetime import datetime, timedelta, timezone
+from email.utils import format_datetime
+
+import pytest
+from scrapy.http import Request, TextResponse
+from scrapy.settings import Settings
+from scrapy.utils.test import get_crawler
+
+from openai_community_scraper.httpcache import SqliteCacheStorage, TopicActivityPolicy
+from tests.conftest import iso
+
+
+def cached_response(url, downloaded_at, body=b'{}'):
+    headers = {'Date': format_datetime(downloaded_at, usegmt=True), 'ETag': '"v1"',
+               'Cache-Control': 'no-cache, no-store'}
+    return TextResponse(url, headers=headers, body=body)
+
+
+@pytest.fixture
+def policy():
+    return TopicActivityPolicy(Settings())
+
+
+def test_topic_not_bumped_since_download_is_fresh(policy):
+    downloaded_at = datetime.now(timezone.utc)
+    request = Request('https://forum/t/1.json', meta={'topic_data': {
+        'bumped_at': iso((downloaded_at - timedelta(hours=1)).replace(tzinfo=None))}})
+    assert policy.is_cached_response_fresh(cached_response(request.url, downloaded_at), request)
+    assert b'If-None-Match' not in request.headers
+
+
+def test_bumped_topic_is_revalidated(policy):
+    downloaded_at = datetime.now(timezone.utc) - timedelta(hours=2)
+    request = Request('https://forum/t/1.json', meta={'topic_data': {
+        'bumped_at': iso(datetime.utcnow())}})
+    assert not policy.is_cached_response_fresh(cached_response(request.url, downloaded_at), request)
+    assert request.headers[b'If-None-Match'] == b'"v1"'
+
+
+def test_requests_without_topic_data_are_revalidated(policy):
+    request = Request('https://forum/latest.json?page=1')
+    assert not policy.is_cached_response_fresh(cached_response(request.url, datetime.now(timezone.utc)), request)
+    assert request.headers[b'If-None-Match'] == b'"v1"'
+
+
+def test_only_successful_responses_are_cached(policy):
+    request = Request('https://forum/t/1.json')
+    assert policy.should_cache_response(TextResponse(request.url, status=200, body=b'{}'), request)
+    assert not policy.should_cache_response(TextResponse(request.url, status=429, body=b'{}'), request)
+
+
+def test_storage_round_trip_and_eviction(tmp_path):
+    crawler = get_crawler(settings_dict={'HTTPCACHE_DIR': str(tmp_path), 'HTTPCACHE_MAX_BYTES': 3000})
+    spider = crawler._create_spider('forum')
+    storage = SqliteCacheStorage(crawler.settings)
+    storage.open_spider(spider)
+    requests = [Request(f'https://forum/t/{topic_id}.json') for topic_id in range(20)]
+    for request in requests:
+        body = f'{{"url": "{request.url}", "cooked": "{os.urandom(200).hex()}"}}'.encode()
+        storage.store_response(spider, request, TextResponse(request.url, headers={'ETag': '"v1"'}, body=body))
+
+    # The oldest responses were evicted to stay within HTTPCACHE_MAX_BYTES
+    assert storage.retrieve_response(spider, requests[0]) is None
+    response = storage.retrieve_response(spider, requests[-1])
+    assert response.headers[b'ETag'] == b'"v1"' and requests[-1].url.encode() in response.body
+    assert storage.total_size <= 3000
+    storage.close_spider(spider)
+
+    storage = SqliteCacheStorage(crawler.settings)
+    storage.open_spider(spider)
+    assert storage.retrieve_response(spider, requests[-1]).body == response.body
+    storage.close_spider(spider)
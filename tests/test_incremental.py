@@ -0,0 +1,48 @@
+from scrapy import Request
+
+from openai_community_scraper.items import TopicDetail
+from openai_community_scraper.state import TopicFrontier, TopicStateStore
+
+
+def test_topic_state_is_recorded_once_the_item_is_scraped_and_the_spider_closed(make_spider, topic_data,
+                                                                                detail_response):
+    spider = make_spider(incremental='true')
+    item, = spider.parse_topic_detail(detail_response(spider, topic_data(7)))
+    assert isinstance(item, TopicDetail)
+    spider.item_scraped(item, None, spider)
+    assert spider.state_store.get(7) is None
+
+    spider.closed('finished')
+    assert TopicStateStore(spider.state_store.path).get(7) == (item.last_posted_at, 1, 1)
+
+
+def test_topic_state_is_not_recorded_when_the_item_was_not_scraped(make_spider, topic_data, detail_response):
+    spider = make_spider(incremental='true')
+    list(spider.parse_topic_detail(detail_response(spider, topic_data(7))))
+    spider.closed('shutdown')
+    assert TopicStateStore(spider.state_store.path).get(7) is None
+
+
+def test_current_topics_are_skipped_and_stop_the_pagination(make_spider, listing_topic, listing_response):
+    spider = make_spider(incremental='true')
+    topics = [listing_topic(topic_id) for topic_id in (1, 2)]
+    for topic in topics:
+        spider.state_store.record(topic)
+
+    assert list(spider.parse(listing_response(spider, topics))) == []
+    assert spider.crawler.stats.get_value('incremental/skipped_topics') == 2
+    assert spider.crawler.stats.get_value('incremental/stopped_pagination') == 1
+
+
+def test_topics_claimed_by_another_worker_do_not_stop_the_pagination(make_spider, listing_topic, listing_response,
+                                                                     tmp_path):
+    frontier = str(tmp_path / 'frontier.db')
+    other_worker = TopicFrontier(frontier)
+    for topic_id in (1, 2):
+        other_worker.claim(topic_id)
+    spider = make_spider(incremental='true', frontier=frontier)
+
+    requests = list(spider.parse(listing_response(spider, [listing_topic(1), listing_topic(2)])))
+    assert [request.url for request in requests] == [spider.topic_listing_url_template.format(1)]
+    assert all(isinstance(request, Request) for request in requests)
+    assert spider.crawler.stats.get_value('frontier/skipped_topics') == 2
@@ -0,0 +1,48 @@
+import orjson
+import pytest
+from scrapy.settings import Settings
+
+from openai_community_scraper.exporters import JsonLinesWriter, read_json_lines
+from openai_community_scraper.launcher import (WORK_DIR_MARKER, merge_shards, prepare_work_dir, split_days,
+                                               worker_settings)
+
+
+def test_split_days():
+    assert split_days(7, 2) == [(0, 4), (4, 7)]
+    assert split_days(2, 4) == [(0, 1), (1, 2)]
+
+
+def test_worker_settings_split_the_budget():
+    settings = Settings({'ADAPTIVE_RATE_START': 1.0, 'ADAPTIVE_RATE_MIN': 0.2, 'ADAPTIVE_RATE_MAX': 10.0,
+                         'ADAPTIVE_RATE_BURST': 2.0, 'CONCURRENT_REQUESTS_PER_DOMAIN': 8})
+    assert worker_settings(settings, 4) == [
+        '-s', 'ADAPTIVE_RATE_START=0.25', '-s', 'ADAPTIVE_RATE_MIN=0.05', '-s', 'ADAPTIVE_RATE_MAX=2.5',
+        '-s', 'ADAPTIVE_RATE_BURST=1', '-s', 'CONCURRENT_REQUESTS_PER_DOMAIN=2',
+    ]
+
+
+def test_work_dir_is_only_reused_when_created_by_the_launcher(tmp_path):
+    work_dir = tmp_path / 'shards'
+    prepare_work_dir(str(work_dir))
+    (work_dir / 'shard-0.jsonl').write_text('{}\n')
+    prepare_work_dir(str(work_dir))
+    assert sorted(path.name for path in work_dir.iterdir()) == [WORK_DIR_MARKER]
+
+    (tmp_path / 'notes.txt').write_text('keep me')
+    with pytest.raises(FileExistsError):
+        prepare_work_dir(str(tmp_path))
+    assert (tmp_path / 'notes.txt').exists()
+    # An empty directory can be used
+    (tmp_path / 'empty').mkdir()
+    prepare_work_dir(str(tmp_path / 'empty'))
+
+
+def test_merge_shards_keeps_one_line_per_topic(tmp_path):
+    for index, topic_ids in enumerate([[1, 2], [2, 3]]):
+        (tmp_path / f'shard-{index}.jsonl').write_bytes(
+            b''.join(orjson.dumps({'id': topic_id, 'shard': index}) + b'\n' for topic_id in topic_ids))
+    (tmp_path / 'shard-2.jsonl.tmp').write_bytes(b'{"id": 4}\n')
+    writer = JsonLinesWriter(str(tmp_path / 'merged.jsonl'))
+    assert merge_shards(str(tmp_path), writer) == 3
+    assert [orjson.loads(line) for line in read_json_lines(str(tmp_path / 'merged.jsonl'))] == [
+        {'id': 1, 'shard': 0}, {'id': 2, 'shard': 0}, {'id': 3, 'shard': 1}]
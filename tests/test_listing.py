@@ -0,0 +1,52 @@
+def listing_requests(spider, response):
+    return [request for request in spider.parse(response) if request.callback == spider.parse]
+
+
+def requested_pages(requests):
+    return [request.meta['listing_page'] for request in requests]
+
+
+def test_pages_are_prefetched_ahead_of_the_parsed_one(make_spider, listing_topic, listing_response):
+    spider = make_spider(prefetch_pages=3)
+    topics = [listing_topic(1, hours_ago=1)]
+    assert requested_pages(listing_requests(spider, listing_response(spider, topics, page=0))) == [1, 2, 3]
+    assert spider.highest_requested_page == 3
+
+    # Pages already in flight are not requested again
+    assert requested_pages(listing_requests(spider, listing_response(spider, topics, page=1))) == [4]
+    assert spider.crawler.stats.get_value('listing/prefetched_pages') == 4
+
+
+def test_pages_after_the_end_of_the_window_are_ignored(make_spider, listing_topic, listing_response):
+    spider = make_spider(prefetch_pages=3)
+    listing_requests(spider, listing_response(spider, [listing_topic(1, hours_ago=1)], page=0))
+
+    # Page 2 is the first one without topics in the date window
+    old_topics = [listing_topic(2, hours_ago=24 * 30)]
+    assert listing_requests(spider, listing_response(spider, old_topics, page=2)) == []
+    assert spider.cutoff_page == 2
+
+    assert list(spider.parse(listing_response(spider, old_topics, page=3))) == []
+    assert spider.crawler.stats.get_value('listing/ignored_pages') == 1
+    # Pages before the cutoff are still parsed
+    assert listing_requests(spider, listing_response(spider, [listing_topic(3, hours_ago=2)], page=1)) == []
+    assert spider.crawler.stats.get_value('listing/ignored_pages') == 1
+
+
+def test_estimate_caps_the_prefetched_pages(make_spider, listing_topic, listing_response):
+    spider = make_spider(prefetch_pages=8, days=1)
+    # The first page reaches back 12 hours, two pages cover the day
+    topics = [listing_topic(1, hours_ago=1), listing_topic(2, hours_ago=12)]
+    assert spider._estimate_listing_pages(0, topics) == 2
+    assert requested_pages(listing_requests(spider, listing_response(spider, topics, page=0))) == [1]
+    assert spider.highest_requested_page == 1
+
+
+def test_refresh_budget_stops_the_prefetching(make_spider, listing_topic, listing_response):
+    spider = make_spider({'REFRESH_REQUEST_BUDGET': 2}, refresh='true', prefetch_pages=3)
+    # Topics fetched just now are not due, only listing pages use the budget
+    topics = [listing_topic(1, hours_ago=1)]
+    spider.state_store.record(topics[0])
+    assert requested_pages(listing_requests(spider, listing_response(spider, topics, page=0))) == [1, 2]
+    assert spider.highest_requested_page == 2
+    assert spider.crawler.stats.get_value('refresh/stopped_pagination') == 1
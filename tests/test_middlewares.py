@@ -0,0 +1,98 @@
+import time
+
+import pytest
+from scrapy.http import HtmlResponse, Request, TextResponse
+from scrapy.statscollectors import MemoryStatsCollector
+from scrapy.utils.test import get_crawler
+
+from openai_community_scraper.middlewares import AdaptiveRateLimitMiddleware, TokenBucket
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    """
+    Replaces `time.monotonic` by a clock that only moves when `clock.advance` is called.
+    """
+    class Clock:
+        now = 1000.0
+
+        def __call__(self):
+            return self.now
+
+        def advance(self, seconds):
+            self.now += seconds
+
+    clock = Clock()
+    monkeypatch.setattr(time, 'monotonic', clock)
+    return clock
+
+
+@pytest.fixture
+def middleware():
+    return AdaptiveRateLimitMiddleware(MemoryStatsCollector(get_crawler()), start_rate=2.0, min_rate=0.5,
+                                       max_rate=3.0, burst=2.0, target_latency=1.0, max_retries=1)
+
+
+def response(url, status=200, latency=0.1, headers=None, body=b'{}'):
+    request = Request(url, meta={'download_latency': latency})
+    return request, TextResponse(url, status=status, headers=headers, body=body, request=request)
+
+
+def test_token_bucket_bursts_then_paces(clock):
+    bucket = TokenBucket(rate=2.0, burst=2.0)
+    assert [bucket.reserve() for _ in range(4)] == [0.0, 0.0, 0.5, 1.0]
+    clock.advance(1.0)
+    # The refill pays the debt of the promised slots first
+    assert bucket.reserve() == 0.5
+
+
+def test_token_bucket_pause_and_rate_change(clock):
+    bucket = TokenBucket(rate=1.0, burst=2.0)
+    bucket.pause(3.0)
+    assert bucket.reserve() == 4.0
+    clock.advance(4.0)
+    bucket.set_rate(4.0)
+    assert bucket.reserve() == 0.25
+
+
+def test_endpoints():
+    assert AdaptiveRateLimitMiddleware.endpoint(Request('https://forum/latest.json?page=2')) == 'listing'
+    assert AdaptiveRateLimitMiddleware.endpoint(Request('https://forum/t/12/posts.json?post_ids[]=1')) == 'posts'
+    assert AdaptiveRateLimitMiddleware.endpoint(Request('https://forum/t/12.json')) == 'detail'
+    assert AdaptiveRateLimitMiddleware.endpoint(Request('https://forum/about.json')) == 'other'
+
+
+def test_rate_increases_additively_and_decreases_multiplicatively(clock, middleware):
+    for _ in range(10):
+        middleware.process_response(*response('https://forum/t/1.json'), None)
+    assert middleware.buckets['detail'].rate == 3.0
+    middleware.process_response(*response('https://forum/t/1.json', latency=2.0), None)
+    assert middleware.buckets['detail'].rate == pytest.approx(2.7)
+    assert middleware.stats.get_value('ratelimit/detail/rate') == 2.7
+    # Endpoints are paced independently
+    assert 'listing' not in middleware.buckets
+
+
+def test_rate_limited_request_is_retried_after_wait(clock, middleware):
+    request, throttled = response('https://forum/latest.json', status=429, headers={'Retry-After': '10'})
+    retry = middleware.process_response(request, throttled, None)
+    assert isinstance(retry, Request) and retry.dont_filter and retry.meta['rate_limit_retries'] == 1
+    bucket = middleware.buckets['listing']
+    assert bucket.rate == 1.0
+    assert bucket.reserve() == pytest.approx(11.0)
+    # Gives up after max_retries
+    assert middleware.process_response(retry, throttled, None) is throttled
+    assert middleware.stats.get_value('ratelimit/listing/throttled') == 2
+
+
+def test_retry_after_sources():
+    _, discourse = response('https://forum/t/1.json', status=429, body=b'{"extras": {"wait_seconds": 7}}')
+    assert AdaptiveRateLimitMiddleware._retry_after(discourse) == 7.0
+    _, html = response('https://forum/t/1.json', status=429, body=b'Too many requests')
+    assert AdaptiveRateLimitMiddleware._retry_after(html) is None
+
+
+def test_cached_responses_do_not_change_the_rate(middleware):
+    request = Request('https://forum/t/1.json', meta={'download_latency': 5.0})
+    middleware.process_response(request, HtmlResponse(request.url, request=request, flags=['cached']), None)
+    assert middleware.buckets == {}
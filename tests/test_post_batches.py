@@ -0,0 +1,50 @@
+from urllib.parse import parse_qs, urlparse
+
+from scrapy import Request
+from twisted.python.failure import Failure
+
+from openai_community_scraper.items import TopicDetail
+from tests.conftest import json_response
+
+
+def inline_first_posts(data, inlined):
+    data['post_stream']['posts'] = data['post_stream']['posts'][:inlined]
+    return data
+
+
+def batch_response(request, data):
+    post_ids = {int(post_id) for post_id in parse_qs(urlparse(request.url).query)['post_ids[]']}
+    posts = [post for post in data['post_stream']['posts'] if post['id'] in post_ids]
+    return json_response(request.url, {'post_stream': {'posts': posts}}, meta=request.meta)
+
+
+def test_missing_posts_are_fetched_in_batches(make_spider, topic_data, detail_response):
+    spider = make_spider({'POST_BATCH_SIZE': 2, 'MAX_POST_BATCHES_IN_FLIGHT': 2})
+    full = topic_data(7, posts=7)
+    requests = list(spider.parse_topic_detail(detail_response(spider, inline_first_posts(topic_data(7, posts=7), 2))))
+    assert len(requests) == 2  # Three batches of the five missing posts, two in flight
+
+    output = []
+    while requests:
+        request = requests.pop(0)
+        assert isinstance(request, Request)
+        for result in request.callback(batch_response(request, full)):
+            (requests if isinstance(result, Request) else output).append(result)
+
+    item, = output
+    assert isinstance(item, TopicDetail)
+    assert [post.post_number for post in item.post_comments] == list(range(1, 8))
+    assert spider.crawler.stats.get_value('posts/batch_requests') == 3
+
+
+def test_failed_batch_still_yields_the_topic(make_spider, topic_data, detail_response):
+    spider = make_spider({'POST_BATCH_SIZE': 5}, incremental='true')
+    request, = spider.parse_topic_detail(detail_response(spider, inline_first_posts(topic_data(7, posts=4), 2)))
+    failure = Failure(ConnectionError('reset'))
+    failure.request = request
+
+    item, = request.errback(failure)
+    assert [post.post_number for post in item.post_comments] == [1, 2]
+    # Incomplete topics are fetched again by the next incremental run
+    spider.item_scraped(item, None, spider)
+    assert spider.scraped_states == []
@@ -0,0 +1,194 @@
+import os
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+
+import orjson
+import psycopg2
+import pytest
+from scrapy.exceptions import DropItem
+from scrapy.statscollectors import MemoryStatsCollector
+from scrapy.utils.test import get_crawler
+from twisted.internet import defer
+from twisted.python.failure import Failure
+
+from openai_community_scraper.items import Post, TopicCounters, TopicDetail
+from openai_community_scraper.pipelines import PostgresPipeline
+from openai_community_scraper.state import ContentHashIndex, TopicStateStore
+
+# The merge queries are tested against a real server, e.g. POSTGRES_TEST_DB=postgres PGPORT=55432
+POSTGRES_TEST_SETTINGS = {
+    'postgres_uri': os.getenv('POSTGRES_TEST_URI', '127.0.0.1'),
+    'postgres_user': os.getenv('POSTGRES_TEST_USER', 'postgres'),
+    'postgres_pass': os.getenv('POSTGRES_TEST_PASS', ''),
+    'postgres_db': os.getenv('POSTGRES_TEST_DB'),
+}
+requires_postgres = pytest.mark.skipif(not POSTGRES_TEST_SETTINGS['postgres_db'], reason="POSTGRES_TEST_DB is not set")
+
+
+def make_topic(topic_id, tags=('api',), posts=(), **fields):
+    return TopicDetail(
+        **{'title': f'Topic {topic_id}', 'views': 1, **fields},
+        id=topic_id, tags=list(tags) if tags is not None else None, created_at='2024-05-01T10:00:00.000Z', post_comments=[
+            Post(id=topic_id * 1000 + number, post_number=number, cooked=cooked,
+                 created_at='2024-05-01T10:00:00.000Z', updated_at='2024-05-01T10:00:00.000Z')
+            for number, cooked in enumerate(posts, start=1)
+        ])
+
+
+def test_copy_value_escapes_text_format():
+    assert PostgresPipeline._copy_value(None) == '\\N'
+    assert PostgresPipeline._copy_value(True) == 't'
+    assert PostgresPipeline._copy_value('a\tb\nc\\d') == 'a\\tb\\nc\\\\d'
+    assert orjson.loads(PostgresPipeline._copy_value({'a': [1, 2]})) == {'a': [1, 2]}
+
+
+def test_convert_item_rows():
+    pipeline = PostgresPipeline('host', 'user', 'pass', 'db')
+    topic_row, post_rows, counter_row = pipeline._convert_item(make_topic(1, posts=['<p>x</p>', '<p>y</p>']))
+    assert topic_row.count('\t') == 24 and topic_row.endswith('\n')
+    assert [row.split('\t')[:3] for row in post_rows] == [['1001', '1', '1'], ['1002', '1', '2']]
+    assert counter_row == ''
+
+    topic_row, post_rows, counter_row = pipeline._convert_item(TopicCounters(id=1, views=5))
+    assert (topic_row, post_rows, counter_row) == ('', [], '1\t5\t\\N\t\\N\n')
+
+
+def backlogged_pipeline(backpressure):
+    # A pipeline whose write queue is full, without a database
+    pipeline = PostgresPipeline('host', 'user', 'pass', 'db', max_pending_batches=1, backpressure=backpressure)
+    pipeline.stats = MemoryStatsCollector(get_crawler())
+    pipeline.checkpoint = None
+    pipeline.committed = set()
+    pipeline._pending_writes.extend([defer.Deferred(), defer.Deferred()])
+    return pipeline
+
+
+def test_backpressure_block_holds_items_until_a_batch_is_written():
+    pipeline = backlogged_pipeline('block')
+    item = make_topic(1)
+    held = pipeline.process_item(item, None)
+    assert isinstance(held, defer.Deferred) and not held.called
+    pipeline._pending_writes[0].callback(0)
+    assert held.result is item
+
+
+def test_backpressure_drop_counts_dropped_items():
+    pipeline = backlogged_pipeline('drop')
+    with pytest.raises(DropItem):
+        pipeline.process_item(make_topic(1), None)
+    assert pipeline.items_buffer == []
+    assert pipeline.stats.get_value('sink/postgres/backpressure_dropped_items') == 1
+
+
+def test_only_database_errors_count_as_retried():
+    pipeline = backlogged_pipeline('block')
+    pipeline._write_failed(Failure(ValueError('bad value')), [1])
+    assert pipeline.stats.get_value('sink/postgres/retried_batches') is None
+    pipeline._write_failed(Failure(psycopg2.OperationalError('gone')), [2])
+    pipeline._write_succeeded(2, 0, [3])
+    pipeline._write_succeeded(0, 0, [4])
+    assert pipeline.stats.get_value('sink/postgres/retried_batches') == 2
+    assert pipeline.stats.get_value('sink/postgres/dropped_items') == 2
+
+
+def test_failed_batches_are_not_recorded_as_fetched(make_spider, topic_data, detail_response):
+    spider = make_spider(incremental='true', changes_only='true')
+    pipeline = backlogged_pipeline('block')
+    pipeline.discard_topics = spider.discard_topics
+    for topic_id in (1, 2):
+        item, = spider.parse_topic_detail(detail_response(spider, topic_data(topic_id)))
+        spider.item_scraped(item, None, spider)
+    pipeline._write_failed(Failure(psycopg2.OperationalError('gone')), [1])
+    spider.closed('finished')
+
+    assert TopicStateStore(spider.state_store.path).get(1) is None
+    assert TopicStateStore(spider.state_store.path).get(2) is not None
+    assert ContentHashIndex(spider.content_index.path).get_topic(1) is None
+    assert ContentHashIndex(spider.content_index.path).get_topic(2) is not None
+
+
+@pytest.fixture
+def postgres(monkeypatch):
+    """
+    Opens a pipeline writing to a schema of its own, dropped after the test.
+    """
+    schema = f'test_{uuid.uuid4().hex[:12]}'
+    connection = psycopg2.connect(host=POSTGRES_TEST_SETTINGS['postgres_uri'],
+                                  user=POSTGRES_TEST_SETTINGS['postgres_user'],
+                                  password=POSTGRES_TEST_SETTINGS['postgres_pass'],
+                                  dbname=POSTGRES_TEST_SETTINGS['postgres_db'])
+    connection.autocommit = True
+    with connection.cursor() as cursor:
+        cursor.execute(f'CREATE SCHEMA {schema}')
+    monkeypatch.setenv('PGOPTIONS', f'-c search_path={schema}')
+    pipelines = []
+
+    def open_pipeline():
+        pipeline = PostgresPipeline(**POSTGRES_TEST_SETTINGS)
+        pipeline.open_spider(object())
+        pipelines.append(pipeline)
+        return pipeline
+
+    def query(sql):
+        with connection.cursor() as cursor:
+            cursor.execute(f'SET search_path = {schema}')
+            cursor.execute(sql)
+            return cursor.fetchall() if cursor.description else None
+
+    yield open_pipeline, query
+    for pipeline in pipelines:
+        pipeline._shutdown(None)
+    with connection.cursor() as cursor:
+        cursor.execute(f'DROP SCHEMA {schema} CASCADE')
+    connection.close()
+
+
+@requires_postgres
+def test_batches_are_merged(postgres):
+    open_pipeline, query = postgres
+    pipeline = open_pipeline()
+    pipeline._write_batch([pipeline._convert_item(item) for item in [
+        make_topic(1, posts=['<p>a</p>', '<p>b</p>']),
+        make_topic(2, tags=None),
+        make_topic(1, posts=['<p>a</p>', '<p>edited</p>'], title='Renamed'),
+    ]])
+    assert query('SELECT id, title, tags FROM topic_details ORDER BY id') == [
+        (1, 'Renamed', ['api']), (2, 'Topic 2', None)]
+    assert query("SELECT id, data->>'cooked' FROM topic_posts ORDER BY id") == [
+        (1001, '<p>a</p>'), (1002, '<p>edited</p>')]
+
+    pipeline._write_batch([pipeline._convert_item(TopicCounters(id=1, views=7, like_count=2, reply_count=1)),
+                           pipeline._convert_item(TopicCounters(id=3, views=7))])
+    assert query('SELECT id, views, like_count, reply_count, title FROM topic_details ORDER BY id') == [
+        (1, 7, 2, 1, 'Renamed'), (2, 1, None, None, 'Topic 2')]
+
+
+@requires_postgres
+def test_post_comments_column_is_migrated(postgres):
+    open_pipeline, query = postgres
+    posts = [{'id': 1001, 'post_number': 1, 'created_at': '2024-05-01T10:00:00.000Z', 'cooked': '<p>old</p>'},
+             {'id': 1002, 'post_number': 2, 'created_at': '2024-05-01T11:00:00.000Z', 'cooked': '<p>reply</p>'}]
+    query('CREATE TABLE topic_details (id SERIAL PRIMARY KEY, post_comments JSON, tags TEXT[], title TEXT)')
+    query(f"INSERT INTO topic_details VALUES (1, '{orjson.dumps(posts).decode()}', NULL, 'Legacy'), (2, NULL, NULL, 'Empty')")
+
+    open_pipeline()
+    assert query("SELECT id, topic_id, post_number, data->>'cooked' FROM topic_posts ORDER BY id") == [
+        (1001, 1, 1, '<p>old</p>'), (1002, 1, 2, '<p>reply</p>')]
+    assert query("SELECT 1 FROM information_schema.columns WHERE table_schema = current_schema() "
+                 "AND table_name = 'topic_details' "
+                 "AND column_name = 'post_comments'") == []
+
+
+@requires_postgres
+def test_replaced_connections_get_staging_tables(postgres):
+    open_pipeline, query = postgres
+    pipeline = open_pipeline()
+    pipeline.batch_retries = 2
+    with ThreadPoolExecutor(max_workers=pipeline.pool_size) as executor:
+        list(executor.map(lambda topic_id: pipeline._insert_items([pipeline._convert_item(make_topic(topic_id))]),
+                          range(1, 9)))
+    # Both pooled connections are broken, the batch is retried until it gets a new session
+    query("SELECT pg_terminate_backend(pid) FROM pg_stat_activity "
+          "WHERE pid <> pg_backend_pid() AND datname = current_database() AND usename = current_user")
+    assert pipeline._insert_items([pipeline._convert_item(make_topic(9))]) == 2
+    assert query('SELECT count(*) FROM topic_details') == [(9,)]
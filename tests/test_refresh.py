@@ -0,0 +1,64 @@
+from datetime import datetime, timedelta
+
+import pytest
+from scrapy import Request
+from scrapy.utils.test import get_crawler
+
+from openai_community_scraper.refresh import RefreshScheduler
+from openai_community_scraper.state import TopicStateStore
+
+
+@pytest.fixture
+def scheduler(tmp_path):
+    crawler = get_crawler()
+    crawler.stats.open_spider(None)
+    return RefreshScheduler(TopicStateStore(str(tmp_path / 'state.db')), crawler, budget=10, post_batch_size=50)
+
+
+def test_budget_covers_details_and_post_batches(scheduler, listing_topic):
+    assert scheduler.reserve()  # A listing page
+    assert scheduler.reserve_topic(listing_topic(1, posts_count=20)) == 1
+    # 100 posts beyond the 20 inlined ones take two batches of 50
+    assert scheduler.reserve_topic(listing_topic(2, posts_count=120)) == 3
+    assert scheduler.used == 5
+    assert scheduler.reserve_topic(listing_topic(3, posts_count=500)) is None
+    assert scheduler.used == 5 and scheduler.crawler.stats.get_value('refresh/over_budget_topics') == 1
+
+    # A started topic is completed even when its batches exceed the estimate
+    scheduler.settle(3, 7)
+    assert scheduler.used == 9 and not scheduler.reserve(2)
+    assert scheduler.crawler.stats.get_value('refresh/budget_used') == 9
+
+
+def test_hot_topics_score_higher_and_are_revisited_sooner(scheduler, listing_topic):
+    now = datetime.utcnow()
+    hot = listing_topic(1, hours_ago=1, posts_count=40, created_at=(now - timedelta(days=2)).isoformat() + 'Z')
+    dead = listing_topic(2, hours_ago=24 * 30, posts_count=3,
+                         created_at=(now - timedelta(days=300)).isoformat() + 'Z')
+    assert scheduler.score(hot, now) > scheduler.score(dead, now)
+    assert scheduler.interval(scheduler.score(hot, now)) < scheduler.interval(scheduler.score(dead, now))
+    assert scheduler.interval(0) == scheduler.max_interval
+    assert scheduler.priority(scheduler.min_interval) == 0
+    assert scheduler.priority(scheduler.min_interval * 4) == -20
+
+
+def test_due_topics(scheduler, listing_topic):
+    topic = listing_topic(1, hours_ago=24 * 10, posts_count=2)
+    assert scheduler.due_priority(topic) is not None  # Never fetched
+
+    scheduler.state_store.record(topic, datetime.utcnow() - timedelta(hours=2))
+    assert scheduler.due_priority(topic) is None  # Quiet topic fetched recently
+    scheduler.state_store.record(topic, datetime.utcnow() - timedelta(days=8))
+    assert scheduler.due_priority(topic) is not None  # Past the max interval
+    assert scheduler.due_priority({**topic, 'posts_count': 3}) is not None  # New posts
+    assert scheduler.crawler.stats.get_value('refresh/deferred_topics') == 1
+
+
+def test_refresh_crawl_stops_at_the_budget(make_spider, listing_topic, listing_response):
+    spider = make_spider({'REFRESH_REQUEST_BUDGET': 4}, refresh='true')
+    list(spider.start_requests())
+    topics = [listing_topic(topic_id, hours_ago=topic_id) for topic_id in range(1, 10)]
+    details = [request for request in spider.parse(listing_response(spider, topics))
+               if isinstance(request, Request) and request.callback == spider.parse_topic_detail]
+    assert len(details) == 3
+    assert spider.refresh.used == 4
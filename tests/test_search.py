@@ -0,0 +1,38 @@
+import subprocess
+import sys
+
+from openai_community_scraper.items import Post, TopicCounters, TopicDetail
+from openai_community_scraper.search import SearchIndex
+
+
+def topic(topic_id, title, tags, posts):
+    return TopicDetail(id=topic_id, title=title, tags=tags, views=1, last_posted_at='2024-05-01T10:00:00.000Z',
+                       post_comments=[Post(id=topic_id * 1000 + number, post_number=number, cooked=cooked,
+                                           updated_at=updated_at)
+                                      for number, (cooked, updated_at) in enumerate(posts, start=1)])
+
+
+def test_index_is_updated_incrementally(tmp_path):
+    index = SearchIndex(str(tmp_path / 'search.db'))
+    assert index.add(topic(1, 'Rate limits of the API', ['api'], [('<p>Got a <b>429</b> error</p>', 'v1'),
+                                                                    ('<p>Retry later</p>', 'v1')])) == 2
+    assert index.add(topic(2, 'Embeddings', ['embeddings'], [('<p>Cosine similarity</p>', 'v1')])) == 1
+    assert [hit['topic_id'] for hit in index.search_posts('429')] == [1]
+    assert [hit['topic_id'] for hit in index.search_topics('rate')] == [1]
+    assert index.search_topics(None, tags=['embeddings'])[0]['title'] == 'Embeddings'
+
+    # Only the edited post is indexed again
+    assert index.add(topic(1, 'Rate limits of the API', ['api'], [('<p>Got a 429 error</p>', 'v1'),
+                                                                    ('<p>Use a backoff</p>', 'v2')])) == 1
+    assert index.search_posts('later') == []
+    assert [hit['post_number'] for hit in index.search_posts('backoff')] == [2]
+
+    assert index.add(TopicCounters(id=2, views=99)) == 0
+    assert index.search_topics('embeddings')[0]['views'] == 99
+    index.close()
+
+
+def test_search_does_not_import_the_benchmark():
+    code = ("import sys, openai_community_scraper.search; "
+            "assert 'openai_community_scraper.benchmark' not in sys.modules")
+    subprocess.run([sys.executable, '-c', code], check=True)
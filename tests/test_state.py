@@ -0,0 +1,71 @@
+from datetime import datetime
+
+from openai_community_scraper.items import TopicCounters, TopicDetail
+from openai_community_scraper.state import ContentHashIndex, CrawlCheckpoint, TopicStateStore
+
+
+def test_topic_state_store_detects_changed_topics(tmp_path):
+    store = TopicStateStore(str(tmp_path / 'state.db'))
+    topic = {'id': 1, 'last_posted_at': '2024-01-01T00:00:00.000Z', 'posts_count': 3, 'highest_post_number': 3}
+    assert not store.is_current(topic)
+
+    store.record(topic)
+    assert store.is_current(topic)
+    assert not store.is_current({**topic, 'posts_count': 4})
+    assert not store.is_current({**topic, 'last_posted_at': '2024-01-02T00:00:00.000Z'})
+
+
+def test_topic_state_store_keeps_the_fetch_time(tmp_path):
+    path = str(tmp_path / 'state.db')
+    store = TopicStateStore(path)
+    fetched_at = datetime(2024, 1, 1, 12)
+    store.record({'id': 1, 'posts_count': 3}, fetched_at)
+    store.close()
+
+    assert TopicStateStore(path).last_fetch(1) == (3, fetched_at)
+    assert TopicStateStore(path).last_fetch(2) is None
+
+
+def test_content_hash_index_survives_reopening(tmp_path):
+    path = str(tmp_path / 'hashes.db')
+    index = ContentHashIndex(path)
+    index.record_topic(1, b'content', b'counters')
+    index.record_posts(1, {1001: b'a', 1002: b'b'})
+    index.record_posts(1, {1002: b'edited'})
+    index.close()
+
+    index = ContentHashIndex(path)
+    assert index.get_topic(1) == (b'content', b'counters')
+    assert index.get_posts(1) == {1001: b'a', 1002: b'edited'}
+    assert index.get_topic(2) is None and index.get_posts(2) == {}
+
+
+def test_checkpoint_frontier_and_commits(tmp_path):
+    path = str(tmp_path / 'checkpoint.db')
+    checkpoint = CrawlCheckpoint(path)
+    checkpoint.add_listing_page(1)
+    assert checkpoint.add_topic(1) and checkpoint.add_topic(2)
+    assert not checkpoint.add_topic(1)
+    checkpoint.complete_topic(1, TopicDetail(id=1, title='One'))
+    checkpoint.record_commit('json', [1])
+    checkpoint.record_commit('parquet', [1], marker=str(tmp_path / 'missing'))
+    checkpoint.close()
+
+    checkpoint = CrawlCheckpoint(path)
+    assert checkpoint.listing_pages() == {1}
+    assert checkpoint.pending_topics() == [2]
+    assert checkpoint.committed_topics('json') == {1}
+    # The commit of a file that was never completed is ignored
+    assert checkpoint.committed_topics('parquet') == set()
+
+
+def test_checkpoint_logs_items_in_emission_order(tmp_path):
+    checkpoint = CrawlCheckpoint(str(tmp_path / 'checkpoint.db'))
+    for topic_id in (30, 10, 20):
+        checkpoint.add_topic(topic_id)
+        checkpoint.complete_topic(topic_id, TopicDetail(id=topic_id))
+    checkpoint.complete_topic(10, TopicCounters(id=10, views=5))
+    checkpoint.complete_topic(40)
+    assert [(type(item).__name__, item.id) for item in checkpoint.logged_items()] == [
+        ('TopicDetail', 30), ('TopicDetail', 20), ('TopicCounters', 10)]
+